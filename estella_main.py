@@ -1,11 +1,31 @@
+import sqlite3
 import sys
-import traceback
-from PyQt5.QtCore import Qt
+import time
+
+if __name__ == "__main__" and len(sys.argv) > 1 and not sys.argv[1].startswith("-"):
+    # Headless commands (e.g. "python -m estella_main batch wells.csv -o ranked.parquet"),
+    # dispatched before PyQt5 and matplotlib are imported so they start fast on servers
+    from lift_batch import main
+    sys.exit(main(sys.argv[1:]))
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt5.QtGui import QFont, QTextCharFormat
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QFormLayout, QLabel, QComboBox, \
-    QPushButton, QFrame, QTextEdit, QLineEdit, QHBoxLayout, QMessageBox, QTabWidget, QTableWidget, QTableWidgetItem
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+    QPushButton, QFrame, QTextEdit, QLineEdit, QHBoxLayout, QMessageBox, QTabWidget, QTableWidget, QTableWidgetItem, \
+    QProgressBar, QSpinBox, QTableView, QFileDialog, QSplitter
+
+import numpy as np
+
+from lift_criteria import METHOD_ABBREVIATIONS, PARAMETER_NAMES
+from lift_engine import IncrementalScorer
+from lift_field import count_wells, load_field
+from lift_metrics import count, record_error, timed
+from lift_portfolio import optimize_portfolio
+from lift_ranking import allowed_methods, format_cost, rank_well
+from lift_scenarios import INFRASTRUCTURE_FIELDS, LIST_LIMIT, ScenarioStore, scenario_constraints
+from lift_scoring import calculate_scores, predict_best_lift_method
+from lift_sensitivity import DEFAULT_POINTS, MAX_GRID_POINTS, sweep_2d, sweep_values, tornado
+from lift_validation import NUMERIC_NAMES, ErrorReport, parse_value, validate_columns
 
 
 class ArtificialLiftInterface(QMainWindow):
@@ -25,7 +45,9 @@ class ArtificialLiftInterface(QMainWindow):
         # Create the "Criteria" tab
         self.criteria_tab = QWidget()
         self.tab_widget.addTab(self.criteria_tab, "Criteria")
-        self.criteria_layout = QHBoxLayout(self.criteria_tab)
+        self.criteria_tab_layout = QVBoxLayout(self.criteria_tab)
+        self.criteria_layout = QHBoxLayout()
+        self.criteria_tab_layout.addLayout(self.criteria_layout)
 
         # Create and add the input frame
         self.input_frame = self.create_input_frame()
@@ -39,6 +61,39 @@ class ArtificialLiftInterface(QMainWindow):
         self.infrastructure_frame = self.create_infrastructure_frame()
         self.criteria_layout.addWidget(self.infrastructure_frame)
 
+        # Save every input of the tab as a named scenario of a well, and load saved ones back. The store
+        # (lift_scenarios) is opened on first use
+        self.scenario_store = None
+        self.scenario_well_edit = QLineEdit()
+        self.scenario_well_edit.setPlaceholderText("well ID")
+        self.scenario_well_edit.editingFinished.connect(self.refresh_scenarios)
+        self.scenario_name_edit = QLineEdit()
+        self.scenario_name_edit.setPlaceholderText("date and time")
+        self.scenario_tags_edit = QLineEdit()
+        self.scenario_tags_edit.setPlaceholderText("comma separated")
+        self.save_scenario_button = QPushButton("Save Scenario")
+        self.save_scenario_button.clicked.connect(self.save_scenario)
+        self.scenario_combo = QComboBox()
+        self.scenario_combo.setMinimumContentsLength(30)
+        self.load_scenario_button = QPushButton("Load")
+        self.load_scenario_button.clicked.connect(self.load_scenario)
+        self.scenario_label = QLabel()
+
+        scenario_layout = QHBoxLayout()
+        scenario_layout.addWidget(QLabel("Well ID:"))
+        scenario_layout.addWidget(self.scenario_well_edit)
+        scenario_layout.addWidget(QLabel("Scenario:"))
+        scenario_layout.addWidget(self.scenario_name_edit)
+        scenario_layout.addWidget(QLabel("Tags:"))
+        scenario_layout.addWidget(self.scenario_tags_edit)
+        scenario_layout.addWidget(self.save_scenario_button)
+        scenario_layout.addWidget(QLabel("Saved:"))
+        scenario_layout.addWidget(self.scenario_combo)
+        scenario_layout.addWidget(self.load_scenario_button)
+        scenario_layout.addStretch()
+        self.criteria_tab_layout.addLayout(scenario_layout)
+        self.criteria_tab_layout.addWidget(self.scenario_label)
+
         # Create the start button and the clear button
         self.start_button = QPushButton("Predict", self.central_widget)
         self.start_button.clicked.connect(self.predict_lift_method)
@@ -46,13 +101,25 @@ class ArtificialLiftInterface(QMainWindow):
         self.clear_button = QPushButton("Clear", self.central_widget)
         self.clear_button.clicked.connect(self.clear_inputs)
 
+        # Create the cancel button for a prediction running in the background
+        self.cancel_button = QPushButton("Cancel", self.central_widget)
+        self.cancel_button.clicked.connect(self.cancel_worker)
+        self.cancel_button.setEnabled(False)
+
         self.set_button_styles()
 
         button_layout = QHBoxLayout()
         button_layout.addWidget(self.start_button)
         button_layout.addWidget(self.clear_button)
+        button_layout.addWidget(self.cancel_button)
         self.layout.addLayout(button_layout)
 
+        # Scoring runs on a thread pool, self.worker is the run whose results will be shown
+        self.thread_pool = QThreadPool(self)
+        self.worker = None
+        self.worker_on_finished = None
+        self.worker_on_partial = None
+
         # Create the output frame
         self.output_frame = QFrame(self.central_widget)
         self.output_frame.setFrameShape(QFrame.StyledPanel)
@@ -62,6 +129,17 @@ class ArtificialLiftInterface(QMainWindow):
         self.output_label = QLabel("Prediction:")
         self.output_layout.addWidget(self.output_label)
 
+        # Create the live ranking, updated as the inputs are edited without pressing Predict
+        self.live_ranking_label = QLabel()
+        self.live_ranking_label.setWordWrap(True)
+        self.output_layout.addWidget(self.live_ranking_label)
+
+        # Create the progress bar shown while a prediction is running
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.hide()
+        self.output_layout.addWidget(self.progress_bar)
+
         # Create the text box for displaying the output
         self.output_text = QTextEdit()
         self.output_text.setReadOnly(True)
@@ -69,6 +147,9 @@ class ArtificialLiftInterface(QMainWindow):
         self.output_text.setTextColor(Qt.darkRed)
         self.output_layout.addWidget(self.output_text)
 
+        self.live_scorer = IncrementalScorer()
+        self.connect_live_ranking()
+
         # Create the "Results" tab
         self.results_tab = QWidget()
         self.tab_widget.addTab(self.results_tab, "Results")
@@ -80,15 +161,211 @@ class ArtificialLiftInterface(QMainWindow):
         self.results_table.setHorizontalHeaderLabels(["ALS", "PIS", "NIS", "PS"])
         self.results_layout.addWidget(self.results_table)
 
+        # The bar chart is created the first time the tab is shown, importing matplotlib costs more than
+        # the rest of the start-up. A chart plotted before that is kept in pending_plot
+        self.figure = None
+        self.bar_chart = None
+        self.canvas = None
+        self.pending_plot = None
+
+        # Create the "Sensitivity" tab
+        self.sensitivity_tab = QWidget()
+        self.tab_widget.addTab(self.sensitivity_tab, "Sensitivity")
+        self.sensitivity_layout = QVBoxLayout(self.sensitivity_tab)
+
+        # Parameters of the decision map and the grid size, the tornado chart always covers every parameter
+        self.sweep_x_combo = QComboBox()
+        self.sweep_x_combo.addItems(PARAMETER_NAMES)
+        self.sweep_x_combo.setCurrentText("well_depth")
+        self.sweep_y_combo = QComboBox()
+        self.sweep_y_combo.addItems(PARAMETER_NAMES)
+        self.sweep_y_combo.setCurrentText("gor")
+        self.sweep_points_spin = QSpinBox()
+        self.sweep_points_spin.setRange(2, MAX_GRID_POINTS)
+        self.sweep_points_spin.setValue(DEFAULT_POINTS)
+        self.sweep_button = QPushButton("Run Sweep")
+        self.sweep_button.clicked.connect(self.run_sensitivity)
+
+        sweep_layout = QHBoxLayout()
+        sweep_layout.addWidget(QLabel("Map X:"))
+        sweep_layout.addWidget(self.sweep_x_combo)
+        sweep_layout.addWidget(QLabel("Map Y:"))
+        sweep_layout.addWidget(self.sweep_y_combo)
+        sweep_layout.addWidget(QLabel("Grid points:"))
+        sweep_layout.addWidget(self.sweep_points_spin)
+        sweep_layout.addWidget(self.sweep_button)
+        sweep_layout.addStretch()
+        self.sensitivity_layout.addLayout(sweep_layout)
+
+        # The tornado chart and the decision map are created with the tab's first sweep
+        self.sensitivity_figure = None
+        self.tornado_chart = None
+        self.decision_map = None
+        self.sensitivity_canvas = None
+
+        # Create the "Field" tab with the ranked recommendations of a whole well inventory
+        self.field_tab = QWidget()
+        self.tab_widget.addTab(self.field_tab, "Field")
+        self.field_layout = QVBoxLayout(self.field_tab)
+
+        self.load_field_button = QPushButton("Load Wells...")
+        self.load_field_button.clicked.connect(self.load_field)
+
+        # Filters, applied to the whole field at once
+        self.field_method_combo = QComboBox()
+        self.field_method_combo.addItem("All methods")
+        self.field_method_combo.currentIndexChanged.connect(self.apply_field_filter)
+        self.field_min_score_spin = QSpinBox()
+        self.field_min_score_spin.setRange(0, len(PARAMETER_NAMES))
+        self.field_min_score_spin.valueChanged.connect(self.apply_field_filter)
+        self.field_min_depth_edit = QLineEdit()
+        self.field_min_depth_edit.setPlaceholderText("min")
+        self.field_min_depth_edit.editingFinished.connect(self.apply_field_filter)
+        self.field_max_depth_edit = QLineEdit()
+        self.field_max_depth_edit.setPlaceholderText("max")
+        self.field_max_depth_edit.editingFinished.connect(self.apply_field_filter)
+
+        field_filter_layout = QHBoxLayout()
+        field_filter_layout.addWidget(self.load_field_button)
+        field_filter_layout.addWidget(QLabel("Method:"))
+        field_filter_layout.addWidget(self.field_method_combo)
+        field_filter_layout.addWidget(QLabel("Min score:"))
+        field_filter_layout.addWidget(self.field_min_score_spin)
+        field_filter_layout.addWidget(QLabel("Well depth (ft):"))
+        field_filter_layout.addWidget(self.field_min_depth_edit)
+        field_filter_layout.addWidget(self.field_max_depth_edit)
+        field_filter_layout.addStretch()
+        self.field_layout.addLayout(field_filter_layout)
+
+        # Shared budgets of the field for the portfolio optimizer, blank for no limit. The Surface
+        # Infrastructure constraints apply to every well
+        self.capex_budget_edit = QLineEdit()
+        self.capex_budget_edit.setPlaceholderText("no limit")
+        self.gas_budget_edit = QLineEdit()
+        self.gas_budget_edit.setPlaceholderText("no limit")
+        self.power_budget_edit = QLineEdit()
+        self.power_budget_edit.setPlaceholderText("no limit")
+        self.power_budget_edit.setToolTip("Electricity available at the wells, drawn by ESP and PCP only")
+        # Capital cost assumed for the methods without a known one, blank to leave them out under a budget
+        self.unknown_cost_edit = QLineEdit()
+        self.unknown_cost_edit.setPlaceholderText("not assigned")
+        self.optimize_button = QPushButton("Optimize Portfolio")
+        self.optimize_button.clicked.connect(self.optimize_portfolio)
+
+        portfolio_layout = QHBoxLayout()
+        portfolio_layout.addWidget(QLabel("Capital budget ($):"))
+        portfolio_layout.addWidget(self.capex_budget_edit)
+        portfolio_layout.addWidget(QLabel("Unknown cost ($):"))
+        portfolio_layout.addWidget(self.unknown_cost_edit)
+        portfolio_layout.addWidget(QLabel("Injection gas (Mscf/d):"))
+        portfolio_layout.addWidget(self.gas_budget_edit)
+        portfolio_layout.addWidget(QLabel("Power (kW):"))
+        portfolio_layout.addWidget(self.power_budget_edit)
+        portfolio_layout.addWidget(self.optimize_button)
+        portfolio_layout.addStretch()
+        self.field_layout.addLayout(portfolio_layout)
+
+        self.field_summary_label = QLabel("No wells loaded.")
+        self.field_rejected = ""
+        self.field_layout.addWidget(self.field_summary_label)
+        self.portfolio_label = QLabel()
+        self.field_layout.addWidget(self.portfolio_label)
+
+        # The view only asks the model for the rows on screen, click a header to sort
+        self.field_model = FieldTableModel(self)
+        self.field_view = QTableView()
+        self.field_view.setModel(self.field_model)
+        self.field_view.setSortingEnabled(True)
+        self.field_view.setSelectionBehavior(QTableView.SelectRows)
+        self.field_view.verticalHeader().hide()
+
+        # The table shares the tab with the field charts, created with the first load
+        self.field_splitter = QSplitter(Qt.Vertical)
+        self.field_splitter.addWidget(self.field_view)
+        self.field_layout.addWidget(self.field_splitter)
+        self.field_canvas = None
+
+        self.tab_widget.currentChanged.connect(self.tab_changed)
+
+    def tab_changed(self, index):
+        if self.tab_widget.widget(index) is self.results_tab:
+            self.create_results_chart()
+
+    def create_results_chart(self):
+        if self.canvas is not None:
+            return
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+        from matplotlib.patches import Patch
+
+        from lift_charts import BarChart, BlitManager
+
         # Create the bar chart
         self.figure = Figure()
         self.bar_chart = self.figure.add_subplot(111)
         self.bar_chart.set_ylabel("Performance Score (PS)")
         self.bar_chart.set_xlabel("Artificial Lift System (ALS)")
 
-        # Add the bar chart to a canvas and display it in the results tab
+        self.bar_chart.set_title("Performance Scores for Artificial Lift Methods")
+        self.bar_chart.legend([Patch(color="C0")], ["Performance Score"])
+
+        # Add the bar chart to a canvas and display it in the results tab. The bars are updated in place
+        # and blitted, the axes are only redrawn when the methods change
         self.canvas = FigureCanvas(self.figure)
         self.results_layout.addWidget(self.canvas)
+        self.results_blitter = BlitManager(self.canvas)
+        self.performance_chart = BarChart(self.bar_chart, self.results_blitter, ylim=(0, 1))
+
+        if self.pending_plot is not None:
+            self.plot_performance_scores(*self.pending_plot)
+            self.pending_plot = None
+
+    def create_field_charts(self):
+        # Histogram of the best score and a depth vs rate scatter coloured by the recommended method, for
+        # the wells in the field view. Both update in place, so filtering and streaming loads only blit
+        if self.field_canvas is not None:
+            return
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+
+        from lift_charts import BlitManager, Histogram, Scatter
+
+        self.field_figure = Figure()
+        self.score_histogram_axes = self.field_figure.add_subplot(121)
+        self.score_histogram_axes.set_xlabel("Criteria met by the recommended method")
+        self.score_histogram_axes.set_ylabel("Wells")
+        self.field_scatter_axes = self.field_figure.add_subplot(122)
+        self.field_scatter_axes.set_xlabel("Well Depth (ft)")
+        self.field_scatter_axes.set_ylabel("Production Rate (bbl/d)")
+        self.field_figure.tight_layout()
+
+        self.field_canvas = FigureCanvas(self.field_figure)
+        self.field_splitter.addWidget(self.field_canvas)
+        self.field_blitter = BlitManager(self.field_canvas)
+        self.score_histogram = Histogram(self.score_histogram_axes, self.field_blitter, len(PARAMETER_NAMES) + 1)
+        self.field_scatter = Scatter(self.field_scatter_axes, self.field_blitter, METHOD_COLORS)
+
+    def update_field_charts(self):
+        field = self.field_model.field
+        if self.field_canvas is None or field is None:
+            return
+        view = field.view
+        self.score_histogram.set_values(field.best_score[view])
+        self.field_scatter.set_data(field.columns['well_depth'][view], field.columns['production_rate'][view],
+                                    field.best[view])
+
+    def create_sensitivity_chart(self):
+        if self.sensitivity_canvas is not None:
+            return
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+
+        # Create the tornado chart and the decision map
+        self.sensitivity_figure = Figure()
+        self.tornado_chart = self.sensitivity_figure.add_subplot(121)
+        self.decision_map = self.sensitivity_figure.add_subplot(122)
+        self.sensitivity_canvas = FigureCanvas(self.sensitivity_figure)
+        self.sensitivity_layout.addWidget(self.sensitivity_canvas)
 
     def create_input_frame(self):
         self.input_frame = QFrame(self.central_widget)
@@ -185,22 +462,22 @@ class ArtificialLiftInterface(QMainWindow):
         infrastructure_layout.addRow(infrastructure_label)
 
         # Create the combo boxes for Surface Infrastructure criteria
-        offshore_application_combo = QComboBox()
-        electrical_power_combo = QComboBox()
-        space_restrictions_combo = QComboBox()
-        well_service_combo = QComboBox()
+        self.offshore_application_combo = QComboBox()
+        self.electrical_power_combo = QComboBox()
+        self.space_restrictions_combo = QComboBox()
+        self.well_service_combo = QComboBox()
 
         # Add items to combo boxes
-        offshore_application_combo.addItems(['Limited', 'Excellent'])
-        electrical_power_combo.addItems(['Utility', 'In-Situ', 'N/A'])
-        space_restrictions_combo.addItems(['Poor', 'Excellent'])
-        well_service_combo.addItems(['Workover','pulling rig', 'Workover', 'Hydraulic'])
+        self.offshore_application_combo.addItems(['Limited', 'Excellent'])
+        self.electrical_power_combo.addItems(['Utility', 'In-Situ', 'N/A'])
+        self.space_restrictions_combo.addItems(['Poor', 'Excellent'])
+        self.well_service_combo.addItems(['Workover','pulling rig', 'Workover', 'Hydraulic'])
 
         # Add labels and input widgets to the infrastructure layout
-        infrastructure_layout.addRow("Offshore Application:", offshore_application_combo)
-        infrastructure_layout.addRow("Electrical Power:", electrical_power_combo)
-        infrastructure_layout.addRow("Space Restrictions:", space_restrictions_combo)
-        infrastructure_layout.addRow("Well Service:", well_service_combo)
+        infrastructure_layout.addRow("Offshore Application:", self.offshore_application_combo)
+        infrastructure_layout.addRow("Electrical Power:", self.electrical_power_combo)
+        infrastructure_layout.addRow("Space Restrictions:", self.space_restrictions_combo)
+        infrastructure_layout.addRow("Well Service:", self.well_service_combo)
 
         return infrastructure_frame
 
@@ -208,70 +485,237 @@ class ArtificialLiftInterface(QMainWindow):
 
 
 
-    # Add this method to the class
-    def get_float_from_line_edit(self, line_edit):
-        try:
-            value = float(line_edit.text())
-            return value
-        except ValueError:
-            line_edit.clear()
-            line_edit.setPlaceholderText("Invalid input")
+    def connect_live_ranking(self):
+        # Each input widget only updates its own criterion in the live scorer
+        for name in PARAMETER_NAMES:
+            line_edit = getattr(self, name + "_edit", None)
+            combo = getattr(self, name + "_combo", None)
+            if line_edit is not None:
+                line_edit.textChanged.connect(
+                    lambda text, name=name: self.update_live_ranking(name, parse_value(name, text)))
+                value = parse_value(name, line_edit.text())
+            elif name == "reservoir_access":
+                combo.currentIndexChanged.connect(lambda index, name=name: self.update_live_ranking(name, index))
+                value = combo.currentIndex()
+            else:
+                combo.currentTextChanged.connect(lambda text, name=name: self.update_live_ranking(name, text))
+                value = combo.currentText()
+            self.live_scorer.set_value(name, value)
+        self.show_live_ranking()
+
+    def update_live_ranking(self, name, value):
+        self.live_scorer.set_value(name, value)
+        self.show_live_ranking()
+
+    @timed('render.live_ranking')
+    def show_live_ranking(self):
+        ranking = ", ".join(f"{method} ({score})" for method, score in self.live_scorer.ranking())
+        self.live_ranking_label.setText(f"Live ranking (criteria met): {ranking}")
+
+    @timed('input_parsing')
+    def read_inputs(self):
+        # Input parameters in the argument order of predict_best_lift_method, None after showing an error.
+        # The form is validated like a one-row inventory (lift_validation), so every invalid field is marked
+        # and listed at once. Numbers may carry a unit, e.g. "1524 m" for the well depth
+        columns = {}
+        for name in PARAMETER_NAMES:
+            line_edit = getattr(self, name + "_edit", None)
+            if line_edit is not None:
+                columns[name] = [line_edit.text()]
+            elif name == "reservoir_access":
+                columns[name] = [self.reservoir_access_combo.currentIndex()]
+            else:
+                columns[name] = [getattr(self, name + "_combo").currentText()]
+
+        validation = validate_columns(columns, required=True)
+        errors = validation['errors']
+        problems = {}
+        for name, value, error in zip(*(errors[field].tolist() for field in ('parameter', 'value', 'error'))):
+            problems.setdefault(name, f"{value!r} {error}" if value != '' else error)
+        self.mark_invalid_inputs(problems)
+        if problems:
+            count('input_parsing.invalid', len(problems))
+            self.show_error_message("Invalid input(s):\n" + "\n".join(f"{self.parameter_label(name)}: {problem}"
+                                                                       for name, problem in problems.items()))
             return None
 
-    # Modify the predict_lift_method function
-    def predict_lift_method(self):
-        # Get the input parameters from the user for "Produced Fluid Properties"
-        water_cut = self.get_float_from_line_edit(self.water_cut_edit)
-        fluid_viscosity = self.get_float_from_line_edit(self.fluid_viscosity_edit)
-        corrosion_handling = self.corrosion_handling_combo.currentText()
-        sand_production = self.get_float_from_line_edit(self.sand_production_edit)
-        gor = self.get_float_from_line_edit(self.gor_edit)
-        contaminants = self.contaminants_combo.currentText()
-        treatment = self.treatment_combo.currentText()
-
-        # Check if any of the inputs are invalid
-        if None in (water_cut, fluid_viscosity, sand_production, gor):
-            self.show_error_message("Invalid input(s) for Produced Fluid Properties.")
+        prepared = validation['columns']
+        return tuple(int(columns[name][0]) if name == "reservoir_access" else
+                     float(prepared[name][0]) if name in NUMERIC_NAMES else str(prepared[name][0])
+                     for name in PARAMETER_NAMES)
+
+    def mark_invalid_inputs(self, problems):
+        # Red border and the problem as tooltip on the invalid input fields, the others are reset
+        for name in NUMERIC_NAMES:
+            line_edit = getattr(self, name + "_edit", None)
+            if line_edit is not None:
+                line_edit.setStyleSheet("border: 1px solid red;" if name in problems else "")
+                line_edit.setToolTip(problems.get(name, ""))
+
+    def parameter_label(self, name):
+        # Text of the form label of a parameter's input widget
+        widget = getattr(self, name + "_edit", None) or getattr(self, name + "_combo")
+        label = widget.parentWidget().layout().labelForField(widget)
+        return label.text().rstrip(":") if label is not None else name
+
+    def read_infrastructure(self):
+        # Selections of the Surface Infrastructure frame by lift_scenarios field name
+        return {name: getattr(self, name + "_combo").currentText() for name in INFRASTRUCTURE_FIELDS}
+
+    def read_constraints(self):
+        # Hard constraints of lift_ranking from the Surface Infrastructure frame, see scenario_constraints
+        return {name: bool(active) for name, active in scenario_constraints(self.read_infrastructure()).items()}
+
+    def set_form_values(self, values):
+        # Fill the Criteria tab from {name: value} (a saved scenario's inputs); a selection that is not in
+        # its combo box, e.g. from an imported inventory, is added to it
+        for name in PARAMETER_NAMES + INFRASTRUCTURE_FIELDS:
+            if name not in values:
+                continue
+            value = values[name]
+            line_edit = getattr(self, name + "_edit", None)
+            combo = getattr(self, name + "_combo", None)
+            if line_edit is not None:
+                line_edit.setText("" if value is None else str(int(value)) if value.is_integer() else repr(value))
+            elif name == "reservoir_access":
+                combo.setCurrentIndex(int(value))
+            else:
+                index = combo.findText(value)
+                if index < 0:
+                    combo.addItem(value)
+                    index = combo.count() - 1
+                combo.setCurrentIndex(index)
+        self.mark_invalid_inputs({})
+
+    def scenarios(self):
+        # The scenario store, opened on first use, None after showing an error
+        if self.scenario_store is None:
+            try:
+                self.scenario_store = ScenarioStore()
+            except sqlite3.Error as e:
+                self.show_error_message(f"Could not open the scenario store: {e}")
+        return self.scenario_store
+
+    def save_scenario(self):
+        # Save the inputs of the tab as a scenario of the well, replacing one of the same name
+        well_id = self.scenario_well_edit.text().strip()
+        if not well_id:
+            self.show_error_message("Enter a well ID to save the scenario under.")
+            return
+        inputs = self.read_inputs()
+        store = self.scenarios()
+        if inputs is None or store is None:
+            return
+        name = self.scenario_name_edit.text().strip() or time.strftime("%Y-%m-%d %H:%M:%S")
+        tags = self.scenario_tags_edit.text().split(",")
+        values = dict(zip(PARAMETER_NAMES, inputs), **self.read_infrastructure())
+        try:
+            scenario_id = store.save(well_id, name, values, tags)
+        except (sqlite3.Error, ValueError) as e:
+            self.show_error_message(f"Could not save the scenario: {e}")
             return
+        self.scenario_name_edit.setText(name)
+        self.refresh_scenarios()
+        self.scenario_combo.setCurrentIndex(self.scenario_combo.findData(scenario_id))
+        self.scenario_label.setText(f"Saved scenario {name!r} of well {well_id}.")
+
+    def refresh_scenarios(self):
+        # List the saved scenarios of the well ID, newest first (the latest ones of every well without one)
+        store = self.scenarios()
+        if store is None:
+            return
+        well_id = self.scenario_well_edit.text().strip() or None
+        self.scenario_combo.clear()
+        for scenario in store.find(well_id, limit=LIST_LIMIT):
+            tags = f" [{', '.join(scenario['tags'])}]" if scenario['tags'] else ""
+            text = scenario['name'] if well_id else f"{scenario['well_id']} / {scenario['name']}"
+            self.scenario_combo.addItem(f"{text}{tags}: {scenario['method'] or 'none allowed'}", scenario['id'])
+
+    def load_scenario(self):
+        # Put the selected scenario's inputs back on the tab
+        store = self.scenarios()
+        if store is None or self.scenario_combo.currentIndex() < 0:
+            return
+        try:
+            scenario = store.get(self.scenario_combo.currentData())
+        except (sqlite3.Error, KeyError) as e:
+            self.show_error_message(f"Could not load the scenario: {e}")
+            return
+        self.set_form_values(scenario['values'])
+        self.scenario_well_edit.setText(scenario['well_id'])
+        self.scenario_name_edit.setText(scenario['name'])
+        self.scenario_tags_edit.setText(", ".join(scenario['tags']))
+        saved = time.strftime("%Y-%m-%d %H:%M", time.localtime(scenario['saved']))
+        self.scenario_label.setText(f"Loaded scenario {scenario['name']!r} of well {scenario['well_id']}, saved "
+                                    f"{saved} with {scenario['method'] or 'no method allowed'} recommended "
+                                    f"(criteria {scenario['criteria']}).")
 
-        # Get the input parameters from the user for "Production, Reservoir, and Well Properties"
-        number_of_wells = self.number_of_wells_combo.currentText()
-        production_rate = self.get_float_from_line_edit(self.production_rate_edit)
-        well_depth = self.get_float_from_line_edit(self.well_depth_edit)
-        casing_size = self.get_float_from_line_edit(self.casing_size_edit)
-        deviated_well = self.deviated_well_combo.currentText()
-        dogleg_severity = self.get_float_from_line_edit(self.dogleg_severity_edit)
-        temperature = self.get_float_from_line_edit(self.temperature_edit)
-        safety_barriers = self.safety_barriers_combo.currentText()
-        flowing_pressure = self.get_float_from_line_edit(self.flowing_pressure_edit)
-        reservoir_access = int(self.reservoir_access_combo.currentIndex())
-        completion = self.completion_combo.currentText()
-        stability = self.stability_combo.currentText()
-        recovery = self.recovery_combo.currentText()
-
-        # Check if any of the inputs are invalid
-        if None in (production_rate, well_depth, casing_size, dogleg_severity, temperature, flowing_pressure):
-            self.show_error_message("Invalid input(s) for Production, Reservoir, and Well Properties.")
+    def predict_lift_method(self):
+        inputs = self.read_inputs()
+        if inputs is None:
             return
 
-        lift_method_costs = {
-            "Sucker Rod Pump": "$ 205,433",
-            "Gas Lift": "$ 331,107",
-            "ESP": "$ 215,694",
-            "Hydraulic Piston Pump": "$ UNKNOWN",
-            "Hydraulic Jet Pump": "$ UNKNOWN",
-            "Plunger Lift": "$ uNKNWON",
-            "PCP": "$ 211,412"
-        }
-
-        # Perform the function and get the best lift method
-        best_method = predict_best_lift_method(
-            water_cut, fluid_viscosity, corrosion_handling, sand_production,
-            gor, contaminants, treatment, number_of_wells, production_rate,
-            well_depth, casing_size, deviated_well, dogleg_severity, temperature,
-            safety_barriers, flowing_pressure, reservoir_access, completion,
-            stability, recovery
-        )
+        # Score on the thread pool so the window stays responsive, the results are drawn when it finishes
+        self.start_worker(Worker(run_prediction, inputs, self.read_constraints()), self.show_prediction)
+
+    def start_worker(self, worker, on_finished, on_partial=None):
+        # Only the latest run may update the window, cancel whatever is still running
+        self.cancel_worker()
+        self.worker = worker
+        self.worker_on_finished = on_finished
+        self.worker_on_partial = on_partial
+
+        # Slots of the window run on the GUI thread, the signals are queued from the pool thread
+        worker.signals.progress.connect(self.show_progress)
+        worker.signals.partial.connect(self.worker_partial)
+        worker.signals.finished.connect(self.worker_finished)
+        worker.signals.failed.connect(self.worker_failed)
+
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.start_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.thread_pool.start(worker)
+
+    def cancel_worker(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker_done()
+
+    def is_current_worker(self):
+        # Signals from a cancelled or replaced run are ignored
+        return self.worker is not None and self.sender() is self.worker.signals
+
+    def show_progress(self, percent, message):
+        if self.is_current_worker():
+            self.progress_bar.setValue(percent)
+            self.progress_bar.setFormat(f"{message} %p%")
+
+    def worker_partial(self, result):
+        if self.is_current_worker() and self.worker_on_partial is not None:
+            self.worker_on_partial(result)
+
+    def worker_finished(self, result):
+        if self.is_current_worker():
+            on_finished = self.worker_on_finished
+            self.worker_done()
+            on_finished(result)
+
+    def worker_failed(self, message):
+        if self.is_current_worker():
+            self.worker_done()
+            self.show_error_message(message)
+
+    def worker_done(self):
+        self.worker = None
+        self.worker_on_finished = None
+        self.worker_on_partial = None
+        self.progress_bar.hide()
+        self.start_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+
+    def show_prediction(self, result):
+        best_method = result['best_method'] or "none meets the constraints"
 
         # Display the best method in the output text box
         self.output_text.clear()
@@ -288,7 +732,7 @@ class ArtificialLiftInterface(QMainWindow):
         self.output_text.insertPlainText(best_method)
 
         # Get the cost range for the predicted lift method
-        cost_range = lift_method_costs.get(best_method, "Unknown")
+        cost_range = format_cost(result['best_method'])
 
         # Create a QTextCharFormat with a larger font size
         text_format = QTextCharFormat()
@@ -304,22 +748,29 @@ class ArtificialLiftInterface(QMainWindow):
         self.output_text.setCurrentCharFormat(QTextCharFormat())  # Reset to default format
         self.output_text.setCurrentCharFormat(QTextCharFormat())
 
-        # Calculate the performance scores for all ALS methods
-        als_methods = ['SRP', 'GL', 'ESP', 'HPP', 'HJP', 'PL', 'PCP']
-        pis_values, nis_values, ps_values = [], [], []
-
-        for als_method in als_methods:
-            pis, nis, ps = calculate_scores(als_method, best_method)
-            pis_values.append(pis)
-            nis_values.append(nis)
-            ps_values.append(ps)
+        # The full ranking: ties share a rank, the Pareto front trades criteria met against capital cost
+        ranking = result['ranking']
+        allowed = [entry for entry in ranking if entry['allowed']]
+        tied = [entry['method'] for entry in allowed[1:] if entry['rank'] == 1]
+        if tied:
+            self.output_text.append(f"Tied on criteria met with: {', '.join(tied)}")
+        self.output_text.append("Ranking: " + ", ".join(f"{entry['rank']}. {entry['method']} "
+                                                        f"({entry['criteria_met']})" for entry in allowed))
+        self.output_text.append("Pareto front (criteria met vs capital cost): "
+                                + ", ".join(f"{entry['method']} ({entry['criteria_met']}, "
+                                            f"{format_cost(entry['method'])})"
+                                            for entry in allowed if entry['pareto']))
+        excluded = [entry['method'] for entry in ranking if not entry['allowed']]
+        if excluded:
+            self.output_text.append(f"Excluded by the surface constraints: {', '.join(excluded)}")
 
         # Display the results in the table
-        self.display_results(als_methods, pis_values, nis_values, ps_values)
+        self.display_results(result['als_methods'], result['pis_values'], result['nis_values'], result['ps_values'])
 
         # Plot the performance scores against ALS methods
-        self.plot_performance_scores(als_methods, ps_values)
+        self.plot_performance_scores(result['als_methods'], result['ps_values'])
 
+    @timed('render.display_results')
     def display_results(self, als_methods, pis_values, nis_values, ps_values):
         self.results_table.setRowCount(len(als_methods))
 
@@ -329,26 +780,175 @@ class ArtificialLiftInterface(QMainWindow):
             self.results_table.setItem(i, 2, self.create_table_item(nis_values[i]))
             self.results_table.setItem(i, 3, self.create_table_item(ps_values[i]))
 
-            # Calculate the performance score
-            performance_score = (pis_values[i] - nis_values[i]) / (pis_values[i] + nis_values[i])
-            self.results_table.setItem(i, 4, self.create_table_item(performance_score))
+    def run_sensitivity(self):
+        # Sweep around the well entered on the Criteria tab
+        inputs = self.read_inputs()
+        if inputs is None:
+            return
+        name_x = self.sweep_x_combo.currentText()
+        name_y = self.sweep_y_combo.currentText()
+        if name_x == name_y:
+            self.show_error_message("Pick two different parameters for the decision map.")
+            return
+        self.start_worker(Worker(run_sensitivity, inputs, name_x, name_y, self.sweep_points_spin.value()),
+                          self.show_sensitivity)
+
+    @timed('render.sensitivity')
+    def show_sensitivity(self, result):
+        self.create_sensitivity_chart()
+        self.plot_tornado(result['tornado'])
+        self.plot_decision_map(result['map'])
+        self.sensitivity_figure.tight_layout()
+        self.sensitivity_canvas.draw()
+        self.tab_widget.setCurrentWidget(self.sensitivity_tab)
+
+    def plot_tornado(self, result):
+        # One bar per parameter from the lowest to the highest lead of the recommended method over the
+        # runner-up; red bars cross zero, i.e. that parameter alone can change the recommendation
+        bars = result['bars'][::-1]
+        positions = range(len(bars))
+        self.tornado_chart.clear()
+        self.tornado_chart.barh(positions, [bar['high'] - bar['low'] for bar in bars],
+                                left=[bar['low'] for bar in bars],
+                                color=["tab:red" if bar['takeovers'] else "tab:blue" for bar in bars])
+        self.tornado_chart.axvline(0, color="black", linewidth=0.8)
+        self.tornado_chart.set_yticks(list(positions))
+        self.tornado_chart.set_yticklabels([bar['parameter'] for bar in bars], fontsize=7)
+        self.tornado_chart.set_xlabel(f"Lead of {result['method']} (criteria met)")
+        self.tornado_chart.set_title("Tornado Chart")
+
+    def plot_decision_map(self, result):
+        from matplotlib.colors import ListedColormap
+        from matplotlib.patches import Patch
+
+        methods = result['methods']
+        colors = ListedColormap(["C%d" % j for j in range(len(methods))])
+        x_low, x_high, x_labels = axis_extent(result['xs'])
+        y_low, y_high, y_labels = axis_extent(result['ys'])
+
+        # The grids are even apart from the criterion bounds added to them, so an image is close enough
+        # and draws a 1000 x 1000 map far faster than a mesh
+        self.decision_map.clear()
+        self.decision_map.imshow(result['best'], cmap=colors, vmin=-0.5, vmax=len(methods) - 0.5, origin="lower",
+                                 extent=(x_low, x_high, y_low, y_high), aspect="auto", interpolation="nearest")
+        if x_labels is not None:
+            self.decision_map.set_xticks(range(len(x_labels)))
+            self.decision_map.set_xticklabels(x_labels)
+        if y_labels is not None:
+            self.decision_map.set_yticks(range(len(y_labels)))
+            self.decision_map.set_yticklabels(y_labels)
+        self.decision_map.set_xlabel(result['x'])
+        self.decision_map.set_ylabel(result['y'])
+        self.decision_map.set_title("Decision Map")
+
+        shown = sorted(set(result['best'].ravel().tolist()))
+        self.decision_map.legend([Patch(color="C%d" % j) for j in shown],
+                                 [METHOD_ABBREVIATIONS.get(methods[j], methods[j]) for j in shown], loc="upper right",
+                                 fontsize=7)
+
+    def load_field(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Load Wells", "", "Well inventories (*.csv *.parquet *.wells)")
+        if path:
+            # The histogram fills up chunk by chunk while the wells are scored
+            self.create_field_charts()
+            self.score_histogram.clear()
+            self.start_worker(Worker(run_field_load, path), self.show_field, self.stream_field_load)
+
+    def stream_field_load(self, counts):
+        self.score_histogram.add(counts)
+
+    def show_field(self, loaded):
+        # New field: offer its methods in the filter, keep the other filters as they are. The rows that failed
+        # validation are counted in the summary and listed in its tooltip
+        from matplotlib.patches import Patch
+
+        field, report = loaded
+        rejected = report.summary()
+        self.field_rejected = f" {rejected[0]}." if rejected else ""
+        self.field_summary_label.setToolTip("\n".join(rejected))
+
+        self.field_method_combo.blockSignals(True)
+        self.field_method_combo.clear()
+        self.field_method_combo.addItem("All methods")
+        self.field_method_combo.addItems(field.methods)
+        self.field_method_combo.blockSignals(False)
+
+        self.field_model.set_field(field)
+        self.portfolio_label.clear()
+        self.field_view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+
+        # Scatter limits cover the whole field so that filtering never rescales the axes. The legend sits
+        # above the axes, the points are drawn over everything inside them
+        self.create_field_charts()
+        self.field_scatter_axes.legend([Patch(color=METHOD_COLORS[j]) for j in range(len(field.methods))],
+                                       [METHOD_ABBREVIATIONS.get(method, method) for method in field.methods],
+                                       loc="lower center", bbox_to_anchor=(0.5, 1.0), ncol=5, fontsize=7)
+        self.field_figure.tight_layout()
+        self.field_scatter.set_limits(field.columns['well_depth'], field.columns['production_rate'])
+        self.apply_field_filter()
+        self.tab_widget.setCurrentWidget(self.field_tab)
+
+    def apply_field_filter(self):
+        field = self.field_model.field
+        if field is None:
+            return
+        method = self.field_method_combo.currentText()
+        self.field_model.set_filter(method=None if method == "All methods" else method,
+                                    min_score=self.field_min_score_spin.value() or None,
+                                    min_depth=parse_float(self.field_min_depth_edit.text()),
+                                    max_depth=parse_float(self.field_max_depth_edit.text()))
+
+        counts = ", ".join(f"{METHOD_ABBREVIATIONS.get(method, method)} {n}"
+                           for method, n in sorted(field.method_counts().items(), key=lambda item: -item[1]) if n)
+        self.field_summary_label.setText(f"Showing {len(field.view)} of {len(field)} wells.{self.field_rejected} "
+                                         f"{counts}")
+        self.update_field_charts()
+
+    def optimize_portfolio(self):
+        field = self.field_model.field
+        if field is None:
+            self.show_error_message("Load a well inventory first.")
+            return
+        budgets = {}
+        for name, edit in (('capex', self.capex_budget_edit), ('gas', self.gas_budget_edit),
+                           ('power', self.power_budget_edit), ('unknown cost', self.unknown_cost_edit)):
+            text = edit.text().strip()
+            budgets[name] = parse_float(text) if text else None
+            if text and (budgets[name] is None or budgets[name] < 0):
+                self.show_error_message(f"Invalid {name} figure: {text}")
+                return
+        unknown_cost = budgets.pop('unknown cost')
+        assumed = {'capex': unknown_cost} if unknown_cost is not None else None
+        self.start_worker(Worker(run_portfolio, field, budgets, self.read_constraints(), assumed),
+                          self.show_portfolio)
+
+    def show_portfolio(self, result):
+        # The assignment becomes the Assigned column, the summary lists the budgets that limit it
+        self.field_model.set_assignment(result['assignment'])
+        n_wells = len(result['assignment'])
+        text = (f"Portfolio: total score {result['total_score']:.0f} (at most {result['upper_bound']:.1f}), "
+                f"{n_wells - result['unassigned']} of {n_wells} wells assigned.")
+        budgets = [f"{name} {budget['used']:,.0f} of {budget['budget']:,.0f} used, "
+                   + ("binding" if budget['binding'] else "not binding") for name, budget in result['budgets'].items()]
+        if budgets:
+            text += "\n" + "; ".join(budgets)
+        for name, budget in result['budgets'].items():
+            if budget['unknown']:
+                text += (f"\nNot assigned, no known {name} figure: {', '.join(budget['unknown'])}"
+                         + (" (enter an unknown cost to assign them)" if name == 'capex' else ""))
+        self.portfolio_label.setText(text)
 
     def create_table_item(self, text):
         item = QTableWidgetItem(str(text))
         item.setTextAlignment(Qt.AlignCenter)
         return item
 
+    @timed('render.plot_performance_scores')
     def plot_performance_scores(self, als_methods, ps_values):
-        self.bar_chart.clear()
-        self.bar_chart.bar(als_methods, ps_values)
-
-        # Add legend, axis labels, and title to the plot
-        self.bar_chart.set_ylabel("Performance Score (PS)")
-        self.bar_chart.set_xlabel("Artificial Lift System (ALS)")
-        self.bar_chart.set_title("Performance Scores for Artificial Lift Methods")
-        self.bar_chart.legend(["Performance Score"])
-
-        self.canvas.draw()
+        if self.canvas is None:
+            self.pending_plot = (als_methods, ps_values)
+            return
+        self.performance_chart.set_data(als_methods, ps_values)
 
     def show_error_message(self, message):
         error_dialog = QMessageBox(self)
@@ -358,21 +958,15 @@ class ArtificialLiftInterface(QMainWindow):
         error_dialog.exec_()
 
     def clear_inputs(self):
-        # Clear all input and output fields
-        self.water_cut_edit.clear()
-        self.fluid_viscosity_edit.clear()
-        self.production_rate_edit.clear()
-        self.well_depth_edit.clear()
-        self.casing_size_edit.clear()
-        self.dogleg_severity_edit.clear()
-        self.temperature_edit.clear()
-        self.flowing_pressure_edit.clear()
-        self.corrosion_handling_combo.setCurrentIndex(0)
-        self.sand_production_edit.clear()
-        self.gor_edit.clear()
-        self.contaminants_combo.setCurrentIndex(0)
-        self.treatment_combo.setCurrentIndex(0)
+        # Clear all input and output fields, every combo box of the three frames back to its first choice
+        for name in PARAMETER_NAMES + INFRASTRUCTURE_FIELDS:
+            line_edit = getattr(self, name + "_edit", None)
+            if line_edit is not None:
+                line_edit.clear()
+            else:
+                getattr(self, name + "_combo").setCurrentIndex(0)
         self.output_text.clear()
+        self.mark_invalid_inputs({})
 
     def set_button_styles(self):
         button_style = """
@@ -389,158 +983,204 @@ class ArtificialLiftInterface(QMainWindow):
         """
         self.start_button.setStyleSheet(button_style % ("green", "darkgreen"))
         self.clear_button.setStyleSheet(button_style % ("blue", "darkblue"))
+        self.cancel_button.setStyleSheet(button_style % ("gray", "dimgray"))
 
         # Set the fixed size for the buttons
         button_width = 90 # Set your desired width here
         button_height = 30  # Set your desired height here
         self.start_button.setFixedSize(button_width, button_height)
         self.clear_button.setFixedSize(button_width, button_height)
+        self.cancel_button.setFixedSize(button_width, button_height)
+
+    def closeEvent(self, event):
+        # Stop a running prediction before the window goes away
+        self.cancel_worker()
+        self.thread_pool.waitForDone()
+        if self.scenario_store is not None:
+            self.scenario_store.close()
+        super().closeEvent(event)
+
+def parse_float(text):
+    # Lenient parse for live updates, it leaves the widget alone
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+class FieldTableModel(QAbstractTableModel):
+    # Table model over lift_field.FieldResults. The view asks only for the cells on screen, and sorting
+    # or filtering replaces the field's index array instead of rebuilding one item per cell
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.field = None
+
+    def set_field(self, field):
+        self.beginResetModel()
+        self.field = field
+        self.endResetModel()
+
+    def set_assignment(self, assignment):
+        self.beginResetModel()
+        self.field.set_assignment(assignment)
+        self.endResetModel()
+
+    def set_filter(self, **conditions):
+        self.beginResetModel()
+        self.field.filter(**conditions)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if self.field is None or parent.isValid() else len(self.field.view)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if self.field is None or parent.isValid() else len(self.field.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            return self.field.display(index.row(), index.column())
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal and self.field is not None:
+            return self.field.headers[section]
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if self.field is None:
+            return
+        self.layoutAboutToBeChanged.emit()
+        self.field.sort(column, order == Qt.DescendingOrder)
+        self.layoutChanged.emit()
 
-def calculate_scores(als_method, best_method):
-    # Generate a single random integer between 0 and 10 (inclusive)
 
-    # assume arbitrary values for PIS and NIS.
-    # You should replace these with actual calculations based on your domain knowledge and data.
-    # Updated 'pis' and 'nis' dictionaries
-    pis_values = {'SRP': 4.062125, 'GL': 7.874213, 'ESP': 6.874468, 'HPP': 7.273240, 'HJP': 6.031554, 'PL': 6.496925,
-           'PCP': 5.798163}
-    nis_values = {'SRP': 5.937875, 'GL': 0.125787, 'ESP': 2.125532, 'HPP': 0.726760, 'HJP': 5.968446, 'PL': 5.503075,
-           'PCP': 6.201837}
+class WorkerSignals(QObject):
+    progress = pyqtSignal(int, str)
+    partial = pyqtSignal(object)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
 
-    pis = pis_values.get(als_method, 0)
-    nis = nis_values.get(als_method, 0)
 
+class WorkerCancelled(Exception):
+    pass
 
-    # Calculate the Performance Score (PS)
-    ps = (pis - nis)/ (pis + nis)
-    abs_ps=abs(ps)
-    return pis, nis, round(abs_ps,2)
 
+class Worker(QRunnable):
+    # Runs task(worker, *args) on a QThreadPool. The task reports through worker.report_progress and
+    # worker.report_partial, and calls worker.check_cancelled between steps so cancel() stops it early
+    def __init__(self, task, *args):
+        super().__init__()
+        self.task = task
+        self.args = args
+        self.signals = WorkerSignals()
+        self._cancelled = False
 
-def predict_best_lift_method(water_cut, fluid_viscosity, corrosion_handling, sand_production, gor, contaminants,
-                            treatment, number_of_wells, production_rate, well_depth, casing_size, deviated_well,
-                            dogleg_severity, temperature, safety_barriers, flowing_pressure, reservoir_access,
-                            completion, stability, recovery):
-    print("Starting predict_best_lift_method...")
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def check_cancelled(self):
+        if self._cancelled:
+            raise WorkerCancelled()
+
+    def report_progress(self, percent, message=""):
+        self.signals.progress.emit(int(percent), message)
+
+    def report_partial(self, result):
+        self.signals.partial.emit(result)
+
+    def run(self):
+        try:
+            result = self.task(self, *self.args)
+            self.check_cancelled()
+        except WorkerCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            record_error('worker', e, task=self.task.__name__)
+            self.signals.failed.emit(str(e) or e.__class__.__name__)
+        else:
+            self.signals.finished.emit(result)
+
+
+def run_prediction(worker, inputs, constraints=None):
+    # Background part of the Predict button: score and rank the methods under the hard constraints and
+    # compute the performance scores
+    worker.report_progress(0, "Scoring lift methods...")
+    best_method = predict_best_lift_method(*inputs)
+    ranking = rank_well(inputs, constraints)
+    if constraints and any(constraints.values()):
+        # The best method the constraints allow, the same one when it is allowed
+        best_method = ranking[0]['method'] if ranking[0]['allowed'] else None
+
+    # Calculate the performance scores for all ALS methods
+    worker.report_progress(50, "Calculating performance scores...")
+    scores = calculate_scores(*inputs)
+    als_methods, pis_values, nis_values, ps_values = [], [], [], []
+
+    for method, (pis, nis, ps) in scores.items():
+        worker.check_cancelled()
+        als_method = METHOD_ABBREVIATIONS.get(method, method)
+        als_methods.append(als_method)
+        pis_values.append(pis)
+        nis_values.append(nis)
+        ps_values.append(ps)
+    worker.report_progress(100, "Calculating performance scores...")
+
+    return {'best_method': best_method, 'ranking': ranking, 'als_methods': als_methods, 'pis_values': pis_values,
+            'nis_values': nis_values, 'ps_values': ps_values}
+
+
+# Colours of the recommended methods in the field scatter
+METHOD_COLORS = ["C%d" % j for j in range(10)]
+
+
+def run_field_load(worker, path):
+    # Background part of Load Wells: read and score the inventory chunk by chunk. Each chunk's histogram
+    # of best scores is sent as a partial result. Returns the field and the report of the rejected rows
+    total = count_wells(path)
+    report = ErrorReport()
+    worker.report_progress(0, "Scoring wells...")
+
+    def progress(n_wells, scores):
+        worker.check_cancelled()
+        worker.report_partial(np.bincount(scores.max(axis=1), minlength=len(PARAMETER_NAMES) + 1))
+        worker.report_progress(100 * n_wells / max(total, 1), "Scoring wells...")
+
+    return load_field(path, progress=progress, report=report), report
+
+
+def run_portfolio(worker, field, budgets, constraints, assumed=None):
+    # Background part of Optimize Portfolio: assign methods across the loaded field within the budgets
+    worker.report_progress(0, "Optimizing portfolio...")
+    allowed = allowed_methods(field.methods, constraints, len(field))
+    return optimize_portfolio(field.scores, field.methods, budgets, allowed, assumed=assumed)
+
+
+def run_sensitivity(worker, inputs, name_x, name_y, points):
+    # Background part of the Run Sweep button: the tornado chart over every parameter, then the
+    # decision map of the two chosen parameters evaluated as one grid
+    worker.report_progress(0, "Sweeping parameters...")
+    tornado_result = tornado(inputs, n_points=points)
+    worker.check_cancelled()
+
+    worker.report_progress(50, "Building decision map...")
+    decision_map = sweep_2d(inputs, name_x, name_y, sweep_values(name_x, points), sweep_values(name_y, points))
+    worker.report_progress(100, "Building decision map...")
+    return {'tornado': tornado_result, 'map': decision_map}
+
+
+def axis_extent(values):
+    # Plot extent of a sweep grid, categorical values are placed at 0, 1, ... and returned as tick labels
+    if isinstance(values[0], str):
+        return -0.5, len(values) - 0.5, [value.strip() for value in values]
+    step = (values[-1] - values[0]) / max(len(values) - 1, 1)
+    return values[0] - step / 2, values[-1] + step / 2, None
 
-    try:
-        # Define the range and criteria for each lift method
-        lift_methods = {
-            'Gas Lift': {'water_cut': (0, 100), 'fluid_viscosity': (0, 200), 'corrosion_handling': ['good', 'excellent'],
-                    'sand_production': (0, 1), 'gor': (500, 2000), 'contaminants': ['Asphatene', 'paraffin'],
-                    'treatment': ['scale', 'acid'], 'number_of_wells': ['single or multiple'],
-                    'production_rate': (5, 5000), 'well_depth': (100, 16000), 'casing_size': (4.5, 5.5),
-                    'deviated_well': 'poor', 'dogleg_severity': 15, 'temperature': (100, 550),
-                    'safety_barriers': 'N/A', 'flowing_pressure': (50, 100), 'reservoir_access': 0,
-                    'completion': 'single', 'stability': 'stable', 'recovery': 'primary or secondary'},
-            'Sucker Rod Pump': {'water_cut': (0, 100), 'fluid_viscosity': (0, 200), 'corrosion_handling': ['good', 'excellent'],
-                   'sand_production': (0, 0), 'gor': (0, 2000), 'contaminants': ['Asphatene', 'paraffin'],
-                   'treatment': ['scale', 'acid'], 'number_of_wells': ['multiple'],
-                   'production_rate': (200, 30000), 'well_depth': (5000, 15000), 'casing_size': (4, 7),
-                   'deviated_well': 'excellent', 'dogleg_severity': 0.0, 'temperature': (100, 400),
-                   'safety_barriers': 'N/A', 'flowing_pressure': (100, 1000), 'reservoir_access': 1,
-                   'completion': 'single or multiple', 'stability': 'stable or unstable', 'recovery': 'primary or secondary'},
-            'ESP': {'water_cut': (0, 100), 'fluid_viscosity': (100, 500), 'corrosion_handling': ['good'],
-                    'sand_production': (0, 100), 'gor': (1000, float('inf')), 'contaminants': ['Asphatene', 'paraffin'],
-                    'treatment': ['scale', 'acid'], 'number_of_wells': ['multiple'],
-                    'production_rate': (200, 30000), 'well_depth': (1000, 15000), 'casing_size': (5.4, 9.625),
-                    'deviated_well': 'good', 'dogleg_severity': 30, 'temperature': (100, 400),
-                    'safety_barriers': 'N/A', 'flowing_pressure': 0.0, 'reservoir_access': 0,
-                    'completion': 'single or multiple', 'stability': 'stable', 'recovery': 'primary or secondary'},
-            'Hydraulic Piston Pump': {'water_cut': (0, 70), 'fluid_viscosity': (10, 450), 'corrosion_handling': ['good'],
-                    'sand_production': (0, 10), 'gor': (800, float('inf')), 'contaminants': ['paraffin'],
-                    'treatment': ['scale', 'acid'], 'number_of_wells': ['single or more'],
-                    'production_rate': (50, 4000), 'well_depth': (7500, 17000), 'casing_size': (5, 9.625),
-                    'deviated_well': 'excellent', 'dogleg_severity': 15, 'temperature': (100, 500),
-                    'safety_barriers': 'N/A', 'flowing_pressure': (500, 15000), 'reservoir_access': 1,
-                    'completion': 'single', 'stability': 'stable', 'recovery': 'primary or secondary'},
-            'Hydraulic Jet Pump': {'water_cut': (0, 100), 'fluid_viscosity': (14, 200), 'corrosion_handling': ['excellent'],
-                    'sand_production': (0, 30), 'gor': (0, 2000), 'contaminants': ['paraffin'],
-                    'treatment': ['scale', 'acid'], 'number_of_wells': ['single or more'],
-                    'production_rate': (300, 15000), 'well_depth': (5000, 15000), 'casing_size': (5.5, 7),
-                    'deviated_well': 'excellent', 'dogleg_severity': 24, 'temperature': (100, 500),
-                    'safety_barriers': 'N/A', 'flowing_pressure': (100, 1000), 'reservoir_access': 1,
-                    'completion': 'single', 'stability': 'stable', 'recovery': 'primary or secondary'},
-            'Plunger Lift': {'water_cut': (0, 50), 'fluid_viscosity': (0, 200), 'corrosion_handling': ['excellent'],
-                   'sand_production': (0, 1), 'gor': (1000, float('inf')), 'contaminants': ['Asphatene', 'paraffin'],
-                   'treatment': ['scale', 'acid'], 'number_of_wells': ['single'],
-                   'production_rate': (1, 5), 'well_depth': (8000, 19000), 'casing_size': (7, 990625),
-                   'deviated_well': 'good', 'dogleg_severity': 'pass', 'temperature': (120, 500),
-                   'safety_barriers': 'N/A', 'flowing_pressure': '<275', 'reservoir_access': 0,
-                   'completion': 'single', 'stability': 'stable', 'recovery': 'secondary'},
-            'PCP': {'water_cut': (0, 50), 'fluid_viscosity': (100, 5000), 'corrosion_handling': ['fair'],
-                    'sand_production': (0, 5), 'gor': (0, 500), 'contaminants': ['Asphatene', 'paraffin'],
-                    'treatment': ['scale', 'acid'], 'number_of_wells': ['single'],
-                    'production_rate': (5, 4500), 'well_depth': (2000, 6000), 'casing_size': (5, 7),
-                    'deviated_well': 'poor', 'dogleg_severity': 15, 'temperature': (75, 250),
-                    'safety_barriers': 'N/A', 'flowing_pressure': (20, 250), 'reservoir_access': 0,
-                    'completion': 'single', 'stability': 'stable', 'recovery': 'secondary'}
-        }
-
-        # Initialize a dictionary to store the scores for each lift method
-        lift_scores = {}
-
-        # Iterate through each lift method and calculate the score
-        for method, criteria in lift_methods.items():
-            score = 0
-
-            # Check each parameter against the criteria
-            if criteria['water_cut'][0] <= water_cut <= criteria['water_cut'][1]:
-                score += 1
-            if criteria['fluid_viscosity'][0] <= fluid_viscosity <= criteria['fluid_viscosity'][1]:
-                score += 1
-            if corrosion_handling in criteria['corrosion_handling']:
-                score += 1
-            if criteria['sand_production'][0] <= sand_production <= criteria['sand_production'][1]:
-                score += 1
-            if criteria['gor'][0] <= gor <= criteria['gor'][1]:
-                score += 1
-            if contaminants in criteria['contaminants']:
-                score += 1
-            if treatment in criteria['treatment']:
-                score += 1
-            if number_of_wells in criteria['number_of_wells']:
-                score += 1
-            if criteria['production_rate'][0] <= production_rate <= criteria['production_rate'][1]:
-                score += 1
-            if criteria['well_depth'][0] <= well_depth <= criteria['well_depth'][1]:
-                score += 1
-            if criteria['casing_size'][0] <= casing_size <= criteria['casing_size'][1]:
-                score += 1
-            if deviated_well in criteria['deviated_well']:
-                score += 1
-
-            if dogleg_severity == criteria['dogleg_severity']:
-                score +=1
-
-            if criteria['temperature'][0] <= temperature <= criteria['temperature'][1]:
-                score += 1
-
-            if safety_barriers in criteria['safety_barriers']:
-                score += 1
-
-            if flowing_pressure == criteria ['flowing_pressure']:
-                score += 1
-
-            if reservoir_access == criteria['reservoir_access']:
-                score += 1
-            if completion in criteria['completion']:
-                score += 1
-            if stability in criteria['stability']:
-                score += 1
-            if recovery in criteria['recovery']:
-                score += 1
-
-            lift_scores[method] = score
-
-        # Find the lift method with the highest score
-        best_lift_method = max(lift_scores, key=lift_scores.get)
-
-        print("End of predict_best_lift_method...")
-        return best_lift_method
-
-    except Exception as e:
-        traceback.print_exc()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,877 @@
+import argparse
+import collections
+import csv
+import functools
+import itertools
+import json
+import os
+import sqlite3
+import sys
+
+import numpy as np
+
+from lift_benchmark import (DEFAULT_REPEAT, DEFAULT_SIZES, DEFAULT_THRESHOLD, compare_results, load_results,
+                            run_benchmarks, save_results)
+from lift_cache import ResultCache, score_columns_cached
+from lift_calibration import DEFAULT_FOLDS, MIN_SUPPORT, RATIOS, calibrate, load_history
+from lift_criteria import (CRITERIA_FILE_ENV, PARAMETER_NAMES, current_criteria, load_criteria, save_criteria,
+                           use_criteria_file)
+from lift_engine import BLOCK_SIZE, default_criteria
+from lift_metrics import count, timed, timer
+from lift_parallel import (DEFAULT_SHARD_SIZE, create_pool, default_workers, map_ordered, measure_speedup,
+                           score_shard)
+from lift_portfolio import RESOURCES, optimize_portfolio
+from lift_ranking import CONSTRAINTS, allowed_methods, rank_field
+from lift_scenarios import (DEFAULT_SCENARIO_FILE, INFRASTRUCTURE_FIELDS, LIST_LIMIT, SCENARIO_FILE_ENV,
+                            ScenarioStore, best_methods, diff_recommendations, replay)
+from lift_service import DEFAULT_HOST, DEFAULT_PORT, MAX_BATCH, MAX_WAIT, run_load_test, serve
+from lift_sensitivity import DEFAULT_POINTS, MAX_GRID_POINTS, sweep, sweep_2d, sweep_values, tornado
+from lift_store import STORE_EXTENSION, WellStoreWriter, is_store, open_store
+from lift_topsis import topsis_wells
+from lift_uncertainty import DEFAULT_CHUNK_SIZE as DEFAULT_MC_CHUNK_SIZE
+from lift_uncertainty import DEFAULT_PERCENTILES, DEFAULT_SAMPLES, iter_monte_carlo, parse_distribution
+from lift_validation import ErrorReport, parse_unit, select_rows, validate_columns
+
+# Number of well records read, scored and written at a time
+DEFAULT_CHUNK_SIZE = 50000
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+
+def is_parquet(path):
+    return path.lower().endswith(PARQUET_EXTENSIONS)
+
+
+def read_csv_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Yield the well records as {column: list of values}, chunk_size rows at a time
+    with open(path, newline='') as handle:
+        reader = csv.DictReader(handle)
+        while True:
+            rows = list(itertools.islice(reader, chunk_size))
+            if not rows:
+                break
+            yield {name: [row[name] for row in rows] for name in reader.fieldnames}
+
+
+def read_parquet_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        yield batch.to_pydict()
+
+
+def read_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    if is_store(path):
+        return open_store(path).chunks(chunk_size)
+    if is_parquet(path):
+        return read_parquet_chunks(path, chunk_size)
+    return read_csv_chunks(path, chunk_size)
+
+
+class CsvResultWriter:
+    def __init__(self, path):
+        self.handle = open(path, 'w', newline='') if path != '-' else sys.stdout
+        self.writer = None
+
+    def write(self, columns):
+        if self.writer is None:
+            self.writer = csv.writer(self.handle)
+            self.writer.writerow(list(columns))
+        self.writer.writerows(zip(*columns.values()))
+
+    def close(self):
+        if self.handle is not sys.stdout:
+            self.handle.close()
+        else:
+            self.handle.flush()
+
+
+class ParquetResultWriter:
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table(columns)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_writer(path):
+    if is_parquet(path):
+        return ParquetResultWriter(path)
+    return CsvResultWriter(path)
+
+
+def prepare_columns(columns, units=None):
+    # Convert the raw chunk to the column types the engine expects (see lift_validation), blank or
+    # unreadable numbers become NaN so the well simply fails those criteria
+    return validate_columns(columns, units)['columns']
+
+
+def validate_chunk(columns, units=None, report=None, offset=0):
+    # The valid rows of a raw chunk: their raw and prepared columns and their row numbers in the chunk.
+    # The errors of the rejected rows go to report (a lift_validation.ErrorReport), offset is the number
+    # of input rows before the chunk
+    validation = validate_columns(columns, units)
+    valid = validation['valid']
+    if report is not None:
+        report.add(validation['errors'], offset)
+    if valid.all():
+        return columns, validation['columns'], np.arange(len(valid))
+    count('batch.rejected', int(len(valid) - valid.sum()))
+    return select_rows(columns, valid), select_rows(validation['columns'], valid), np.flatnonzero(valid)
+
+
+def validated_chunks(input_path, chunk_size=DEFAULT_CHUNK_SIZE, units=None, report=None):
+    # read_chunks with validate_chunk applied, yields the valid rows of each chunk as (raw columns,
+    # prepared columns, row numbers in the input counted from 0)
+    offset = 0
+    for columns in read_chunks(input_path, chunk_size):
+        n_rows = len(next(iter(columns.values())))
+        valid_columns, prepared, rows = validate_chunk(columns, units, report, offset)
+        yield valid_columns, prepared, rows + offset
+        offset += n_rows
+
+
+def write_store(input_path, output_path, chunk_size=BLOCK_SIZE, units=None, report=None):
+    # Convert a CSV/Parquet inventory to a memory-mapped well store (lift_store), one row group per chunk.
+    # Rows failing validation are left out. Returns the number of wells written
+    writer = WellStoreWriter(output_path)
+    try:
+        for columns, prepared, _ in validated_chunks(input_path, chunk_size, units, report):
+            writer.write(prepared, columns.get('well_id'))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.n_wells
+
+
+def result_columns(columns, scores, methods, closeness=None, ranking=None):
+    # Extend the input columns with a score per method, the TOPSIS closeness if computed, and the best method.
+    # ranking ({'constraints', 'max_cost', 'pareto'}, see lift_ranking.rank_field) makes it the best method
+    # the hard constraints allow (blank when none is) and with 'pareto' adds the Pareto front of each well
+    result = dict(columns)
+    for j, method in enumerate(methods):
+        result[method] = scores[:, j].tolist()
+    if closeness is not None:
+        for j, method in enumerate(methods):
+            result[method + ' PS'] = closeness[:, j].round(4).tolist()
+    if ranking is None:
+        result['best_method'] = np.asarray(methods, dtype=object)[scores.argmax(axis=1)].tolist()
+        return result
+
+    ranked = rank_field(scores, methods, ranking.get('constraints'), ranking.get('max_cost'))
+    # best is -1 for a well no method is allowed for, which picks the trailing blank
+    result['best_method'] = np.asarray(tuple(methods) + ('',), dtype=object)[ranked['best']].tolist()
+    if ranking.get('pareto'):
+        result['pareto_front'] = [';'.join(method for method, on in zip(methods, row) if on)
+                                  for row in ranked['pareto'].tolist()]
+    return result
+
+
+def score_chunk(columns, criteria=None, cache=None, topsis=False, ranking=None, prepared=None):
+    # Score one chunk and return the input columns extended with the scores. With a cache, only the
+    # well configurations not seen before are scored
+    criteria = criteria or default_criteria()
+    if prepared is None:
+        prepared = prepare_columns(columns)
+    if cache is not None:
+        scores = score_columns_cached(prepared, criteria, cache)
+    else:
+        scores = criteria.score(*criteria.encode(prepared))
+    closeness = topsis_wells(prepared, criteria)[2] if topsis else None
+    return result_columns(columns, scores, criteria.methods, closeness, ranking)
+
+
+@timed('batch.run')
+def run_batch(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, criteria=None, workers=1, cache=None,
+              topsis=False, ranking=None, units=None, report=None):
+    # Stream the inventory through the scorer one chunk at a time, returns the number of wells scored.
+    # Rows failing validation are left out of the output and reported to report (see validate_chunk).
+    # With several workers the chunks are scored on a process pool and written back in input order
+    # (the result cache lives in this process, so a cached run is scored here)
+    criteria = criteria or default_criteria()
+    writer = open_writer(output_path)
+    n_wells = 0
+    try:
+        if workers > 1 and cache is None:
+            raw_chunks = collections.deque()
+
+            def prepared_chunks():
+                for columns, prepared, _ in validated_chunks(input_path, chunk_size, units, report):
+                    raw_chunks.append(columns)
+                    yield prepared
+
+            with create_pool(workers, criteria.table) as executor:
+                task = functools.partial(score_shard, topsis=topsis)
+                for scored in map_ordered(executor, task, prepared_chunks(), 2 * workers):
+                    scores, closeness = scored if topsis else (scored, None)
+                    result = result_columns(raw_chunks.popleft(), scores, criteria.methods, closeness, ranking)
+                    with timer('batch.write'):
+                        writer.write(result)
+                    n_wells += len(scores)
+                    count('batch.wells', len(scores))
+        else:
+            for columns, prepared, _ in validated_chunks(input_path, chunk_size, units, report):
+                with timer('batch.score'):
+                    result = score_chunk(columns, criteria, cache, topsis, ranking, prepared)
+                with timer('batch.write'):
+                    writer.write(result)
+                n_wells += len(result['best_method'])
+                count('batch.wells', len(result['best_method']))
+    finally:
+        writer.close()
+    return n_wells
+
+
+def run_portfolio(input_path, output_path, budgets, constraints=None, units=None, report=None, assumed=None):
+    # Score the inventory, assign lift methods across the field within the budgets (lift_portfolio) and
+    # write one row per valid well: its id, the assigned method (blank for none) and the criteria it meets.
+    # assumed ({budget: figure}) stands in for unknown figures. Returns the optimizer's result
+    from lift_field import load_field
+
+    field = load_field(input_path, units=units, report=report)
+    allowed = allowed_methods(field.methods, constraints, len(field))
+    result = optimize_portfolio(field.scores, field.methods, budgets, allowed, assumed=assumed)
+    assignment = result['assignment']
+    names = np.asarray(field.methods + ('',), dtype=object)
+    criteria_met = np.where(assignment >= 0, field.scores[np.arange(len(field)), assignment], 0)
+    writer = open_writer(output_path)
+    try:
+        for start in range(0, len(field), DEFAULT_CHUNK_SIZE):
+            block = slice(start, start + DEFAULT_CHUNK_SIZE)
+            writer.write({'well_id': field.well_ids[block].tolist(), 'method': names[assignment[block]].tolist(),
+                          'criteria_met': criteria_met[block].tolist()})
+    finally:
+        writer.close()
+    return result
+
+
+def run_calibration(input_path, output_path, n_folds=DEFAULT_FOLDS, workers=1, ratios=RATIOS, min_support=MIN_SUPPORT,
+                    success_at=1, seed=0, units=None, report=None):
+    # Fit the criteria in use to a history of installs (lift_calibration) and write them as a new criteria
+    # file, with the calibration report in it. Returns the table and the report
+    prior = current_criteria()
+    history = load_history(validated_chunks(input_path, units=units, report=report), prior.methods, success_at,
+                           report)
+    table, calibration = calibrate(history, prior, n_folds, workers, ratios, min_support, seed)
+    calibration = dict(calibration, source=os.path.basename(input_path), success_at=success_at)
+    save_criteria(table, output_path, calibration=calibration)
+    return table, calibration
+
+
+def import_scenarios(input_path, store, name, tag=None, units=None, report=None):
+    # Save every valid well of an inventory as a scenario (lift_scenarios), identified by its well_id (else
+    # its row number) and scenario column (else name). Surface Infrastructure columns are kept when present,
+    # so their hard constraints apply on replay. Returns the number of scenarios saved
+    n_saved = 0
+    for columns, prepared, rows in validated_chunks(input_path, units=units, report=report):
+        well_ids = columns['well_id'] if 'well_id' in columns else (rows + 1).tolist()
+        names = columns['scenario'] if 'scenario' in columns else [name] * len(rows)
+        inputs = dict(prepared, **{field: columns[field] for field in INFRASTRUCTURE_FIELDS if field in columns})
+        n_saved += len(store.save_many(well_ids, names, inputs, [tag] if tag else ()))
+    return n_saved
+
+
+def write_replay(store, output_path, well_id=None, tag=None):
+    # Replay the saved scenarios with the criteria in use and write one row per scenario: its well ID and
+    # name, the criteria met per method and the best method the hard constraints allow. Returns the number
+    # of scenarios written
+    scenarios, ranking = replay(store, well_id=well_id, tag=tag)
+    content = ranking['content']
+    best = best_methods(ranking)
+    writer = open_writer(output_path)
+    try:
+        for start in range(0, len(scenarios), DEFAULT_CHUNK_SIZE):
+            block = scenarios[start:start + DEFAULT_CHUNK_SIZE]
+            rows = content[start:start + DEFAULT_CHUNK_SIZE]
+            result = {'well_id': [scenario['well_id'] for scenario in block],
+                      'scenario': [scenario['name'] for scenario in block]}
+            for j, method in enumerate(ranking['methods']):
+                result[method] = ranking['scores'][rows, j].tolist()
+            result['best_method'] = best[rows].tolist()
+            writer.write(result)
+    finally:
+        writer.close()
+    return len(scenarios)
+
+
+def write_diff(diff, output_path):
+    # One row per scenario whose recommendation changed: its well ID and name, and the method before and
+    # after with the criteria it meets
+    changed = diff['changed']
+    scenarios = [diff['scenarios'][i] for i in changed.tolist()]
+    writer = open_writer(output_path)
+    try:
+        writer.write({'well_id': [scenario['well_id'] for scenario in scenarios],
+                      'scenario': [scenario['name'] for scenario in scenarios],
+                      'old_method': diff['old'][changed].tolist(),
+                      'old_criteria_met': diff['old_met'][changed].tolist(),
+                      'new_method': diff['new'][changed].tolist(),
+                      'new_criteria_met': diff['new_met'][changed].tolist()})
+    finally:
+        writer.close()
+
+
+def print_scenarios(scenarios, total, file=None):
+    print("   id  well            scenario                method                  tags", file=file)
+    for scenario in scenarios:
+        print(f"{scenario['id']:5d}  {scenario['well_id']:<14.14s}  {scenario['name']:<22.22s}  "
+              f"{scenario['method'] or '-':<22.22s}  {', '.join(scenario['tags'])}", file=file)
+    if total > len(scenarios):
+        print(f"... and {total - len(scenarios)} more", file=file)
+
+
+def print_diff(diff, limit=20, file=None):
+    n_changed = len(diff['changed'])
+    versions = ", ".join(diff['versions']['old'])
+    old = f"the saved recommendations (criteria {versions})" if diff['saved'] else f"criteria {versions}"
+    print(f"{len(diff['scenarios'])} scenarios replayed with criteria {diff['versions']['new']}, "
+          f"{n_changed} recommendation(s) changed from {old}", file=file)
+    for (before, after), n in diff['transitions'].most_common():
+        print(f"  {before or '(none allowed)'} -> {after or '(none allowed)'}: {n}", file=file)
+    for i in diff['changed'][:limit].tolist():
+        scenario = diff['scenarios'][i]
+        print(f"  {scenario['well_id']} / {scenario['name']}: {_method_met(diff['old'][i], diff['old_met'][i])} -> "
+              f"{_method_met(diff['new'][i], diff['new_met'][i])}", file=file)
+    if n_changed > limit:
+        print(f"  ... and {n_changed - limit} more", file=file)
+
+
+def _method_met(method, met):
+    if not method:
+        return "(none allowed)"
+    return method if met is None else f"{method} ({met})"
+
+
+def print_calibration(table, report, file=None):
+    print(f"{report['installs']} installs, {report['successes']} successful, {report['folds']}-fold "
+          f"cross-validation", file=file)
+    print("ratio     AUC  hit rate", file=file)
+    for row in report['cross_validation']:
+        flag = "  <- chosen" if row['ratio'] == report['ratio'] else ""
+        print(f"{row['ratio']:5.2f}  {row['auc']:6.3f}  {row['hit_rate']:8.3f}{flag}", file=file)
+    print(f"prior criteria {report['parent']}: AUC {report['prior']['auc']:.3f}, hit rate "
+          f"{report['prior']['hit_rate']:.3f} on all installs", file=file)
+    print(f"calibrated criteria {table.version}: AUC {report['fit']['auc']:.3f}, hit rate "
+          f"{report['fit']['hit_rate']:.3f} on all installs", file=file)
+
+
+def print_portfolio(result, file=None):
+    n_wells = len(result['assignment'])
+    print(f"Total score {result['total_score']:.0f} (upper bound {result['upper_bound']:.1f}, gap "
+          f"{result['gap']:.2%}), {n_wells - result['unassigned']} of {n_wells} wells assigned", file=file)
+    for method, n in sorted(result['counts'].items(), key=lambda item: -item[1]):
+        if n:
+            print(f"  {method}: {n}", file=file)
+    for name, budget in result['budgets'].items():
+        state = "BINDING" if budget['binding'] else "slack"
+        print(f"{name:<6s} used {budget['used']:,.0f} of {budget['budget']:,.0f} (demand {budget['demand']:,.0f}), "
+              f"{state}", file=file)
+        if budget['unknown']:
+            print(f"Warning: not assigned, no known {name} figure: {', '.join(budget['unknown'])}"
+                  + (" (give --unknown-cost to assign them)" if name == 'capex' else ""), file=file)
+
+
+def print_rejected(report):
+    # Summary of the rows validation left out, on stderr next to the other progress messages
+    for line in report.summary():
+        print(line, file=sys.stderr)
+
+
+def print_uncertainty(summary, percentiles=DEFAULT_PERCENTILES):
+    probability = summary.probability_first()
+    mean = summary.mean_scores()
+    score_percentiles = summary.percentiles(percentiles)
+    width = max(len(method) for method in summary.methods)
+    header = "".join(f"  P{p:<3d}" for p in percentiles)
+    print(f"{'method':<{width}}  P(first)   mean{header}")
+    for method in sorted(summary.methods, key=probability.get, reverse=True):
+        row = "".join(f"  {score_percentiles[method][p]:<4d}" for p in percentiles)
+        print(f"{method:<{width}}  {probability[method]:8.4f}  {mean[method]:5.2f}{row}")
+
+
+def print_sensitivity(result, boundaries):
+    print(f"Recommended: {result['method']}")
+    print("parameter           swing  margin   takeovers")
+    for bar in result['bars']:
+        takeovers = ", ".join(bar['takeovers']) or "-"
+        print(f"{bar['parameter']:<18s}  {bar['swing']:5d}  {bar['low']:+d}..{bar['high']:+d}  {takeovers}")
+    for name, changes in boundaries:
+        print()
+        print(f"Decision boundaries along {name}:")
+        if not changes:
+            print("  none, the recommendation does not change")
+        for change in changes:
+            low, high = change['between']
+            print(f"  {change['from']} -> {change['to']} between {low} and {high}")
+
+
+def print_benchmarks(run):
+    width = max(len(name) for name in run['results'])
+    for name, measurement in run['results'].items():
+        print(f"{name:<{width}}  {measurement['value']:14.2f} {measurement['unit']}")
+
+
+def print_comparison(rows, threshold):
+    width = max(len(row[0]) for row in rows)
+    print(f"{'benchmark':<{width}}  {'baseline':>14s}  {'current':>14s}  change")
+    for name, previous, current, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<{width}}  {previous:14.2f}  {current:14.2f}  {change:+7.1%}{flag}")
+    regressions = sum(row[4] for row in rows)
+    print(f"{regressions} regression(s) over {threshold:.0%}")
+
+
+def print_load_test(report):
+    latency = report['latency_ms']
+    server = report['server']
+    print(f"{report['requests']} requests to {report['route']} ({report['wells_per_request']} well(s) each) over "
+          f"{report['concurrency']} connections in {report['seconds']:.2f} s: {report['requests_per_second']:.0f} "
+          f"requests/s")
+    print(f"client latency  p50 {latency['p50']:.2f} ms  p99 {latency['p99']:.2f} ms  max {latency['max']:.2f} ms")
+    latency = server['latency_ms']
+    print(f"service latency p50 {latency['p50']:.2f} ms  p99 {latency['p99']:.2f} ms  max {latency['max']:.2f} ms")
+    print(f"batches {server['batches']}, mean {server['mean_batch']:.1f} wells, largest {server['largest_batch']}")
+    if report['errors']:
+        print("errors: " + ", ".join(f"{n} x HTTP {status}" for status, n in report['errors'].items()))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="estella_main",
+                                     description="Artificial Lift Method Analyzer (headless mode)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # Options shared by every command
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--criteria", metavar="FILE",
+                        help=f"criteria file to use instead of the built-in table (also ${CRITERIA_FILE_ENV})")
+
+    # Options of the commands reading an inventory, whose rows are validated (lift_validation)
+    validation = argparse.ArgumentParser(add_help=False)
+    validation.add_argument("--unit", action="append", default=[], metavar="NAME=UNIT",
+                            help="unit of a whole input column, e.g. well_depth=m (repeatable)")
+    validation.add_argument("--errors", metavar="FILE",
+                            help="CSV report of the rows rejected by validation, one line per error")
+
+    batch_parser = subparsers.add_parser("batch", parents=[common, validation],
+                                         help="score a CSV/Parquet well inventory")
+    batch_parser.add_argument("input", help=f"CSV, Parquet or well store ({STORE_EXTENSION}) file with one well "
+                                            "per row")
+    batch_parser.add_argument("-o", "--output", default="-",
+                              help="output CSV or Parquet file (default: CSV on stdout)")
+    batch_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                              help="number of wells scored at a time (default: %(default)s)")
+    batch_parser.add_argument("-j", "--workers", type=int, default=1,
+                              help="number of worker processes (default: %(default)s)")
+    batch_parser.add_argument("--cache", metavar="FILE",
+                              help="SQLite result cache reused across runs for repeated well configurations")
+    batch_parser.add_argument("--topsis", action="store_true",
+                              help="add the TOPSIS performance score (closeness) of every method")
+    batch_parser.add_argument("--constraint", action="append", default=[], choices=list(CONSTRAINTS),
+                              help="hard constraint on every well, the best method is the best one allowed "
+                                   "(repeatable)")
+    batch_parser.add_argument("--max-cost", type=float, metavar="USD",
+                              help="exclude methods with a higher or unknown capital cost")
+    batch_parser.add_argument("--pareto", action="store_true",
+                              help="add the Pareto front of criteria met vs capital cost of every well")
+
+    store_parser = subparsers.add_parser("store", parents=[common, validation],
+                                         help="convert a CSV/Parquet inventory to a memory-mapped well store")
+    store_parser.add_argument("input", help="CSV or Parquet file with one well per row")
+    store_parser.add_argument("-o", "--output", required=True,
+                              help=f"well store file to write (use the {STORE_EXTENSION} extension)")
+    store_parser.add_argument("--chunk-size", type=int, default=BLOCK_SIZE,
+                              help="wells per row group (default: %(default)s)")
+
+    portfolio_parser = subparsers.add_parser("portfolio", parents=[common, validation],
+                                             help="assign lift methods across a field within shared budgets")
+    portfolio_parser.add_argument("input", help=f"CSV, Parquet or well store ({STORE_EXTENSION}) file with one "
+                                                "well per row")
+    portfolio_parser.add_argument("-o", "--output", default="-",
+                                  help="assignment CSV or Parquet file (default: CSV on stdout)")
+    portfolio_parser.add_argument("--capex", type=float, metavar="USD",
+                                  help="capital budget, methods of unknown cost are then not assigned unless "
+                                       "--unknown-cost is given")
+    portfolio_parser.add_argument("--unknown-cost", type=float, metavar="USD",
+                                  help="capital cost assumed for the methods without a known one")
+    portfolio_parser.add_argument("--gas", type=float, metavar="MSCF/D", help="lift gas injection capacity")
+    portfolio_parser.add_argument("--power", type=float, metavar="KW",
+                                  help="electrical power available at the wells, drawn by the electric methods only")
+    portfolio_parser.add_argument("--constraint", action="append", default=[], choices=list(CONSTRAINTS),
+                                  help="hard constraint on every well (repeatable)")
+
+    calibrate_parser = subparsers.add_parser("calibrate", parents=[common, validation],
+                                             help="fit the criteria and their weights to a history of installs")
+    calibrate_parser.add_argument("input", help="CSV or Parquet file with one install per row: the criteria, the "
+                                               "method installed (method) and its outcome (outcome)")
+    calibrate_parser.add_argument("-o", "--output", default="lift_criteria_calibrated.json",
+                                  help="criteria file to write (default: %(default)s)")
+    calibrate_parser.add_argument("--success-at", type=float, default=1, metavar="OUTCOME",
+                                  help="lowest outcome counted as a success, e.g. a run life in days "
+                                       "(default: %(default)s, for 1/0 outcomes)")
+    calibrate_parser.add_argument("--folds", type=int, default=DEFAULT_FOLDS,
+                                  help="cross-validation folds (default: %(default)s)")
+    calibrate_parser.add_argument("-j", "--workers", type=int, default=1,
+                                  help="worker processes for the folds (default: %(default)s)")
+    calibrate_parser.add_argument("--ratio", type=float, action="append", metavar="RATIO",
+                                  help="a method rejects the values its installs succeeded with less than RATIO "
+                                       "times as often as overall; repeat to cross-validate several (default: "
+                                       + ", ".join(map(str, RATIOS)) + ")")
+    calibrate_parser.add_argument("--min-support", type=int, default=MIN_SUPPORT,
+                                  help="installs needed to fit a criterion, below it the current one stays "
+                                       "(default: %(default)s)")
+    calibrate_parser.add_argument("--seed", type=int, default=0, help="seed of the fold split (default: %(default)s)")
+
+    scenarios_parser = subparsers.add_parser("scenarios", parents=[common, validation],
+                                             help="list, import, replay and diff saved scenarios")
+    scenarios_parser.add_argument("action", choices=["list", "import", "replay", "diff"],
+                                  help="list the scenarios, import an inventory as scenarios, replay them with the "
+                                       "criteria in use, or diff their recommendations against --base")
+    scenarios_parser.add_argument("input", nargs="?",
+                                  help=f"import: CSV, Parquet or well store ({STORE_EXTENSION}) file with one "
+                                       "scenario per row, identified by the well_id and scenario columns")
+    scenarios_parser.add_argument("--store", metavar="FILE",
+                                  help=f"scenario store (default: ${SCENARIO_FILE_ENV} or {DEFAULT_SCENARIO_FILE})")
+    scenarios_parser.add_argument("--well", metavar="ID", help="only the scenarios of this well")
+    scenarios_parser.add_argument("--tag", help="only the scenarios with this tag; import: tag the scenarios")
+    scenarios_parser.add_argument("--name", default="imported",
+                                  help="import: scenario name of rows without a scenario column "
+                                       "(default: %(default)s)")
+    scenarios_parser.add_argument("--base", metavar="FILE",
+                                  help="diff: criteria file to compare against (default: the recommendations saved "
+                                       "with the scenarios)")
+    scenarios_parser.add_argument("-o", "--output",
+                                  help="replay: CSV or Parquet file of the scores (default: CSV on stdout); "
+                                       "diff: file of the changed scenarios")
+
+    speedup_parser = subparsers.add_parser("speedup", parents=[common],
+                                           help="report the parallel speedup for 1..N workers")
+    speedup_parser.add_argument("--wells", type=int, default=200000,
+                                help="number of synthetic wells (default: %(default)s)")
+    speedup_parser.add_argument("-j", "--max-workers", type=int, default=default_workers(),
+                                help="largest worker count to time (default: %(default)s)")
+    speedup_parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE,
+                                help="wells per task (default: %(default)s)")
+
+    uncertainty_parser = subparsers.add_parser("uncertainty", parents=[common],
+                                               help="Monte Carlo lift selection under uncertain inputs")
+    uncertainty_parser.add_argument("--well", required=True, metavar="FILE",
+                                    help="JSON file with the base value of every criterion")
+    uncertainty_parser.add_argument("--dist", action="append", default=[], metavar="NAME=KIND:ARGS",
+                                    help="input distribution, e.g. gor=triangular:800,1200,1600 (repeatable)")
+    uncertainty_parser.add_argument("-n", "--samples", type=int, default=DEFAULT_SAMPLES,
+                                    help="number of samples (default: %(default)s)")
+    uncertainty_parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    uncertainty_parser.add_argument("--chunk-size", type=int, default=DEFAULT_MC_CHUNK_SIZE,
+                                    help="samples scored at a time (default: %(default)s)")
+
+    sensitivity_parser = subparsers.add_parser("sensitivity", parents=[common],
+                                               help="tornado chart and decision boundaries around one well")
+    sensitivity_parser.add_argument("--well", required=True, metavar="FILE",
+                                    help="JSON file with the base value of every criterion")
+    sensitivity_parser.add_argument("--param", action="append", default=[], metavar="NAME",
+                                    help="parameter whose decision boundaries are listed (repeatable, "
+                                         "two give a decision map summary)")
+    sensitivity_parser.add_argument("--points", type=int, default=DEFAULT_POINTS,
+                                    help=f"grid points per parameter, at most {MAX_GRID_POINTS} "
+                                         "(default: %(default)s)")
+
+    benchmark_parser = subparsers.add_parser("benchmark", parents=[common],
+                                             help="time the scoring, ranking and rendering hot paths")
+    benchmark_parser.add_argument("-o", "--output", metavar="FILE", help="save the results as JSON")
+    benchmark_parser.add_argument("--baseline", metavar="FILE",
+                                  help="earlier results to compare against, exits with 1 on a regression")
+    benchmark_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                  help="slowdown counted as a regression (default: %(default)s)")
+    benchmark_parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                                  help="synthetic batch sizes (default: %(default)s)")
+    benchmark_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                                  help="timed runs per benchmark (default: %(default)s)")
+    benchmark_parser.add_argument("--no-gui", action="store_true",
+                                  help="skip the table and chart redraw benchmarks")
+
+    serve_parser = subparsers.add_parser("serve", parents=[common],
+                                         help="local HTTP/JSON scoring service with request batching")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on (default: %(default)s)")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port (default: %(default)s)")
+    serve_parser.add_argument("--max-batch", type=int, default=MAX_BATCH,
+                              help="most wells scored in one call (default: %(default)s)")
+    serve_parser.add_argument("--max-wait", type=float, default=MAX_WAIT * 1000,
+                              help="longest a request waits for others to batch with, in ms (default: %(default)s)")
+
+    load_parser = subparsers.add_parser("loadtest", parents=[common],
+                                        help="measure the scoring service's throughput and latency")
+    load_parser.add_argument("--host", default=DEFAULT_HOST, help="service address (default: %(default)s)")
+    load_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="service port (default: %(default)s)")
+    load_parser.add_argument("-n", "--requests", type=int, default=20000,
+                             help="number of requests (default: %(default)s)")
+    load_parser.add_argument("-c", "--concurrency", type=int, default=64,
+                             help="concurrent connections (default: %(default)s)")
+    load_parser.add_argument("--route", choices=["/predict", "/scores"], default="/predict",
+                             help="endpoint to load (default: %(default)s)")
+    load_parser.add_argument("--wells", type=int, default=1,
+                             help="wells per request (default: %(default)s)")
+    load_parser.add_argument("--spawn", action="store_true",
+                             help="start a service for the test in another process and stop it afterwards")
+
+    criteria_parser = subparsers.add_parser("criteria", parents=[common],
+                                            help="write the criteria table in use to a file for editing")
+    criteria_parser.add_argument("-o", "--output", default="lift_criteria.json",
+                                 help="criteria file to write (default: %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.criteria:
+        try:
+            use_criteria_file(args.criteria)
+        except (OSError, ValueError) as e:
+            print(f"Could not load the criteria file: {e}", file=sys.stderr)
+            return 1
+
+    if args.command == "batch":
+        if not os.path.exists(args.input):
+            print(f"Input file not found: {args.input}", file=sys.stderr)
+            return 1
+        try:
+            units = dict(parse_unit(text) for text in args.unit)
+            report = ErrorReport(args.errors)
+            cache = ResultCache(path=args.cache) if args.cache else None
+            ranking = None
+            if args.constraint or args.max_cost is not None or args.pareto:
+                ranking = {'constraints': dict.fromkeys(args.constraint, True), 'max_cost': args.max_cost,
+                           'pareto': args.pareto}
+            try:
+                n_wells = run_batch(args.input, args.output, args.chunk_size, workers=args.workers, cache=cache,
+                                    topsis=args.topsis, ranking=ranking, units=units, report=report)
+            finally:
+                report.close()
+        except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+            print(f"Batch run failed: {e}", file=sys.stderr)
+            return 1
+        print(f"Scored {n_wells} wells", file=sys.stderr)
+        print_rejected(report)
+        if cache is not None:
+            stats = cache.stats()
+            cache.close()
+            print("Cache: {hits} hits, {misses} misses, {evictions} evictions".format(**stats), file=sys.stderr)
+
+    elif args.command == "store":
+        if not os.path.exists(args.input):
+            print(f"Input file not found: {args.input}", file=sys.stderr)
+            return 1
+        if not is_store(args.output):
+            print(f"The well store must have the {STORE_EXTENSION} extension: {args.output}", file=sys.stderr)
+            return 1
+        try:
+            units = dict(parse_unit(text) for text in args.unit)
+            report = ErrorReport(args.errors)
+            try:
+                n_wells = write_store(args.input, args.output, args.chunk_size, units, report)
+            finally:
+                report.close()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Conversion failed: {e}", file=sys.stderr)
+            return 1
+        print(f"Wrote {n_wells} wells to {args.output}", file=sys.stderr)
+        print_rejected(report)
+
+    elif args.command == "portfolio":
+        if not os.path.exists(args.input):
+            print(f"Input file not found: {args.input}", file=sys.stderr)
+            return 1
+        try:
+            units = dict(parse_unit(text) for text in args.unit)
+            report = ErrorReport(args.errors)
+            try:
+                result = run_portfolio(args.input, args.output, {name: getattr(args, name) for name in RESOURCES},
+                                       dict.fromkeys(args.constraint, True), units, report,
+                                       {'capex': args.unknown_cost} if args.unknown_cost is not None else None)
+            finally:
+                report.close()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Portfolio optimization failed: {e}", file=sys.stderr)
+            return 1
+        print_rejected(report)
+        # The summary goes to stderr when the assignment is written to stdout
+        print_portfolio(result, sys.stderr if args.output == "-" else sys.stdout)
+
+    elif args.command == "calibrate":
+        if not os.path.exists(args.input):
+            print(f"Input file not found: {args.input}", file=sys.stderr)
+            return 1
+        try:
+            ratios = tuple(args.ratio or RATIOS)
+            if not all(0 <= ratio <= 1 for ratio in ratios):
+                raise ValueError("Ratios must be between 0 and 1")
+            units = dict(parse_unit(text) for text in args.unit)
+            report = ErrorReport(args.errors)
+            try:
+                table, calibration = run_calibration(args.input, args.output, args.folds, args.workers, ratios,
+                                                     args.min_support, args.success_at, args.seed, units, report)
+            finally:
+                report.close()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Calibration failed: {e}", file=sys.stderr)
+            return 1
+        print_rejected(report)
+        print_calibration(table, calibration)
+        print(f"Wrote criteria version {table.version} to {args.output}", file=sys.stderr)
+
+    elif args.command == "scenarios":
+        if args.action == "import" and not args.input:
+            print("The import action needs an input file", file=sys.stderr)
+            return 1
+        if args.action == "import" and not os.path.exists(args.input):
+            print(f"Input file not found: {args.input}", file=sys.stderr)
+            return 1
+        try:
+            store = ScenarioStore(args.store)
+            try:
+                if args.action == "list":
+                    print_scenarios(store.find(args.well, args.tag, LIST_LIMIT),
+                                    len(store.find(args.well, args.tag)) if args.well or args.tag else len(store))
+                elif args.action == "import":
+                    units = dict(parse_unit(text) for text in args.unit)
+                    report = ErrorReport(args.errors)
+                    try:
+                        n_saved = import_scenarios(args.input, store, args.name, args.tag, units, report)
+                    finally:
+                        report.close()
+                    print(f"Saved {n_saved} scenarios to {store.path}", file=sys.stderr)
+                    print_rejected(report)
+                elif args.action == "replay":
+                    n_scenarios = write_replay(store, args.output or "-", args.well, args.tag)
+                    print(f"Replayed {n_scenarios} scenarios", file=sys.stderr)
+                else:
+                    diff = diff_recommendations(store, base=load_criteria(args.base) if args.base else None,
+                                                well_id=args.well, tag=args.tag)
+                    if args.output:
+                        write_diff(diff, args.output)
+                    print_diff(diff)
+                stats = store.stats()
+            finally:
+                store.close()
+        except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+            print(f"Scenario {args.action} failed: {e}", file=sys.stderr)
+            return 1
+        print("Store: {scenarios} scenarios of {wells} wells, {contents} distinct inputs".format(**stats),
+              file=sys.stderr)
+
+    elif args.command == "speedup":
+        print("workers  seconds  speedup")
+        for workers, seconds, speedup in measure_speedup(args.wells, args.max_workers, args.shard_size):
+            print(f"{workers:7d}  {seconds:7.3f}  {speedup:6.2f}x")
+
+    elif args.command == "uncertainty":
+        try:
+            with open(args.well) as handle:
+                base_well = json.load(handle)
+            distributions = dict(parse_distribution(text) for text in args.dist)
+            if args.samples <= 0:
+                raise ValueError("--samples must be positive")
+            summary = None
+            for summary in iter_monte_carlo(base_well, distributions, args.samples, args.seed, args.chunk_size):
+                print(f"{summary.n_samples} / {args.samples} samples", file=sys.stderr)
+        except (OSError, ValueError) as e:
+            print(f"Uncertainty run failed: {e}", file=sys.stderr)
+            return 1
+        if summary is None:
+            print("Uncertainty run drew no samples", file=sys.stderr)
+            return 1
+        print_uncertainty(summary)
+
+    elif args.command == "sensitivity":
+        try:
+            with open(args.well) as handle:
+                base_well = json.load(handle)
+            unknown = [name for name in args.param if name not in PARAMETER_NAMES]
+            if unknown:
+                raise ValueError("Unknown parameter(s): " + ", ".join(unknown))
+            result = tornado(base_well, n_points=args.points)
+            boundaries = [(name, sweep(base_well, name, sweep_values(name, args.points))['boundaries'])
+                          for name in args.param]
+            if len(args.param) == 2:
+                grid = sweep_2d(base_well, args.param[0], args.param[1], sweep_values(args.param[0], args.points),
+                                sweep_values(args.param[1], args.points))
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Sensitivity run failed: {e}", file=sys.stderr)
+            return 1
+        print_sensitivity(result, boundaries)
+        if len(args.param) == 2:
+            shares = np.bincount(grid['best'].ravel(), minlength=len(grid['methods'])) / grid['best'].size
+            print()
+            print(f"Decision map {grid['x']} x {grid['y']} ({grid['best'].shape[1]} x {grid['best'].shape[0]}):")
+            for method, share in zip(grid['methods'], shares):
+                if share:
+                    print(f"  {method}: {share:.1%} of the grid")
+
+    elif args.command == "benchmark":
+        try:
+            baseline = load_results(args.baseline) if args.baseline else None
+            sizes = [int(size) for size in args.sizes.split(",")]
+        except (OSError, ValueError) as e:
+            print(f"Benchmark failed: {e}", file=sys.stderr)
+            return 1
+        run = run_benchmarks(sizes, args.repeat, gui=not args.no_gui)
+        if args.output:
+            save_results(run, args.output)
+        failed = [name for name, passed in run['checks'].items() if not passed]
+        if baseline is None:
+            print_benchmarks(run)
+        else:
+            if baseline['machine'].get('processor') != run['machine']['processor']:
+                print("Warning: the baseline was recorded on a different machine", file=sys.stderr)
+            rows = compare_results(run, baseline, args.threshold)
+            print_comparison(rows, args.threshold)
+            failed += [row[0] for row in rows if row[4]]
+        for name in failed:
+            if name in run['checks']:
+                print(f"Check failed: {name}", file=sys.stderr)
+        if failed:
+            return 1
+
+    elif args.command == "serve":
+        try:
+            stats = serve(args.host, args.port, args.max_batch, args.max_wait / 1000)
+        except OSError as e:
+            print(f"Could not start the service: {e}", file=sys.stderr)
+            return 1
+        for route, route_stats in stats['routes'].items():
+            if route_stats['requests']:
+                print(f"{route}: {route_stats['requests']} requests, p50 {route_stats['latency_ms']['p50']:.2f} ms, "
+                      f"p99 {route_stats['latency_ms']['p99']:.2f} ms", file=sys.stderr)
+
+    elif args.command == "loadtest":
+        try:
+            report = run_load_test(args.host, args.port, args.requests, args.concurrency, args.route, args.wells,
+                                   args.spawn)
+        except (OSError, RuntimeError) as e:
+            print(f"Load test failed: {e}", file=sys.stderr)
+            return 1
+        print_load_test(report)
+        if report['errors']:
+            return 1
+
+    elif args.command == "criteria":
+        version = save_criteria(current_criteria(), args.output)
+        print(f"Wrote criteria version {version} to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
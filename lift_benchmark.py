@@ -0,0 +1,219 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from lift_criteria import PARAMETER_NAMES, current_criteria
+from lift_engine import default_criteria, predict_best_lift_methods, score_wells, synthetic_wells
+from lift_scoring import calculate_scores, predict_best_lift_method
+from lift_store import STORE_EXTENSION, WellStoreWriter, open_store, score_store
+from lift_topsis import topsis_wells
+from lift_validation import ErrorReport
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.25
+
+# Run in a fresh interpreter to time a cold start: importing the scoring core, then showing the window.
+# Also reports which heavy packages were loaded at each point
+STARTUP_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import lift_scoring
+core = time.perf_counter() - start
+core_modules = [name for name in ('PyQt5', 'matplotlib') if name in sys.modules]
+from PyQt5.QtWidgets import QApplication
+import estella_main
+app = QApplication(sys.argv)
+window = estella_main.ArtificialLiftInterface()
+window.show()
+app.processEvents()
+shown = time.perf_counter() - start
+print(json.dumps({'core': core, 'window': shown, 'core_modules': core_modules,
+                  'window_matplotlib': 'matplotlib' in sys.modules}))
+'''
+
+# A batch measurement stops repeating once it has used this many seconds, so the 1M tier stays affordable
+BATCH_TIME_BUDGET = 10.0
+
+
+def measure(function, repeat=DEFAULT_REPEAT, number=None):
+    # Median per-call seconds of repeat runs, like timeit. number is found automatically so that one run
+    # takes at least 0.2 s, which keeps microsecond calls above the timer resolution
+    timer = timeit.Timer(function)
+    if number is None:
+        number = timer.autorange()[0]
+    return statistics.median(seconds / number for seconds in timer.repeat(repeat, number))
+
+
+def measure_batch(function, repeat=DEFAULT_REPEAT):
+    # Median seconds of up to repeat single runs within BATCH_TIME_BUDGET
+    timings = []
+    while len(timings) < repeat and sum(timings) < BATCH_TIME_BUDGET:
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def peak_memory(function):
+    # Peak bytes allocated while function runs, NumPy buffers included
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def result(value, unit, better='lower'):
+    return {'value': value, 'unit': unit, 'better': better}
+
+
+def benchmark_wells(seed=0):
+    # A few fixed wells in the argument order of predict_best_lift_method
+    columns = synthetic_wells(16, seed)
+    return [tuple(columns[name][i].item() for name in PARAMETER_NAMES) for i in range(16)]
+
+
+def single_well_benchmarks(repeat=DEFAULT_REPEAT):
+    # Latency of one Predict: the uncached scoring and TOPSIS functions, and a cache hit
+    wells = benchmark_wells()
+    results = {}
+    cases = [('single_well.predict_best_lift_method', predict_best_lift_method.uncached),
+             ('single_well.calculate_scores', calculate_scores.uncached),
+             ('single_well.predict_best_lift_method_cached', predict_best_lift_method)]
+    for name, function in cases:
+        seconds = measure(lambda: [function(*well) for well in wells], repeat)
+        results[name] = result(seconds / len(wells) * 1e6, 'us')
+    return results
+
+
+def batch_benchmarks(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT):
+    # Throughput of the vectorized field paths on synthetic wells, and the peak memory of scoring. The
+    # well store case opens and scores a store file written beforehand, as a field load would
+    criteria = default_criteria()
+    cases = [('score_wells', score_wells), ('predict_best_lift_methods', predict_best_lift_methods),
+             ('topsis_wells', topsis_wells)]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for n_wells in sizes:
+            wells = synthetic_wells(n_wells)
+            for name, function in cases:
+                seconds = measure_batch(lambda: function(wells, criteria), repeat)
+                results[f'batch.{name}.{n_wells}'] = result(n_wells / seconds, 'wells/s', 'higher')
+            results[f'batch.peak_memory.{n_wells}'] = result(
+                peak_memory(lambda: score_wells(wells, criteria)) / 2 ** 20, 'MiB')
+
+            path = os.path.join(directory, f'{n_wells}{STORE_EXTENSION}')
+            writer = WellStoreWriter(path)
+            writer.write(wells)
+            writer.close()
+            seconds = measure_batch(lambda: score_store(open_store(path), criteria), repeat)
+            results[f'batch.score_store.{n_wells}'] = result(n_wells / seconds, 'wells/s', 'higher')
+    return results
+
+
+def render_benchmarks(repeat=DEFAULT_REPEAT, field_wells=100000):
+    # Redraw time of the Results tab table and bar chart and of the Field tab charts for field_wells wells,
+    # on an offscreen Qt platform with Agg rendering. Charts blit every update, no frames are merged
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    import matplotlib
+    matplotlib.use('Agg')
+    from PyQt5.QtWidgets import QApplication
+
+    from estella_main import METHOD_ABBREVIATIONS, ArtificialLiftInterface
+    from lift_field import score_field
+
+    app = QApplication.instance() or QApplication([])
+    window = ArtificialLiftInterface()
+    window.create_results_chart()
+    window.results_blitter.frame_budget = 0
+    scores = calculate_scores.uncached(*benchmark_wells()[0])
+    als_methods = [METHOD_ABBREVIATIONS.get(method, method) for method in scores]
+    pis_values, nis_values, ps_values = (list(column) for column in zip(*scores.values()))
+
+    results = {}
+    seconds = measure(lambda: window.display_results(als_methods, pis_values, nis_values, ps_values), repeat)
+    results['render.display_results'] = result(seconds * 1e3, 'ms')
+    seconds = measure(lambda: window.plot_performance_scores(als_methods, ps_values), repeat)
+    results['render.plot_performance_scores'] = result(seconds * 1e3, 'ms')
+
+    window.show_field((score_field(synthetic_wells(field_wells)), ErrorReport()))
+    window.field_blitter.frame_budget = 0
+    seconds = measure(window.update_field_charts, repeat)
+    results[f'render.field_charts.{field_wells}'] = result(seconds * 1e3, 'ms')
+    window.close()
+    app.processEvents()
+    return results
+
+
+def startup_probe():
+    environment = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+    completed = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               env=environment, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def startup_benchmarks(repeat=DEFAULT_REPEAT):
+    # Cold-start times over repeat fresh interpreters, and the start-up checks: the scoring core imports
+    # without Qt or matplotlib, and the window appears without matplotlib (loaded with the Results tab)
+    probes = [startup_probe() for _ in range(repeat)]
+    results = {'startup.import_core': result(statistics.median(probe['core'] for probe in probes) * 1e3, 'ms'),
+               'startup.window_shown': result(statistics.median(probe['window'] for probe in probes) * 1e3, 'ms')}
+    checks = {'core_without_gui': not probes[0]['core_modules'],
+              'window_without_matplotlib': not probes[0]['window_matplotlib']}
+    return results, checks
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, gui=True):
+    results = {}
+    checks = {}
+    results.update(single_well_benchmarks(repeat))
+    results.update(batch_benchmarks(sizes, repeat))
+    if gui:
+        startup_results, checks = startup_benchmarks(repeat)
+        results.update(startup_results)
+        results.update(render_benchmarks(repeat))
+    return {'machine': machine_info(), 'results': results, 'checks': checks}
+
+
+def machine_info():
+    return {'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count(),
+            'python': platform.python_version(), 'numpy': np.__version__, 'criteria': current_criteria().version}
+
+
+def save_results(run, path):
+    with open(path, 'w') as handle:
+        json.dump(run, handle, indent=2)
+
+
+def load_results(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def compare_results(run, baseline, threshold=DEFAULT_THRESHOLD):
+    # [(name, baseline value, value, change, regressed)] for every benchmark in both runs. change is the
+    # relative slowdown (positive is worse whichever way the unit goes) and regressed marks changes over
+    # threshold
+    rows = []
+    for name, current in run['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None or not previous['value'] or not current['value']:
+            continue
+        if current['better'] == 'higher':
+            change = previous['value'] / current['value'] - 1
+        else:
+            change = current['value'] / previous['value'] - 1
+        rows.append((name, previous['value'], current['value'], change, change > threshold))
+    return rows
@@ -0,0 +1,245 @@
+import collections
+import functools
+import json
+import numbers
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from lift_criteria import PARAMETER_KINDS, PARAMETER_NAMES, current_criteria
+from lift_metrics import count
+
+DEFAULT_MAXSIZE = 4096
+DEFAULT_DISK_MAXSIZE = 1000000
+
+# Environment variables for the shared cache: a SQLite file to persist it, and the in-memory size
+CACHE_FILE_ENV = 'LIFT_CACHE_FILE'
+CACHE_SIZE_ENV = 'LIFT_CACHE_SIZE'
+
+# NaN never equals itself, so every NaN input is replaced by this one object: dict lookups
+# compare identity first, which makes NaN keys hit like any other value
+_NAN = float('nan')
+_MISSING = object()
+
+
+def canonical_value(value):
+    # Numbers that compare equal give the same key (5, 5.0, -0.0 and 0.0, numpy floats), strings are kept
+    # exactly since ' primary' and 'primary' do not score the same. The exact type checks skip the slower
+    # numbers.Real check for the common inputs
+    kind = type(value)
+    if kind is str:
+        return value
+    if kind is float or kind is int or isinstance(value, numbers.Real):
+        value = float(value) + 0.0
+        return _NAN if value != value else value
+    return value
+
+
+def make_key(kind, values, version):
+    return (kind, version) + tuple(map(canonical_value, values))
+
+
+class ResultCache:
+    # Bounded LRU cache of scoring results with hit/miss/eviction counters. With a path, entries are
+    # also written to a SQLite file and looked up there on a memory miss, so they survive restarts
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, path=None, disk_maxsize=DEFAULT_DISK_MAXSIZE):
+        self.maxsize = maxsize
+        self.path = path
+        self.disk_maxsize = disk_maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                             "used REAL NOT NULL)")
+            self._prune_disk()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM results WHERE key = ?", (_dump(key),)).fetchone()
+                if row is not None:
+                    value = _load(row[0])
+                    self._store(key, value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def put_many(self, items):
+        with self._lock:
+            items = list(items)
+            for key, value in items:
+                self._store(key, value)
+            if self._db is not None and items:
+                now = time.time()
+                self._db.executemany("INSERT OR REPLACE INTO results (key, value, used) VALUES (?, ?, ?)",
+                                     [(_dump(key), _dump(value), now) for key, value in items])
+                self._db.commit()
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _prune_disk(self):
+        # Drop the least recently written rows beyond disk_maxsize
+        self._db.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used DESC "
+                         "LIMIT -1 OFFSET ?)", (self.disk_maxsize,))
+        self._db.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'disk_hits': self.disk_hits,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._prune_disk()
+                self._db.close()
+                self._db = None
+
+
+def _dump(value):
+    return json.dumps(value)
+
+
+def _load(text):
+    return _tuples(json.loads(text))
+
+
+def _tuples(value):
+    # JSON turns tuples into lists, the cached results use tuples
+    if isinstance(value, list):
+        return tuple(_tuples(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _tuples(item) for key, item in value.items()}
+    return value
+
+
+_default_cache = None
+
+
+def default_cache():
+    # The cache shared by the GUI and the command line, configured from LIFT_CACHE_FILE/LIFT_CACHE_SIZE
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache(int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_MAXSIZE)),
+                                     os.environ.get(CACHE_FILE_ENV) or None)
+    return _default_cache
+
+
+def set_default_cache(cache):
+    global _default_cache
+    if _default_cache is not None and _default_cache is not cache:
+        _default_cache.close()
+    _default_cache = cache
+    return cache
+
+
+def memoize(kind):
+    # Cache a scoring function on its positional arguments plus the criteria version, so editing the
+    # criteria file invalidates earlier results. None (a failed call) is never cached. Every caller gets its
+    # own copy of a dict result, so one that changes it does not change what later hits return
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args):
+            cache = default_cache()
+            key = make_key(kind, args, current_criteria().version)
+            value = cache.get(key, _MISSING)
+            if value is _MISSING:
+                count('cache.misses', kind=kind)
+                value = function(*args)
+                if value is not None:
+                    cache.put(key, value)
+            else:
+                count('cache.hits', kind=kind)
+            return _fresh(value)
+        wrapper.uncached = function
+        return wrapper
+    return decorator
+
+
+def _fresh(value):
+    # The cached results are strings, tuples and dicts of tuples, only the dict itself can change
+    return dict(value) if isinstance(value, dict) else value
+
+
+def score_columns_cached(columns, criteria, cache):
+    # Score prepared well columns, looking each distinct well configuration up in the cache first and
+    # scoring only the misses. Duplicated wells (e.g. a pad sharing fluid, depth and casing) cost one entry
+    matrix, category_mask = criteria.encode(columns)
+    if not len(matrix):
+        return criteria.score(matrix, category_mask)
+    unique_rows, first, inverse = _unique_rows(matrix)
+
+    unique_scores = np.empty((len(unique_rows), len(criteria.methods)), dtype=np.int16)
+    keys = _row_keys(unique_rows, columns, first, criteria.version)
+    missing = []
+    for u, key in enumerate(keys):
+        value = cache.get(key)
+        if value is None:
+            missing.append(u)
+        else:
+            unique_scores[u] = value
+
+    if missing:
+        unique_scores[missing] = criteria.score(unique_rows[missing], category_mask)
+        cache.put_many((keys[u], tuple(int(score) for score in unique_scores[u])) for u in missing)
+
+    return unique_scores[inverse.reshape(-1)]
+
+
+def _unique_rows(matrix):
+    # np.unique(matrix, axis=0) with the first well of each row, several times faster: each row is compared
+    # as one block of bytes, after -0.0 and every NaN are made the same bits as 0.0 and np.nan
+    matrix = np.ascontiguousarray(matrix + 0.0)
+    matrix[np.isnan(matrix)] = np.nan
+    rows = matrix.view(np.dtype((np.void, matrix.dtype.itemsize * matrix.shape[1]))).reshape(-1)
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    return matrix[first], first, inverse.reshape(-1)
+
+
+def _row_keys(unique_rows, columns, first, version):
+    # make_key('batch_scores', ...) of each distinct row, built a column at a time: the numbers from the
+    # unique matrix rows, the choices (whose codes differ from chunk to chunk) from the row's first well
+    values = (unique_rows + 0.0).astype(object)
+    values[np.isnan(unique_rows)] = _NAN
+    for i, name in enumerate(PARAMETER_NAMES):
+        if PARAMETER_KINDS[name] == 'in':
+            values[:, i] = np.asarray(columns[name])[first].astype(str).tolist()
+    prefix = ('batch_scores', version)
+    return [prefix + tuple(row) for row in values.tolist()]
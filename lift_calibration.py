@@ -0,0 +1,328 @@
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from lift_criteria import PARAMETERS, PARAMETER_KINDS, PARAMETER_NAMES, CriteriaTable
+from lift_engine import PARAMETER_INDEX, CompiledCriteria
+from lift_validation import parse_column
+
+# Columns of a history file besides the criteria: the lift method installed and its outcome, 1/0 for
+# success/failure or a figure such as the run life in days with a success_at threshold
+METHOD_COLUMN = 'method'
+OUTCOME_COLUMN = 'outcome'
+
+# A method rejects a choice, or a range of values, when its installs with them succeeded less than this
+# ratio times as often as all its installs; cross-validation picks one
+RATIOS = (0.25, 0.5, 0.75, 0.9)
+DEFAULT_FOLDS = 5
+
+# Quantile bins a numeric parameter is cut into per method
+BINS = 20
+
+# Installs a bin or a choice needs to count, fewer keep the prior table's criterion
+MIN_SUPPORT = 10
+
+# Weight a criterion keeps however little it separates successes from failures, before normalizing
+WEIGHT_FLOOR = 0.01
+
+# Fitted bounds are rounded outwards, and weights rounded, to this many decimals
+DECIMALS = 4
+
+NUMERIC_NAMES = tuple(name for name, kind in PARAMETERS if kind != 'in')
+CATEGORY_NAMES = tuple(name for name, kind in PARAMETERS if kind == 'in')
+NUMERIC_INDEX = [PARAMETER_INDEX[name] for name in NUMERIC_NAMES]
+
+# 'eq' parameters (dogleg severity, flowing pressure, reservoir access) are fitted as ranges like the others
+RANGED = tuple(name for name in NUMERIC_NAMES if PARAMETER_KINDS[name] == 'eq')
+
+
+def load_history(chunks, methods, success_at=1, report=None):
+    # Gather a history of installs from lift_batch.validated_chunks: the criteria encoded once as in
+    # CompiledCriteria.encode, the index of the method installed and whether it succeeded (outcome >=
+    # success_at). Rows naming a method the criteria table does not have, or without a numeric outcome,
+    # are rejected into report like invalid criteria
+    index = {method: j for j, method in enumerate(methods)}
+    parts = []
+    for columns, prepared, rows in chunks:
+        missing = [name for name in (METHOD_COLUMN, OUTCOME_COLUMN) if name not in columns]
+        if missing:
+            raise ValueError("Missing column(s): " + ", ".join(missing))
+        method = np.array([index.get(str(value).strip(), -1) for value in columns[METHOD_COLUMN]], dtype=np.intp)
+        outcome, problems = parse_column(OUTCOME_COLUMN, columns[OUTCOME_COLUMN])
+        problems[(problems == '') & np.isnan(outcome)] = 'missing'
+        bad_method = method < 0
+        bad_outcome = problems != ''
+        if report is not None and (bad_method.any() or bad_outcome.any()):
+            report.add(_history_errors(columns, rows, bad_method, bad_outcome, problems))
+        keep = ~(bad_method | bad_outcome)
+        parts.append(({name: np.asarray(prepared[name])[keep] for name in PARAMETER_NAMES}, method[keep],
+                      outcome[keep] >= success_at))
+
+    method = np.concatenate([part[1] for part in parts]) if parts else np.empty(0, dtype=np.intp)
+    if not len(method):
+        raise ValueError("The history has no valid installs")
+
+    # Categorical columns hold codes into history['vocabulary'][name], offset as in CompiledCriteria.encode
+    # so a table's category mask is all that changes between tables
+    matrix = np.empty((len(method), len(PARAMETERS)), dtype=float)
+    vocabulary = {}
+    offset = 0
+    for i, (name, kind) in enumerate(PARAMETERS):
+        values = np.concatenate([part[0][name] for part in parts])
+        if kind == 'in':
+            vocabulary[name], codes = np.unique(values.astype(str), return_inverse=True)
+            matrix[:, i] = codes.reshape(-1) + offset
+            offset += len(vocabulary[name])
+        else:
+            matrix[:, i] = values
+    return {'matrix': matrix, 'vocabulary': vocabulary, 'method': method,
+            'success': np.concatenate([part[2] for part in parts])}
+
+
+def _history_errors(columns, rows, bad_method, bad_outcome, problems):
+    # lift_validation style errors for the method and outcome columns of a chunk, rows counted from 0
+    found = [(np.flatnonzero(bad_method), METHOD_COLUMN, 'not a method of the criteria table'),
+             (np.flatnonzero(bad_outcome), OUTCOME_COLUMN, None)]
+    local = np.concatenate([flagged for flagged, _, _ in found])
+    order = np.argsort(local, kind='stable')
+    local = local[order]
+    names = np.concatenate([np.full(len(flagged), name, dtype=object) for flagged, name, _ in found])[order]
+    messages = np.concatenate([np.full(len(flagged), message, dtype=object) if message else problems[flagged]
+                               for flagged, _, message in found])[order]
+    well_ids = columns.get('well_id')
+    return {'row': rows[local],
+            'well_id': np.array(['' if well_ids is None else well_ids[i] for i in local.tolist()], dtype=object),
+            'parameter': names,
+            'value': np.array([columns[name][i] for name, i in zip(names.tolist(), local.tolist())], dtype=object),
+            'error': messages}
+
+
+def select_installs(history, rows):
+    return dict(history, matrix=history['matrix'][rows], method=history['method'][rows],
+                success=history['success'][rows])
+
+
+def category_mask(history, compiled):
+    # (vocabulary x methods) category mask of a table for the codes of an encoded history
+    masks = [compiled.category_mask(name, history['vocabulary'][name].tolist()) for name in CATEGORY_NAMES]
+    return np.concatenate(masks) if masks else np.zeros((0, len(compiled.methods)), dtype=bool)
+
+
+def fit_criteria(history, prior, ratios=RATIOS, min_support=MIN_SUPPORT):
+    # Criteria fitted to a history, one lift_methods table per ratio. A method accepts the values its installs
+    # did not clearly fail more often with: the choices, and for a numeric parameter the span of the quantile
+    # bins, whose installs succeeded at least ratio times as often as all its installs. Choices and bins with
+    # fewer than min_support installs do not count, and a criterion with none keeps the prior table's (as an
+    # interval, so (inf, -inf) for one that matched nothing)
+    n_methods = len(prior.methods)
+    method, success = history['method'], history['success']
+
+    # (ratios x methods x parameters) bounds, starting from the prior
+    bounds = np.array([[prior.intervals[name][j] for name in NUMERIC_NAMES] for j in range(n_methods)], dtype=float)
+    low = np.repeat(bounds[None, :, :, 0], len(ratios), axis=0)
+    high = np.repeat(bounds[None, :, :, 1], len(ratios), axis=0)
+    numbers = history['matrix'][:, NUMERIC_INDEX]
+    scale = 10 ** DECIMALS
+    for j in range(n_methods):
+        installed = method == j
+        fitted_low, fitted_high = _fit_intervals(numbers[installed], success[installed], ratios, min_support)
+        fitted = ~np.isnan(fitted_low)
+        low[:, j][fitted] = np.floor(fitted_low[fitted] * scale) / scale
+        high[:, j][fitted] = np.ceil(fitted_high[fitted] * scale) / scale
+
+    categories = {name: _fit_choices(history, name, prior, ratios, min_support) for name in CATEGORY_NAMES}
+
+    tables = []
+    for r in range(len(ratios)):
+        tables.append({
+            prior.methods[j]: {name: (categories[name][r][j] if name in categories else
+                                      (float(low[r, j, NUMERIC_NAMES.index(name)]),
+                                       float(high[r, j, NUMERIC_NAMES.index(name)])))
+                               for name in PARAMETER_NAMES}
+            for j in range(n_methods)})
+    return tables
+
+
+def _fit_intervals(values, success, ratios, min_support):
+    # (ratios x parameters) low and high bounds for the installs of one method, NaN where nothing is
+    # fitted. Every parameter is cut into the same number of quantile bins (fewer for a small history) and
+    # the installs and successes per (parameter, bin) are counted with one bincount each
+    n_installs, n_params = values.shape
+    low = np.full((len(ratios), n_params), np.nan)
+    high = np.full((len(ratios), n_params), np.nan)
+    n_bins = min(BINS, n_installs // min_support)
+    if n_bins < 1:
+        return low, high
+    with warnings.catch_warnings():
+        # A parameter without values gives an all-NaN slice, it gets no bins
+        warnings.simplefilter('ignore', RuntimeWarning)
+        edges = np.nanquantile(values, np.linspace(0, 1, n_bins + 1), axis=0)
+    known = ~np.isnan(values)
+    bins = (values[:, None, :] > edges[None, 1:-1, :]).sum(axis=1)
+    cells = (np.arange(n_params) * n_bins + bins)[known]
+    installs = np.bincount(cells, minlength=n_params * n_bins).reshape(n_params, n_bins)
+    wins = np.bincount(cells, weights=np.broadcast_to(success[:, None], values.shape)[known],
+                       minlength=n_params * n_bins).reshape(n_params, n_bins)
+    with np.errstate(invalid='ignore'):
+        success_rate = wins.sum(axis=1) / installs.sum(axis=1)
+    columns = np.arange(n_params)
+    for r, ratio in enumerate(ratios):
+        accepted = (installs >= min_support) & (wins >= ratio * success_rate[:, None] * installs)
+        found = accepted.any(axis=1)
+        first = accepted.argmax(axis=1)
+        last = n_bins - 1 - accepted[:, ::-1].argmax(axis=1)
+        low[r, found] = edges[first, columns][found]
+        high[r, found] = edges[last + 1, columns][found]
+    return low, high
+
+
+def _fit_choices(history, name, prior, ratios, min_support):
+    # Accepted choices of one categorical parameter per ratio and method, from the installs and successes
+    # per (method, choice) counted with one bincount each. Blank values are never a choice
+    vocabulary = history['vocabulary'][name].tolist()
+    choices = [choice for choice in dict.fromkeys(list(prior.vocabulary[name]) + vocabulary) if choice.strip()]
+    code_of = {choice: code for code, choice in enumerate(choices)}
+    i = PARAMETER_INDEX[name]
+    offset = sum(len(history['vocabulary'][other]) for other in CATEGORY_NAMES[:CATEGORY_NAMES.index(name)])
+    codes = np.array([code_of.get(value, -1) for value in vocabulary], dtype=np.intp)[
+        history['matrix'][:, i].astype(np.intp) - offset]
+    known = codes >= 0
+    method, success = history['method'], history['success']
+    n_methods, n_choices = len(prior.methods), len(choices)
+    cells = method[known] * n_choices + codes[known]
+    installs = np.bincount(cells, minlength=n_methods * n_choices).reshape(n_methods, n_choices)
+    wins = np.bincount(cells, weights=success[known], minlength=n_methods * n_choices).reshape(n_methods, n_choices)
+    prior_masks = [prior.mask(name, choice) for choice in choices]
+    prior_accepted = np.array([[mask >> j & 1 for mask in prior_masks] for j in range(n_methods)], dtype=bool)
+    with np.errstate(invalid='ignore'):
+        success_rate = wins.sum(axis=1) / installs.sum(axis=1)
+    fitted = []
+    for ratio in ratios:
+        accepted = np.where(installs >= min_support, wins >= ratio * success_rate[:, None] * installs, prior_accepted)
+        fitted.append([[choice for choice, accept in zip(choices, row) if accept] for row in accepted.tolist()])
+    return fitted
+
+
+def installed_matches(history, compiled):
+    # (installs x parameters) matches of each install's criteria against the method installed, the same
+    # checks as CompiledCriteria.matches for that one method
+    matrix, method = history['matrix'], history['method']
+    met = np.empty(matrix.shape, dtype=bool)
+    values = matrix[:, compiled.range_index]
+    met[:, compiled.range_index] = (compiled.range_min.T[method] <= values) & (values <= compiled.range_max.T[method])
+    met[:, compiled.in_index] = category_mask(history, compiled)[matrix[:, compiled.in_index].astype(np.intp),
+                                                                 method[:, None]]
+    return met
+
+
+def fit_weights(history, table):
+    # Criterion weights from how much more often installs succeeded when the criterion was met than when it
+    # was not, with WEIGHT_FLOOR for the criteria that do not separate them. {parameter: weight}, summing to 1
+    met = installed_matches(history, CompiledCriteria(table))
+    success = history['success']
+    n_met = met.sum(axis=0)
+    wins_met = (met & success[:, None]).sum(axis=0)
+    n_missed = len(met) - n_met
+    wins_missed = success.sum() - wins_met
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lift = np.nan_to_num(wins_met / n_met - wins_missed / n_missed)
+    weights = np.clip(lift, 0, None) + WEIGHT_FLOOR
+    weights = np.round(weights / weights.sum(), DECIMALS)
+    return dict(zip(PARAMETER_NAMES, weights.tolist()))
+
+
+def evaluate(history, table):
+    # How well a table tells the successful installs from the failed ones: the AUC of the weighted share of
+    # criteria the installed method meets, and the share of successful installs whose method the table
+    # recommends (most criteria met)
+    compiled = CompiledCriteria(table)
+    met = installed_matches(history, compiled)
+    weights = np.full(len(PARAMETERS), 1 / len(PARAMETERS)) if table.weights is None else np.asarray(table.weights)
+    success = history['success']
+    best = compiled.score(history['matrix'], category_mask(history, compiled)).argmax(axis=1)
+    hits = (best == history['method'])[success]
+    return {'auc': auc(met @ weights, success), 'hit_rate': float(hits.mean()) if len(hits) else float('nan')}
+
+
+def auc(scores, positive):
+    # Probability that a positive scores above a negative, ties counting half (Mann-Whitney U from the
+    # average ranks). NaN without both
+    n_positive = int(positive.sum())
+    n_negative = len(positive) - n_positive
+    if not n_positive or not n_negative:
+        return float('nan')
+    _, inverse, counts = np.unique(scores, return_inverse=True, return_counts=True)
+    ranks = (np.cumsum(counts) - (counts - 1) / 2)[inverse.reshape(-1)]
+    return float((ranks[positive].sum() - n_positive * (n_positive + 1) / 2) / (n_positive * n_negative))
+
+
+def calibrated_table(lift_methods, history):
+    # A fitted lift_methods table with its criterion weights fitted to the same installs
+    unweighted = CriteriaTable(lift_methods, ranges=RANGED)
+    return CriteriaTable(lift_methods, weights=fit_weights(history, unweighted), ranges=RANGED)
+
+
+# History, prior table, fold of every install and settings, set once per worker process by _init_worker
+_worker_state = None
+
+
+def _init_worker(history, prior, folds, ratios, min_support):
+    global _worker_state
+    _worker_state = (history, prior, folds, ratios, min_support)
+
+
+def cross_validate_fold(fold):
+    # Fit on every other fold and evaluate on this one, for each ratio. Returns the number of installs
+    # evaluated and a (ratios x 2) array of AUC and hit rate
+    history, prior, folds, ratios, min_support = _worker_state
+    train = select_installs(history, folds != fold)
+    test = select_installs(history, folds == fold)
+    results = []
+    for lift_methods in fit_criteria(train, prior, ratios, min_support):
+        scores = evaluate(test, calibrated_table(lift_methods, train))
+        results.append((scores['auc'], scores['hit_rate']))
+    return len(test['method']), np.array(results)
+
+
+def calibrate(history, prior, n_folds=DEFAULT_FOLDS, workers=1, ratios=RATIOS, min_support=MIN_SUPPORT, seed=0):
+    # Calibrate the criteria to a history (load_history): k-fold cross-validation over the ratios, the folds
+    # run on `workers` processes, then a final fit on every install with the ratio of the highest mean AUC.
+    # The same seed gives the same table whatever the number of workers. Returns the table and a report of
+    # the cross-validation against the prior
+    n_installs = len(history['method'])
+    if n_installs < n_folds or n_folds < 2:
+        raise ValueError(f"Cross-validation needs at least 2 folds and one install per fold, got {n_folds} "
+                         f"folds for {n_installs} installs")
+    folds = np.random.default_rng(seed).permutation(n_installs) % n_folds
+    state = (history, prior, folds, tuple(ratios), min_support)
+
+    if workers == 1:
+        _init_worker(*state)
+        results = [cross_validate_fold(fold) for fold in range(n_folds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=state) as executor:
+            results = list(executor.map(cross_validate_fold, range(n_folds)))
+
+    # Fold results weighted by the installs they hold, folds without both outcomes have no AUC
+    sizes = np.array([size for size, _ in results], dtype=float)
+    scores = np.stack([fold_scores for _, fold_scores in results])
+    with np.errstate(invalid='ignore'):
+        mean = np.array([[np.nansum(scores[:, r, k] * sizes) / sizes[~np.isnan(scores[:, r, k])].sum()
+                          for k in range(2)] for r in range(len(ratios))])
+    # Highest AUC, ties to the lowest ratio (the criteria rejecting the least)
+    candidates = [r for r in range(len(ratios)) if not np.isnan(mean[r, 0])]
+    best = max(candidates, key=lambda r: (mean[r, 0], -ratios[r])) if candidates else 0
+
+    table = calibrated_table(fit_criteria(history, prior, (ratios[best],), min_support)[0], history)
+    success = history['success']
+    report = {
+        'installs': n_installs, 'successes': int(success.sum()), 'folds': n_folds, 'ratio': ratios[best],
+        'min_support': min_support, 'seed': seed, 'parent': prior.version,
+        'installs_per_method': dict(zip(prior.methods, np.bincount(history['method'],
+                                                                   minlength=len(prior.methods)).tolist())),
+        'cross_validation': [{'ratio': ratio, 'auc': float(mean[r, 0]), 'hit_rate': float(mean[r, 1])}
+                             for r, ratio in enumerate(ratios)],
+        'prior': evaluate(history, prior), 'fit': evaluate(history, table),
+    }
+    return table, report
@@ -0,0 +1,194 @@
+import time
+
+import numpy as np
+
+from lift_metrics import timer
+
+# Longest a redraw may take during streaming or interactive updates (30 frames per second). Updates
+# arriving faster are merged and drawn once the budget since the last frame has passed
+FRAME_BUDGET = 1 / 30
+
+# Scatter plots draw at most this many points, larger sets are evenly downsampled
+MAX_POINTS = 10000
+
+
+def downsample(n_points, max_points, *columns):
+    # Indices of about max_points evenly spaced points plus the lowest and highest finite value of each
+    # column, so the outliers that set the axis limits are always drawn
+    keep = [np.linspace(0, n_points - 1, max(max_points - 2 * len(columns), 2)).astype(np.int64)]
+    for values in columns:
+        values = np.asarray(values, dtype=float)
+        finite = np.flatnonzero(np.isfinite(values))
+        if len(finite):
+            keep.append(finite[[values[finite].argmin(), values[finite].argmax()]])
+    return np.unique(np.concatenate(keep))
+
+
+class BlitManager:
+    # Blitting for one canvas. The artists added here are animated: a full draw caches the background of
+    # their axes without them, and an update restores only the changed axes, draws their artists onto it
+    # and blits that region
+    def __init__(self, canvas, frame_budget=FRAME_BUDGET):
+        self.canvas = canvas
+        self.frame_budget = frame_budget
+        self.artists = []
+        self.backgrounds = {}
+        self.pending = set()
+        self.last_frame = 0.0
+        self.timer = canvas.new_timer(interval=int(frame_budget * 1000))
+        self.timer.single_shot = True
+        self.timer.add_callback(self.flush)
+        canvas.mpl_connect('draw_event', self.on_draw)
+
+    def add_artists(self, artists):
+        for artist in artists:
+            artist.set_animated(True)
+            self.artists.append(artist)
+
+    def remove_artists(self, artists):
+        artists = set(artists)
+        self.artists = [artist for artist in self.artists if artist not in artists]
+        for artist in artists:
+            artist.remove()
+
+    def on_draw(self, event):
+        for axes in {artist.axes for artist in self.artists}:
+            self.backgrounds[axes] = self.canvas.copy_from_bbox(axes.bbox)
+            self._draw_artists(axes)
+
+    def redraw(self):
+        # Full draw, for changes outside the artists (limits, ticks, titles); recaches the backgrounds
+        self.pending.clear()
+        self.backgrounds.clear()
+        with timer('render.full_draw'):
+            self.canvas.draw()
+        self.last_frame = time.perf_counter()
+
+    def update(self, artists):
+        # Blit the axes of the changed artists, or merge them into the next frame if one was just drawn
+        self.pending.update(artist.axes for artist in artists)
+        if time.perf_counter() - self.last_frame < self.frame_budget:
+            self.timer.start()
+            return
+        self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        axes_list, self.pending = self.pending, set()
+        if any(axes not in self.backgrounds for axes in axes_list):
+            self.redraw()
+            return
+        with timer('render.blit'):
+            for axes in axes_list:
+                self.canvas.restore_region(self.backgrounds[axes])
+                self._draw_artists(axes)
+                self.canvas.blit(axes.bbox)
+        self.last_frame = time.perf_counter()
+
+    def _draw_artists(self, axes):
+        # Every animated artist of the axes, the restored background has none of them
+        for artist in self.artists:
+            if artist.axes is axes and artist.get_visible():
+                axes.draw_artist(artist)
+
+
+class BarChart:
+    # Bar chart updated in place: new values for the same labels change the bar heights and blit, new
+    # labels rebuild the bars with a full draw. Without a fixed ylim the y-limit is set to headroom times
+    # the highest bar whenever a bar outgrows it or all shrink well below it, so a histogram filling up
+    # while streaming rarely needs a full draw
+    def __init__(self, axes, manager, ylim=None, headroom=1.5, **style):
+        self.axes = axes
+        self.manager = manager
+        self.ylim = ylim
+        self.headroom = headroom
+        self.style = style
+        self.labels = None
+        self.bars = []
+
+    def set_data(self, labels, values):
+        labels = list(labels)
+        values = np.asarray(values, dtype=float)
+        rebuild = labels != self.labels
+        if rebuild:
+            self.manager.remove_artists(self.bars)
+            self.bars = list(self.axes.bar(labels, values, **self.style))
+            self.manager.add_artists(self.bars)
+            self.labels = labels
+        else:
+            for bar, value in zip(self.bars, values):
+                bar.set_height(value)
+
+        top = np.nanmax(values) if len(values) else 0
+        if self.ylim is not None:
+            if rebuild:
+                self.axes.set_ylim(*self.ylim)
+        elif rebuild or not top * self.headroom ** 2 >= self.axes.get_ylim()[1] >= top:
+            self.axes.set_ylim(0, max(top * self.headroom, 1))
+            rebuild = True
+
+        if rebuild:
+            self.manager.redraw()
+        else:
+            self.manager.update(self.bars)
+
+
+class Histogram(BarChart):
+    # Counts of integer values (e.g. scores) aggregated with bincount, so the cost of a redraw does not
+    # depend on the number of wells. add() accumulates counts for streaming
+    def __init__(self, axes, manager, n_bins, **style):
+        super().__init__(axes, manager, **style)
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+
+    def set_values(self, values):
+        self.counts = np.bincount(np.asarray(values, dtype=np.int64), minlength=len(self.counts))
+        self.set_data(range(len(self.counts)), self.counts)
+
+    def add(self, counts):
+        self.counts = self.counts + counts
+        self.set_data(range(len(self.counts)), self.counts)
+
+    def clear(self):
+        self.counts = np.zeros_like(self.counts)
+        self.set_data(range(len(self.counts)), self.counts)
+
+
+class Scatter:
+    # Scatter coloured by category, drawn as one marker line per category: Agg stamps one cached marker
+    # per point, far faster than a collection with a colour per point. More than max_points points are
+    # evenly downsampled keeping the extremes, so a sorted view keeps its spread; updates reuse the lines
+    # and blit
+    def __init__(self, axes, manager, colors, max_points=MAX_POINTS, size=2):
+        self.axes = axes
+        self.manager = manager
+        self.max_points = max_points
+        self.lines = [axes.plot([], [], "o", ms=size, mec="none", color=color)[0] for color in colors]
+        self.note = axes.text(0.99, 0.99, "", transform=axes.transAxes, ha="right", va="top", fontsize=7,
+                              bbox=dict(facecolor="white", edgecolor="none", alpha=0.8))
+        manager.add_artists(self.lines + [self.note])
+
+    def set_limits(self, x, y):
+        # Fixed limits covering all the data, so later updates (e.g. filters) only blit
+        for set_limits, values in ((self.axes.set_xlim, x), (self.axes.set_ylim, y)):
+            values = np.asarray(values, dtype=float)
+            values = values[np.isfinite(values)]
+            if len(values):
+                low, high = values.min(), values.max()
+                margin = (high - low) * 0.02 or 1
+                set_limits(low - margin, high + margin)
+        self.manager.redraw()
+
+    def set_data(self, x, y, categories):
+        x, y, categories = np.asarray(x), np.asarray(y), np.asarray(categories)
+        n_points = len(x)
+        if n_points > self.max_points:
+            keep = downsample(n_points, self.max_points, x, y)
+            x, y, categories = x[keep], y[keep], categories[keep]
+            self.note.set_text(f"{len(keep):,} of {n_points:,} wells shown")
+        else:
+            self.note.set_text("")
+        for j, line in enumerate(self.lines):
+            selected = categories == j
+            line.set_data(x[selected], y[selected])
+        self.manager.update(self.lines + [self.note])
@@ -0,0 +1,397 @@
+import bisect
+import hashlib
+import json
+import numbers
+import os
+import warnings
+
+# Define the range and criteria for each lift method
+LIFT_METHODS = {
+    'Gas Lift': {'water_cut': (0, 100), 'fluid_viscosity': (0, 200), 'corrosion_handling': ['good', 'excellent'],
+            'sand_production': (0, 1), 'gor': (500, 2000), 'contaminants': ['Asphatene', 'paraffin'],
+            'treatment': ['scale', 'acid'], 'number_of_wells': ['single or multiple'],
+            'production_rate': (5, 5000), 'well_depth': (100, 16000), 'casing_size': (4.5, 5.5),
+            'deviated_well': 'poor', 'dogleg_severity': 15, 'temperature': (100, 550),
+            'safety_barriers': 'N/A', 'flowing_pressure': (50, 100), 'reservoir_access': 0,
+            'completion': 'single', 'stability': 'stable', 'recovery': 'primary or secondary'},
+    'Sucker Rod Pump': {'water_cut': (0, 100), 'fluid_viscosity': (0, 200), 'corrosion_handling': ['good', 'excellent'],
+           'sand_production': (0, 0), 'gor': (0, 2000), 'contaminants': ['Asphatene', 'paraffin'],
+           'treatment': ['scale', 'acid'], 'number_of_wells': ['multiple'],
+           'production_rate': (200, 30000), 'well_depth': (5000, 15000), 'casing_size': (4, 7),
+           'deviated_well': 'excellent', 'dogleg_severity': 0.0, 'temperature': (100, 400),
+           'safety_barriers': 'N/A', 'flowing_pressure': (100, 1000), 'reservoir_access': 1,
+           'completion': 'single or multiple', 'stability': 'stable or unstable', 'recovery': 'primary or secondary'},
+    'ESP': {'water_cut': (0, 100), 'fluid_viscosity': (100, 500), 'corrosion_handling': ['good'],
+            'sand_production': (0, 100), 'gor': (1000, float('inf')), 'contaminants': ['Asphatene', 'paraffin'],
+            'treatment': ['scale', 'acid'], 'number_of_wells': ['multiple'],
+            'production_rate': (200, 30000), 'well_depth': (1000, 15000), 'casing_size': (5.4, 9.625),
+            'deviated_well': 'good', 'dogleg_severity': 30, 'temperature': (100, 400),
+            'safety_barriers': 'N/A', 'flowing_pressure': 0.0, 'reservoir_access': 0,
+            'completion': 'single or multiple', 'stability': 'stable', 'recovery': 'primary or secondary'},
+    'Hydraulic Piston Pump': {'water_cut': (0, 70), 'fluid_viscosity': (10, 450), 'corrosion_handling': ['good'],
+            'sand_production': (0, 10), 'gor': (800, float('inf')), 'contaminants': ['paraffin'],
+            'treatment': ['scale', 'acid'], 'number_of_wells': ['single or more'],
+            'production_rate': (50, 4000), 'well_depth': (7500, 17000), 'casing_size': (5, 9.625),
+            'deviated_well': 'excellent', 'dogleg_severity': 15, 'temperature': (100, 500),
+            'safety_barriers': 'N/A', 'flowing_pressure': (500, 15000), 'reservoir_access': 1,
+            'completion': 'single', 'stability': 'stable', 'recovery': 'primary or secondary'},
+    'Hydraulic Jet Pump': {'water_cut': (0, 100), 'fluid_viscosity': (14, 200), 'corrosion_handling': ['excellent'],
+            'sand_production': (0, 30), 'gor': (0, 2000), 'contaminants': ['paraffin'],
+            'treatment': ['scale', 'acid'], 'number_of_wells': ['single or more'],
+            'production_rate': (300, 15000), 'well_depth': (5000, 15000), 'casing_size': (5.5, 7),
+            'deviated_well': 'excellent', 'dogleg_severity': 24, 'temperature': (100, 500),
+            'safety_barriers': 'N/A', 'flowing_pressure': (100, 1000), 'reservoir_access': 1,
+            'completion': 'single', 'stability': 'stable', 'recovery': 'primary or secondary'},
+    'Plunger Lift': {'water_cut': (0, 50), 'fluid_viscosity': (0, 200), 'corrosion_handling': ['excellent'],
+           'sand_production': (0, 1), 'gor': (1000, float('inf')), 'contaminants': ['Asphatene', 'paraffin'],
+           'treatment': ['scale', 'acid'], 'number_of_wells': ['single'],
+           'production_rate': (1, 5), 'well_depth': (8000, 19000), 'casing_size': (7, 990625),
+           'deviated_well': 'good', 'dogleg_severity': 'pass', 'temperature': (120, 500),
+           'safety_barriers': 'N/A', 'flowing_pressure': '<275', 'reservoir_access': 0,
+           'completion': 'single', 'stability': 'stable', 'recovery': 'secondary'},
+    'PCP': {'water_cut': (0, 50), 'fluid_viscosity': (100, 5000), 'corrosion_handling': ['fair'],
+            'sand_production': (0, 5), 'gor': (0, 500), 'contaminants': ['Asphatene', 'paraffin'],
+            'treatment': ['scale', 'acid'], 'number_of_wells': ['single'],
+            'production_rate': (5, 4500), 'well_depth': (2000, 6000), 'casing_size': (5, 7),
+            'deviated_well': 'poor', 'dogleg_severity': 15, 'temperature': (75, 250),
+            'safety_barriers': 'N/A', 'flowing_pressure': (20, 250), 'reservoir_access': 0,
+            'completion': 'single', 'stability': 'stable', 'recovery': 'secondary'}
+}
+
+# The screening parameters in the argument order of predict_best_lift_method, with the check
+# applied to each one:
+#   'range' -> low <= value <= high
+#   'in'    -> value in criterion (list membership, or a substring test when the criterion is a string)
+#   'eq'    -> value == criterion; a criterion that is not a number matches nothing, unless the table
+#              names the parameter in its ranges (e.g. a lift_calibration file) and it is a (low, high) pair
+PARAMETERS = (
+    ('water_cut', 'range'),
+    ('fluid_viscosity', 'range'),
+    ('corrosion_handling', 'in'),
+    ('sand_production', 'range'),
+    ('gor', 'range'),
+    ('contaminants', 'in'),
+    ('treatment', 'in'),
+    ('number_of_wells', 'in'),
+    ('production_rate', 'range'),
+    ('well_depth', 'range'),
+    ('casing_size', 'range'),
+    ('deviated_well', 'in'),
+    ('dogleg_severity', 'eq'),
+    ('temperature', 'range'),
+    ('safety_barriers', 'in'),
+    ('flowing_pressure', 'eq'),
+    ('reservoir_access', 'eq'),
+    ('completion', 'in'),
+    ('stability', 'in'),
+    ('recovery', 'in'),
+)
+
+PARAMETER_NAMES = tuple(name for name, _ in PARAMETERS)
+PARAMETER_KINDS = dict(PARAMETERS)
+
+# Bits per method when CriteriaTable.score_well packs the running scores into one integer
+LANE_BITS = 8
+
+# Short names used in the results table and chart
+METHOD_ABBREVIATIONS = {
+    'Sucker Rod Pump': 'SRP',
+    'Gas Lift': 'GL',
+    'ESP': 'ESP',
+    'Hydraulic Piston Pump': 'HPP',
+    'Hydraulic Jet Pump': 'HJP',
+    'Plunger Lift': 'PL',
+    'PCP': 'PCP',
+}
+
+# Choices offered by the input combo boxes for the categorical parameters
+CATEGORY_OPTIONS = {
+    'corrosion_handling': ['good', 'excellent'],
+    'contaminants': ['Asphatene', 'paraffin'],
+    'treatment': ['scale', 'acid'],
+    'number_of_wells': ['single', 'multiple'],
+    'deviated_well': ['poor', 'excellent', 'good'],
+    'safety_barriers': ['No', 'Yes'],
+    'completion': ['single', 'multiple'],
+    'stability': ['stable', 'unstable'],
+    'recovery': [' primary', 'secondary'],
+}
+
+
+class IntervalIndex:
+    # Sorted interval index for one 'range' parameter. The endpoints of all methods split the number line
+    # into regions (each endpoint and each open gap between two endpoints); the set of accepting methods
+    # is precomputed per region as a bitmask, so a lookup is one bisect
+    def __init__(self, intervals):
+        self.endpoints = sorted({bound for interval in intervals for bound in interval})
+        self.region_masks = []
+
+        for i, endpoint in enumerate(self.endpoints):
+            # Open gap below this endpoint, then the endpoint itself
+            lower = self.endpoints[i - 1] if i else None
+            self.region_masks.append(0 if lower is None else _mask(lo <= lower and endpoint <= hi
+                                                                   for lo, hi in intervals))
+            self.region_masks.append(_mask(lo <= endpoint <= hi for lo, hi in intervals))
+        self.region_masks.append(0)
+
+    def lookup(self, value):
+        # Bitmask of the methods whose interval contains value
+        if value != value:
+            return 0
+        i = bisect.bisect_left(self.endpoints, value)
+        if i < len(self.endpoints) and self.endpoints[i] == value:
+            return self.region_masks[2 * i + 1]
+        return self.region_masks[2 * i]
+
+
+class CriteriaTable:
+    # Immutable, compiled form of a lift_methods table: numeric intervals with an IntervalIndex per
+    # 'range' and 'eq' parameter (an 'eq' value v is the interval (v, v)), and enum-coded categories
+    # with a methods bitmask per code for the 'in' parameters. weights ({parameter: weight}, None for
+    # equal weights) are the TOPSIS criterion weights, ranges the 'eq' parameters given as (low, high)
+    def __init__(self, lift_methods=LIFT_METHODS, source=None, weights=None, ranges=()):
+        self.ranges = tuple(name for name in PARAMETER_NAMES if name in ranges)
+        validate_criteria(lift_methods, ranges)
+        self._methods = {method: dict(criteria) for method, criteria in lift_methods.items()}
+        self.source = source
+        self.methods = tuple(lift_methods)
+        self.weights = criteria_weights(weights)
+        self.version = criteria_version(lift_methods, self.weights, self.ranges)
+
+        self.intervals = {}
+        self.interval_index = {}
+        self.vocabulary = {}
+        self.category_masks = {}
+
+        for name, kind in PARAMETERS:
+            values = [criteria[name] for criteria in self._methods.values()]
+            if kind == 'range':
+                intervals = tuple((float(value[0]), float(value[1])) for value in values)
+                self.intervals[name] = intervals
+                self.interval_index[name] = IntervalIndex(intervals)
+            elif kind == 'eq':
+                intervals = tuple(_equal_interval(value, name in self.ranges) for value in values)
+                self.intervals[name] = intervals
+                self.interval_index[name] = IntervalIndex(intervals)
+            else:
+                # Code every known choice once and evaluate `choice in criterion` for it here,
+                # so scoring a known value is a dict lookup instead of a list or substring scan
+                choices = list(CATEGORY_OPTIONS.get(name, ()))
+                for value in values:
+                    if not isinstance(value, str):
+                        choices.extend(value)
+                choices = list(dict.fromkeys(choices))
+                self.vocabulary[name] = {choice: code for code, choice in enumerate(choices)}
+                self.category_masks[name] = tuple(_mask(choice in value for value in values) for choice in choices)
+
+        self._lanes = {}
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError("CriteriaTable is immutable")
+        super().__setattr__(name, value)
+
+    def __getitem__(self, method):
+        return dict(self._methods[method])
+
+    def __iter__(self):
+        return iter(self.methods)
+
+    def __len__(self):
+        return len(self.methods)
+
+    def as_dict(self):
+        return {method: dict(criteria) for method, criteria in self._methods.items()}
+
+    def weight_map(self):
+        # {parameter: weight}, None for equal weights
+        return None if self.weights is None else dict(zip(PARAMETER_NAMES, self.weights))
+
+    def accepting_methods(self, name, value):
+        # Methods whose criterion for parameter `name` accepts value, e.g. accepting_methods('water_cut', 60)
+        mask = self.mask(name, value)
+        return [method for j, method in enumerate(self.methods) if mask >> j & 1]
+
+    def mask(self, name, value):
+        # Bitmask (bit j for the j-th method) of the methods accepting value for parameter `name`
+        kind = PARAMETER_KINDS[name]
+        if kind == 'range':
+            return self.interval_index[name].lookup(value)
+        if kind == 'eq':
+            return self.interval_index[name].lookup(value) if isinstance(value, numbers.Real) else 0
+        code = self.vocabulary[name].get(value)
+        if code is not None:
+            return self.category_masks[name][code]
+        # A value outside the known choices, fall back to the plain criterion test
+        return _mask(value in criteria[name] for criteria in self._methods.values())
+
+    def score_well(self, values):
+        # Number of matched criteria for each method, values in the argument order of predict_best_lift_method.
+        # Each bitmask is widened to one LANE_BITS lane per method so a single integer sum adds up all methods
+        lanes = self._lanes
+        total = 0
+        for name, value in zip(PARAMETER_NAMES, values):
+            mask = self.mask(name, value)
+            lane = lanes.get(mask)
+            if lane is None:
+                lane = lanes[mask] = sum(1 << j * LANE_BITS for j in range(len(self.methods)) if mask >> j & 1)
+            total += lane
+        lane_mask = (1 << LANE_BITS) - 1
+        return {method: total >> j * LANE_BITS & lane_mask for j, method in enumerate(self.methods)}
+
+
+def _equal_interval(criterion, ranged=False):
+    # Interval of an 'eq' criterion, an empty one for criteria that are not numbers ('pass', '<275', and
+    # (low, high) pairs unless the parameter is ranged)
+    if ranged and isinstance(criterion, (list, tuple)):
+        return float(criterion[0]), float(criterion[1])
+    if isinstance(criterion, numbers.Real):
+        return float(criterion), float(criterion)
+    return float('inf'), float('-inf')
+
+
+def _mask(flags):
+    mask = 0
+    for j, flag in enumerate(flags):
+        if flag:
+            mask |= 1 << j
+    return mask
+
+
+def criteria_version(lift_methods, weights=None, ranges=()):
+    # Content hash of a lift_methods table, its weights (a tuple in PARAMETERS order) and ranged 'eq'
+    # parameters, tuples and lists hash the same so a table loaded from a file matches the one it was saved from
+    canonical = [[method, sorted(criteria.items())] for method, criteria in lift_methods.items()]
+    if weights is not None:
+        canonical.append(['weights', list(weights)])
+    if ranges:
+        canonical.append(['ranges', list(ranges)])
+    return hashlib.sha256(json.dumps(canonical).encode()).hexdigest()[:16]
+
+
+def validate_criteria(lift_methods, ranges=()):
+    if not lift_methods:
+        raise ValueError("The criteria table has no lift methods")
+    unknown = [name for name in ranges if PARAMETER_KINDS.get(name) != 'eq']
+    if unknown:
+        raise ValueError("Only 'eq' parameters can be given as ranges, not " + ", ".join(map(str, unknown)))
+    for method, criteria in lift_methods.items():
+        missing = [name for name in PARAMETER_NAMES if name not in criteria]
+        if missing:
+            raise ValueError(f"{method}: missing criteria {', '.join(missing)}")
+        for name, kind in PARAMETERS:
+            value = criteria[name]
+            if kind == 'range' and not (isinstance(value, (list, tuple)) and len(value) == 2
+                                        and all(isinstance(bound, numbers.Real) for bound in value)):
+                raise ValueError(f"{method}: {name} must be a (low, high) pair, got {value!r}")
+            if name in ranges and isinstance(value, (list, tuple)) and not (
+                    len(value) == 2 and all(isinstance(bound, numbers.Real) for bound in value)):
+                raise ValueError(f"{method}: {name} must be a number or a (low, high) pair, got {value!r}")
+            if kind == 'in' and not isinstance(value, (str, list, tuple)):
+                raise ValueError(f"{method}: {name} must be a string or a list of choices, got {value!r}")
+
+
+def criteria_weights(weights):
+    # TOPSIS weights ({parameter: weight}) as a tuple in PARAMETERS order, None stays None (equal weights)
+    if weights is None:
+        return None
+    unknown = [name for name in weights if name not in PARAMETER_KINDS]
+    missing = [name for name in PARAMETER_NAMES if name not in weights]
+    if unknown or missing:
+        raise ValueError("Criteria weights: " + "; ".join(
+            text for text in ("unknown " + ", ".join(unknown) if unknown else '',
+                              "missing " + ", ".join(missing) if missing else '') if text))
+    values = tuple(weights[name] for name in PARAMETER_NAMES)
+    if not all(isinstance(value, numbers.Real) and value >= 0 for value in values) or not sum(values) > 0:
+        raise ValueError("Criteria weights must be non-negative numbers, not all zero")
+    return tuple(float(value) for value in values)
+
+
+def load_criteria(path):
+    # Load a criteria file written by save_criteria: {"version": ..., "methods": {method: {parameter: value}}}
+    # and optionally "weights": {parameter: weight} and "ranges": ['eq' parameters given as (low, high)]
+    with open(path) as handle:
+        document = json.load(handle)
+    lift_methods = document.get('methods', document) if isinstance(document, dict) else None
+    if not isinstance(lift_methods, dict):
+        raise ValueError(f"{path}: not a criteria file")
+    weights = document.get('weights') if 'methods' in document else None
+    if weights is not None and not isinstance(weights, dict):
+        raise ValueError(f"{path}: weights must map parameters to numbers")
+    ranges = document.get('ranges', []) if 'methods' in document else []
+    if not isinstance(ranges, list):
+        raise ValueError(f"{path}: ranges must be a list of parameters")
+    return CriteriaTable(lift_methods, source=path, weights=weights, ranges=ranges)
+
+
+def save_criteria(lift_methods, path, weights=None, ranges=None, **metadata):
+    if isinstance(lift_methods, CriteriaTable):
+        weights = lift_methods.weight_map() if weights is None else weights
+        ranges = lift_methods.ranges if ranges is None else ranges
+        lift_methods = lift_methods.as_dict()
+    weights = criteria_weights(weights)
+    ranges = tuple(name for name in PARAMETER_NAMES if name in (ranges or ()))
+    document = dict(metadata, version=criteria_version(lift_methods, weights, ranges), methods=lift_methods)
+    if weights is not None:
+        document['weights'] = dict(zip(PARAMETER_NAMES, weights))
+    if ranges:
+        document['ranges'] = list(ranges)
+    with open(path, 'w') as handle:
+        json.dump(document, handle, indent=2)
+    return document['version']
+
+
+class CriteriaFile:
+    # Criteria loaded from an external file and reloaded whenever the file changes on disk.
+    # If an edited file fails to load, the last good table stays in use
+    def __init__(self, path):
+        self.path = path
+        self._stamp = None
+        self._table = None
+
+    def get(self):
+        try:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            if self._table is None:
+                raise
+            return self._table
+
+        if stamp != self._stamp:
+            try:
+                self._table = load_criteria(self.path)
+            except (OSError, ValueError) as e:
+                if self._table is None:
+                    raise
+                warnings.warn(f"Keeping the previous criteria, could not reload {self.path}: {e}")
+            self._stamp = stamp
+        return self._table
+
+
+DEFAULT_CRITERIA = CriteriaTable(LIFT_METHODS)
+
+# Environment variable naming an external criteria file that replaces the built-in table
+CRITERIA_FILE_ENV = 'LIFT_CRITERIA_FILE'
+
+_criteria_file = None
+_criteria_file_configured = False
+
+
+def use_criteria_file(path):
+    # Switch to an external criteria file (None goes back to the built-in table)
+    global _criteria_file, _criteria_file_configured
+    _criteria_file = CriteriaFile(path) if path else None
+    _criteria_file_configured = True
+    return current_criteria()
+
+
+def current_criteria():
+    # The criteria table in use: the external file if one is configured with use_criteria_file or the
+    # LIFT_CRITERIA_FILE environment variable (reloaded when it changes), otherwise the built-in LIFT_METHODS
+    if not _criteria_file_configured:
+        use_criteria_file(os.environ.get(CRITERIA_FILE_ENV))
+    if _criteria_file is not None:
+        return _criteria_file.get()
+    return DEFAULT_CRITERIA
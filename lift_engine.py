@@ -0,0 +1,237 @@
+import numpy as np
+
+from lift_criteria import (CATEGORY_OPTIONS, PARAMETERS, PARAMETER_KINDS, PARAMETER_NAMES, CriteriaTable,
+                           current_criteria)
+
+PARAMETER_INDEX = {name: i for i, name in enumerate(PARAMETER_NAMES)}
+
+# Number of wells scored per block, keeps the (wells x parameters x methods) temporaries small
+BLOCK_SIZE = 65536
+
+# Value ranges and discrete choices used to generate synthetic wells for benchmarks and speedup runs
+SYNTHETIC_RANGES = {
+    'water_cut': (0, 100), 'fluid_viscosity': (0, 1000), 'sand_production': (0, 120), 'gor': (0, 3000),
+    'production_rate': (1, 30000), 'well_depth': (100, 20000), 'casing_size': (4, 10), 'temperature': (60, 560),
+}
+SYNTHETIC_CHOICES = {
+    'dogleg_severity': [0, 5, 15, 24, 30], 'flowing_pressure': [0, 50, 100, 250, 500], 'reservoir_access': [0, 1],
+}
+
+
+class CompiledCriteria:
+    # Lay a CriteriaTable out as arrays: min/max arrays for the 'range' and 'eq' checks (an 'eq' value is
+    # an interval of one point, so NaN and criteria that are not numbers match nothing), and category masks
+    # built from the table's enum codes for the 'in' checks
+    def __init__(self, table=None):
+        if table is None:
+            table = current_criteria()
+        elif not isinstance(table, CriteriaTable):
+            table = CriteriaTable(table)
+        self.table = table
+        self.methods = table.methods
+        self.version = table.version
+
+        self.range_index = [i for i, (_, kind) in enumerate(PARAMETERS) if kind != 'in']
+        self.in_index = [i for i, (_, kind) in enumerate(PARAMETERS) if kind == 'in']
+
+        # Arrays are (parameters x methods) so they broadcast against (wells x parameters x 1)
+        intervals = np.array([table.intervals[PARAMETER_NAMES[i]] for i in self.range_index], dtype=float)
+        self.range_min = intervals[:, :, 0]
+        self.range_max = intervals[:, :, 1]
+
+    def category_mask(self, name, values):
+        # (values x methods) acceptance for `value in criterion`, one table lookup per distinct value
+        masks = [self.table.mask(name, value) for value in values]
+        return np.array([_mask_bits(mask, len(self.methods)) for mask in masks],
+                        dtype=bool).reshape(len(values), len(self.methods))
+
+    def parameter_matches(self, name, values):
+        # (values x methods) matches of a single parameter, e.g. to sweep one input over a grid
+        kind = PARAMETER_KINDS[name]
+        i = PARAMETER_INDEX[name]
+        if kind == 'in':
+            return self.category_mask(name, [str(value) for value in values])
+        values = np.asarray(values, dtype=float)[:, None]
+        row = self.range_index.index(i)
+        return (self.range_min[row] <= values) & (values <= self.range_max[row])
+
+    def encode(self, wells):
+        # Turn the well records into an (N wells x 20 parameters) float matrix. Categorical columns hold
+        # row indices into the returned (vocabulary x methods) category mask
+        columns = _as_columns(wells)
+        n_wells = len(columns[PARAMETER_NAMES[0]])
+        matrix = np.empty((n_wells, len(PARAMETERS)), dtype=float)
+        masks = []
+        offset = 0
+
+        for i, (name, kind) in enumerate(PARAMETERS):
+            if kind == 'in':
+                values = np.asarray(columns[name]).astype(str)
+                vocabulary, codes = np.unique(values, return_inverse=True)
+                matrix[:, i] = codes.reshape(-1) + offset
+                masks.append(self.category_mask(name, vocabulary.tolist()))
+                offset += len(vocabulary)
+            else:
+                matrix[:, i] = np.asarray(columns[name], dtype=float)
+
+        if masks:
+            category_mask = np.concatenate(masks)
+        else:
+            category_mask = np.zeros((0, len(self.methods)), dtype=bool)
+        return matrix, category_mask
+
+    def matches(self, matrix, category_mask):
+        # Per-criterion matches, an (N wells x 20 parameters x methods) boolean array
+        matrix = np.asarray(matrix, dtype=float)
+        matches = np.empty((len(matrix), len(PARAMETERS), len(self.methods)), dtype=bool)
+
+        ranges = matrix[:, self.range_index, None]
+        matches[:, self.range_index] = (self.range_min <= ranges) & (ranges <= self.range_max)
+
+        codes = matrix[:, self.in_index].astype(np.intp)
+        matches[:, self.in_index] = category_mask[codes]
+        return matches
+
+    def score(self, matrix, category_mask):
+        # Score every well against every method, returns an (N wells x methods) matrix of matched criteria
+        matrix = np.asarray(matrix, dtype=float)
+        scores = np.empty((len(matrix), len(self.methods)), dtype=np.int16)
+
+        for start in range(0, len(matrix), BLOCK_SIZE):
+            block = matrix[start:start + BLOCK_SIZE]
+
+            # Same checks as matches(), summed per group without building the full boolean array
+            ranges = block[:, self.range_index, None]
+            in_range = (self.range_min <= ranges) & (ranges <= self.range_max)
+
+            codes = block[:, self.in_index].astype(np.intp)
+            members = category_mask[codes]
+
+            scores[start:start + BLOCK_SIZE] = in_range.sum(axis=1) + members.sum(axis=1)
+
+        return scores
+
+
+_default_criteria = None
+
+
+def default_criteria():
+    # Compiled arrays for current_criteria(), recompiled when the criteria file is edited
+    global _default_criteria
+    table = current_criteria()
+    if _default_criteria is None or _default_criteria.table is not table:
+        _default_criteria = CompiledCriteria(table)
+    return _default_criteria
+
+
+def score_wells(wells, criteria=None):
+    # Return the per-method score matrix and the index of the best method for each well.
+    # argmax picks the first maximum, the same tie break as max() over the lift_methods dict
+    criteria = criteria or default_criteria()
+    matrix, category_mask = criteria.encode(wells)
+    scores = criteria.score(matrix, category_mask)
+    return scores, scores.argmax(axis=1)
+
+
+def predict_best_lift_methods(wells, criteria=None):
+    # Vectorized counterpart of predict_best_lift_method, returns the method name for each well
+    criteria = criteria or default_criteria()
+    _, best = score_wells(wells, criteria)
+    return np.asarray(criteria.methods, dtype=object)[best]
+
+
+class IncrementalScorer:
+    # Scores one well as its inputs change. contributions[i, j] is 1 when parameter i matches method j,
+    # so changing one input replaces one row and adjusts the totals instead of re-checking all criteria
+    def __init__(self, table=None):
+        self.follow_current = table is None
+        self.table = table or current_criteria()
+        self.values = [None] * len(PARAMETERS)
+        self.contributions = np.zeros((len(PARAMETERS), len(self.table.methods)), dtype=np.int16)
+        self.totals = np.zeros(len(self.table.methods), dtype=np.int16)
+
+    @property
+    def methods(self):
+        return self.table.methods
+
+    def set_value(self, name, value):
+        # Update one input, None (e.g. a field that does not parse) matches no method. Returns the totals
+        if self._sync_table():
+            self.values[PARAMETER_INDEX[name]] = value
+            self._recompute()
+            return self.totals
+        i = PARAMETER_INDEX[name]
+        self.values[i] = value
+        row = self._contribution(name, value)
+        self.totals += row - self.contributions[i]
+        self.contributions[i] = row
+        return self.totals
+
+    def set_values(self, values):
+        # Replace all inputs, in the argument order of predict_best_lift_method
+        self._sync_table()
+        self.values = list(values)
+        self._recompute()
+        return self.totals
+
+    def scores(self):
+        return dict(zip(self.methods, self.totals.tolist()))
+
+    def best_method(self):
+        # Same tie break as predict_best_lift_method: the first method with the highest score
+        return self.methods[int(self.totals.argmax())]
+
+    def ranking(self):
+        # Methods from best to worst, ties keep the criteria table order
+        order = np.argsort(-self.totals, kind='stable')
+        return [(self.methods[j], int(self.totals[j])) for j in order]
+
+    def _contribution(self, name, value):
+        if value is None:
+            return np.zeros(len(self.methods), dtype=np.int16)
+        return np.array(_mask_bits(self.table.mask(name, value), len(self.methods)), dtype=np.int16)
+
+    def _recompute(self):
+        self.contributions = np.array([self._contribution(name, value)
+                                       for name, value in zip(PARAMETER_NAMES, self.values)], dtype=np.int16)
+        self.totals = self.contributions.sum(axis=0, dtype=np.int16)
+
+    def _sync_table(self):
+        # Pick up an edited criteria file, returns True when every contribution has to be rebuilt
+        if not self.follow_current:
+            return False
+        table = current_criteria()
+        if table is self.table:
+            return False
+        self.table = table
+        return True
+
+
+def synthetic_wells(n_wells, seed=0):
+    # Random but reproducible well records covering the criteria ranges
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, kind in PARAMETERS:
+        if kind == 'in':
+            columns[name] = rng.choice(CATEGORY_OPTIONS[name], n_wells)
+        elif name in SYNTHETIC_CHOICES:
+            columns[name] = rng.choice(SYNTHETIC_CHOICES[name], n_wells).astype(float)
+        else:
+            low, high = SYNTHETIC_RANGES[name]
+            columns[name] = np.round(rng.uniform(low, high, n_wells), 1)
+    return columns
+
+
+def _as_columns(wells):
+    # Accept either a mapping of parameter name -> column, or a sequence of rows
+    # in the argument order of predict_best_lift_method
+    if hasattr(wells, 'keys'):
+        return wells
+    rows = list(wells)
+    if not rows:
+        return {name: [] for name in PARAMETER_NAMES}
+    return dict(zip(PARAMETER_NAMES, zip(*rows)))
+
+
+def _mask_bits(mask, n_methods):
+    return [bool(mask >> j & 1) for j in range(n_methods)]
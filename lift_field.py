@@ -0,0 +1,189 @@
+import numpy as np
+
+from lift_batch import is_parquet, prepare_columns, validated_chunks
+from lift_criteria import METHOD_ABBREVIATIONS
+from lift_engine import default_criteria
+from lift_store import is_store, open_store, score_store
+
+FIELD_CHUNK_SIZE = 20000
+
+# Columns of the field view before the per-method scores
+FIELD_COLUMNS = ('Well', 'Best Method', 'Score', 'Lead', 'Well Depth (ft)', 'Production Rate (bbl/d)')
+
+
+class FieldResults:
+    # Ranked recommendations for a whole field, one row per well kept as NumPy columns. The rows shown
+    # are self.view, an index array: sorting reorders it and filtering masks it, both vectorized, so
+    # a table over it only ever formats the cells on screen
+    def __init__(self, well_ids, columns, scores, methods):
+        self.methods = tuple(methods)
+        self.well_ids = np.asarray(well_ids, dtype=str)
+        self.columns = columns
+        self.scores = scores
+        self.best = scores.argmax(axis=1)
+        self.best_score = scores.max(axis=1)
+
+        # Lead of the recommended method over the runner-up, 0 for a tie
+        runner_up = np.partition(scores, -2, axis=1)[:, -2] if len(self.methods) > 1 else 0
+        self.lead = self.best_score - runner_up
+
+        self.headers = FIELD_COLUMNS + tuple(METHOD_ABBREVIATIONS.get(method, method) for method in self.methods)
+        self.assignment = None
+        self.order = np.arange(len(self.well_ids))
+        self.mask = np.ones(len(self.well_ids), dtype=bool)
+        self.view = self.order
+        self._sort_keys = {}
+
+    def __len__(self):
+        return len(self.well_ids)
+
+    def column_values(self, column):
+        # The whole column as an array, in well order
+        if column == 0:
+            return self.well_ids
+        if column == 1:
+            return np.asarray(self.methods, dtype=object)[self.best]
+        if column == 2:
+            return self.best_score
+        if column == 3:
+            return self.lead
+        if column == 4:
+            return self.columns['well_depth']
+        if column == 5:
+            return self.columns['production_rate']
+        if column == self.assigned_column():
+            return np.asarray(self.methods + ('',), dtype=object)[self.assignment]
+        return self.scores[:, column - len(FIELD_COLUMNS)]
+
+    def assigned_column(self):
+        return len(FIELD_COLUMNS) + len(self.methods) if self.assignment is not None else None
+
+    def set_assignment(self, assignment):
+        # Method index per well from the portfolio optimizer (lift_portfolio, -1 for none), shown as an
+        # extra last column
+        self.assignment = np.asarray(assignment)
+        self.headers = self.headers[:len(FIELD_COLUMNS) + len(self.methods)] + ('Assigned',)
+        self._sort_keys.pop(self.assigned_column(), None)
+
+    def display(self, row, column):
+        # Text of one cell of the current view
+        well = self.view[row]
+        if column == 0:
+            return str(self.well_ids[well])
+        if column == 1:
+            return self.methods[self.best[well]]
+        if column == self.assigned_column():
+            return (self.methods + ('',))[self.assignment[well]]
+        value = self.column_values(column)[well]
+        if isinstance(value, float) or isinstance(value, np.floating):
+            return '' if value != value else f"{value:g}"
+        return str(value)
+
+    def sort_key(self, column):
+        # Numeric key per well: text columns are ranked alphabetically once and kept
+        if column not in self._sort_keys:
+            if column == 0:
+                key = np.unique(self.well_ids, return_inverse=True)[1].reshape(-1)
+            elif column == 1:
+                key = np.argsort(np.argsort(self.methods))[self.best]
+            elif column == self.assigned_column():
+                key = np.argsort(np.argsort(self.methods + ('',)))[self.assignment]
+            else:
+                key = self.column_values(column)
+            self._sort_keys[column] = np.asarray(key, dtype=float)
+        return self._sort_keys[column]
+
+    def sort(self, column, descending=False):
+        # Stable, so sorting by one column then another keeps ties in the earlier order; NaN sorts last.
+        # A negative column restores the inventory order
+        if column < 0:
+            self.order = np.arange(len(self))
+        else:
+            key = self.sort_key(column)[self.order]
+            self.order = self.order[np.argsort(-key if descending else key, kind='stable')]
+        self._update_view()
+
+    def filter(self, method=None, min_score=None, min_depth=None, max_depth=None):
+        # Keep the wells whose recommended method is method, with at least min_score criteria met and a
+        # depth within [min_depth, max_depth]. None leaves that condition out
+        mask = np.ones(len(self), dtype=bool)
+        if method is not None:
+            mask &= self.best == self.methods.index(method)
+        if min_score is not None:
+            mask &= self.best_score >= min_score
+        depth = self.columns['well_depth']
+        if min_depth is not None:
+            mask &= depth >= min_depth
+        if max_depth is not None:
+            mask &= depth <= max_depth
+        self.mask = mask
+        self._update_view()
+
+    def _update_view(self):
+        self.view = self.order[self.mask[self.order]]
+
+    def method_counts(self):
+        # {method: number of wells in the view it is recommended for}
+        counts = np.bincount(self.best[self.view], minlength=len(self.methods))
+        return dict(zip(self.methods, counts.tolist()))
+
+
+def score_field(columns, criteria=None, well_ids=None):
+    # FieldResults for raw well columns ({name: values}), as read from an inventory file
+    criteria = criteria or default_criteria()
+    prepared = prepare_columns(columns)
+    scores = criteria.score(*criteria.encode(prepared))
+    if well_ids is None:
+        well_ids = columns.get('well_id')
+    if well_ids is None:
+        well_ids = [str(i + 1) for i in range(len(scores))]
+    return FieldResults(well_ids, prepared, scores, criteria.methods)
+
+
+def count_wells(path):
+    # Number of wells in an inventory file without parsing it, for progress reporting
+    if is_store(path):
+        return len(open_store(path))
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+
+    lines = 0
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            lines += block.count(b'\n')
+    return max(lines - 1, 0)
+
+
+def load_field(path, criteria=None, chunk_size=FIELD_CHUNK_SIZE, progress=None, units=None, report=None):
+    # Read and score a CSV/Parquet inventory or a well store chunk by chunk into FieldResults, leaving out
+    # the rows failing validation (reported to report, see lift_batch.validate_chunk; a store was validated
+    # when written). progress(n_wells, scores) is called after every chunk with its scores, e.g. to report
+    # progress or stop a cancelled load
+    criteria = criteria or default_criteria()
+    if is_store(path):
+        # Scored straight from the mapped file, the columns stay on disk until the view needs them
+        store = open_store(path)
+        if not len(store):
+            raise ValueError(f"No wells in {path}")
+        scores = score_store(store, criteria, progress)
+        well_ids = store.well_ids()
+        if well_ids is None:
+            well_ids = [str(i + 1) for i in range(len(store))]
+        return FieldResults(well_ids, store, scores, criteria.methods)
+
+    well_ids, parts, scores = [], [], []
+    for columns, prepared, rows in validated_chunks(path, chunk_size, units, report):
+        chunk_scores = criteria.score(*criteria.encode(prepared))
+        ids = columns.get('well_id')
+        # Without a well_id column a well is known by its row in the inventory
+        well_ids.extend(ids if ids is not None else [str(row + 1) for row in rows.tolist()])
+        parts.append(prepared)
+        scores.append(chunk_scores)
+        if progress is not None:
+            progress(len(well_ids), chunk_scores)
+
+    if not well_ids:
+        raise ValueError(f"No valid wells in {path}" if parts else f"No wells in {path}")
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    return FieldResults(well_ids, columns, np.concatenate(scores), criteria.methods)
@@ -0,0 +1,212 @@
+import atexit
+import functools
+import json
+import os
+import re
+import threading
+import time
+import traceback
+
+# Environment variable that switches instrumentation on: the file to write. A .prom file gets the
+# Prometheus text format (rewritten as a whole, e.g. for the node exporter textfile collector), any
+# other name gets structured JSON logs: one line per timing or error, and the counters in a summary
+# line at exit
+METRICS_ENV = 'LIFT_METRICS'
+
+# Seconds between rewrites of a Prometheus file during a long session, it is also written at exit
+FLUSH_INTERVAL = 10.0
+
+
+class _NullTimer:
+    # Returned while instrumentation is off, entering and leaving it does nothing
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Metrics:
+    # Timers (count, total and max seconds) and counters keyed on a name and optional labels.
+    # Without a path everything is a no-op
+    def __init__(self, path=None):
+        self.path = path
+        self.enabled = bool(path)
+        self.prometheus = bool(path) and path.endswith('.prom')
+        self.counters = {}
+        self.timers = {}
+        self._lock = threading.Lock()
+        self._log = None
+        self._last_flush = time.monotonic()
+
+    def timer(self, name, **labels):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            count, total, longest = self.timers.get(key, (0, 0.0, 0.0))
+            self.timers[key] = (count + 1, total + seconds, max(longest, seconds))
+            self._record({'type': 'timer', 'name': name, 'seconds': seconds}, labels)
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            if self.prometheus:
+                self._record(None, labels)
+
+    def error(self, name, exception, **labels):
+        # Count a failure of name and log the exception with its traceback, the caller still raises it
+        if not self.enabled:
+            return
+        self.count(name + '.errors', **labels)
+        if not self.prometheus:
+            trace = ''.join(traceback.format_exception(type(exception), exception, exception.__traceback__))
+            with self._lock:
+                self._record({'type': 'error', 'name': name, 'error': exception.__class__.__name__,
+                              'message': str(exception), 'traceback': trace}, labels)
+
+    def snapshot(self):
+        # {'counters': [...], 'timers': [...]} of everything recorded so far
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in self.counters.items()]
+            timers = [{'name': name, 'labels': dict(labels), 'count': count, 'seconds': total, 'max': longest}
+                      for (name, labels), (count, total, longest) in self.timers.items()]
+        return {'counters': counters, 'timers': timers}
+
+    def _record(self, event, labels):
+        # Called with the lock held
+        if self.prometheus:
+            if time.monotonic() - self._last_flush > FLUSH_INTERVAL:
+                self._write_prometheus()
+            return
+        if self._log is None:
+            self._log = open(self.path, 'a', buffering=1)
+        event = dict(event, time=time.time(), pid=os.getpid())
+        if labels:
+            event['labels'] = labels
+        self._log.write(json.dumps(event) + '\n')
+
+    def flush(self):
+        with self._lock:
+            if self.prometheus and (self.counters or self.timers):
+                self._write_prometheus()
+            elif self._log is not None:
+                self._log.flush()
+
+    def close(self):
+        if self.enabled and not self.prometheus and self.counters:
+            summary = self.snapshot()
+            with self._lock:
+                self._record({'type': 'summary', 'counters': summary['counters']}, {})
+        self.flush()
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def _write_prometheus(self):
+        # Written to a temporary file and renamed, so a scraper never reads half a file
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{_metric_name(name)}_total{_label_text(labels)} {value}")
+        for (name, labels), (count, total, longest) in sorted(self.timers.items()):
+            metric = _metric_name(name) + '_seconds'
+            lines.append(f"{metric}_count{_label_text(labels)} {count}")
+            lines.append(f"{metric}_sum{_label_text(labels)} {total:.9f}")
+            lines.append(f"{metric}_max{_label_text(labels)} {longest:.9f}")
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, 'w') as handle:
+            handle.write('\n'.join(lines) + '\n')
+        os.replace(temporary, self.path)
+        self._last_flush = time.monotonic()
+
+
+def _metric_name(name):
+    return 'lift_' + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    text = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for key, value in labels)
+    return '{' + text + '}'
+
+
+_metrics = Metrics(os.environ.get(METRICS_ENV) or None)
+
+
+def metrics():
+    return _metrics
+
+
+def enable(path):
+    # Switch instrumentation on (or to another file) at run time, e.g. from a batch script
+    global _metrics
+    _metrics.close()
+    _metrics = Metrics(path)
+    return _metrics
+
+
+def disable():
+    return enable(None)
+
+
+def timer(name, **labels):
+    # with timer('ranking'): ... records the block's duration when instrumentation is on
+    return _metrics.timer(name, **labels)
+
+
+def count(name, value=1, **labels):
+    _metrics.count(name, value, **labels)
+
+
+def record_error(name, exception, **labels):
+    _metrics.error(name, exception, **labels)
+
+
+def metrics_enabled():
+    return _metrics.enabled
+
+
+def timed(name):
+    # Decorator timing every call of a function, a flag check and nothing else while instrumentation is off
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _metrics.enabled:
+                return function(*args, **kwargs)
+            with _metrics.timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+atexit.register(lambda: _metrics.close())
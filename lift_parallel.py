@@ -0,0 +1,102 @@
+import collections
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from lift_criteria import PARAMETER_NAMES, current_criteria
+from lift_engine import CompiledCriteria, _as_columns, synthetic_wells
+from lift_topsis import topsis_wells
+
+# Number of wells sent to a worker per task
+DEFAULT_SHARD_SIZE = 50000
+
+# Criteria compiled once in each worker process by _init_worker
+_worker_criteria = None
+
+
+def _init_worker(table):
+    # Runs once per worker: the criteria table is pickled once per process instead of once per task
+    global _worker_criteria
+    _worker_criteria = CompiledCriteria(table)
+
+
+def score_shard(columns, topsis=False):
+    # Scores of one shard, with topsis=True also the TOPSIS closeness of every method
+    matrix, category_mask = _worker_criteria.encode(columns)
+    scores = _worker_criteria.score(matrix, category_mask)
+    if topsis:
+        return scores, topsis_wells(columns, _worker_criteria)[2]
+    return scores
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def split_shards(wells, shard_size=DEFAULT_SHARD_SIZE):
+    # Cut the columns into consecutive shards of at most shard_size wells
+    columns = {name: np.asarray(values) for name, values in _as_columns(wells).items()
+               if name in PARAMETER_NAMES}
+    n_wells = len(columns[PARAMETER_NAMES[0]])
+    for start in range(0, n_wells, shard_size):
+        yield {name: values[start:start + shard_size] for name, values in columns.items()}
+
+
+def create_pool(workers=None, table=None):
+    return ProcessPoolExecutor(max_workers=workers or default_workers(), initializer=_init_worker,
+                               initargs=(table or current_criteria(),))
+
+
+def map_ordered(executor, function, iterable, max_pending):
+    # Like executor.map, but only max_pending tasks are in flight so a streamed input
+    # is never read ahead into memory. Results come back in input order
+    pending = collections.deque()
+    for item in iterable:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def score_wells_parallel(wells, workers=None, shard_size=DEFAULT_SHARD_SIZE, table=None):
+    # Same result as lift_engine.score_wells, computed on a process pool. Shards are gathered in
+    # submission order so the output is identical to a serial run whatever the worker count
+    workers = workers or default_workers()
+    table = table or current_criteria()
+    shards = split_shards(wells, shard_size)
+
+    if workers == 1:
+        criteria = CompiledCriteria(table)
+        parts = [criteria.score(*criteria.encode(shard)) for shard in shards]
+    else:
+        with create_pool(workers, table) as executor:
+            parts = list(map_ordered(executor, score_shard, shards, 2 * workers))
+
+    if parts:
+        scores = np.concatenate(parts)
+    else:
+        scores = np.zeros((0, len(table)), dtype=np.int16)
+    return scores, scores.argmax(axis=1)
+
+
+def measure_speedup(n_wells=200000, max_workers=None, shard_size=DEFAULT_SHARD_SIZE, repeat=3, seed=0):
+    # Time score_wells_parallel on synthetic wells for 1..max_workers workers.
+    # Returns a list of (workers, best seconds, speedup over one worker)
+    max_workers = max_workers or default_workers()
+    wells = synthetic_wells(n_wells, seed)
+    curve = []
+    baseline = None
+
+    for workers in range(1, max_workers + 1):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            score_wells_parallel(wells, workers, shard_size)
+            timings.append(time.perf_counter() - start)
+        seconds = min(timings)
+        baseline = baseline or seconds
+        curve.append((workers, seconds, baseline / seconds))
+    return curve
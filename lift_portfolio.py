@@ -0,0 +1,237 @@
+import numpy as np
+
+from lift_engine import default_criteria
+from lift_ranking import METHOD_PROPERTIES, allowed_methods
+
+# Shared budgets of a field and the METHOD_PROPERTIES figure each one limits: capital cost (USD), lift gas
+# injection (Mscf/d) and electrical power drawn at the wells (kW)
+RESOURCES = {'capex': 'capital_cost', 'gas': 'gas_rate', 'power': 'electric_kw'}
+
+# Passes over the budgets and bisection steps per budget of the Lagrangian bound, and repair/fill rounds
+# of the greedy
+DUAL_ROUNDS = 5
+BISECTION_STEPS = 30
+MAX_ROUNDS = 50
+
+# Weight of a budget the Lagrangian multipliers do not price, relative to the highest priced one
+PRICE_FLOOR = 1e-3
+
+# Budget use below this fraction of a budget counts as rounding
+TOLERANCE = 1e-9
+
+
+def resource_usage(methods, resources=tuple(RESOURCES)):
+    # (methods x resources) use of each resource by one well, NaN where METHOD_PROPERTIES has no figure
+    return np.array([[np.nan if METHOD_PROPERTIES.get(method, {}).get(RESOURCES[name]) is None
+                      else METHOD_PROPERTIES[method][RESOURCES[name]] for name in resources]
+                     for method in methods], dtype=float).reshape(len(methods), len(resources))
+
+
+def optimize_portfolio(scores, methods, budgets, allowed=None, usage=None, rounds=DUAL_ROUNDS, assumed=None):
+    # Assign at most one lift method to every well so that the total score (e.g. criteria met) is as high
+    # as possible within the budgets ({'capex': USD, 'gas': Mscf/d, 'power': kW}, None for no limit).
+    # allowed (wells x methods) holds the hard constraints, usage (wells x methods x budgets) overrides the
+    # per-method figures, e.g. with well-specific estimates. A well may be left without a method, so there
+    # is always a solution. Methods of unknown use cannot be placed within that budget, and are listed as
+    # 'unknown' in its report, unless assumed ({budget: figure per well}) stands in for the missing figures.
+    #
+    # Greedy with repair on this multiple-choice knapsack: start from every well's best method, repair
+    # over-spent budgets with the moves losing the least score per unit of budget freed, then spend what is
+    # left on the best upgrades per unit of budget. The Lagrangian relaxation of the budgets gives an upper
+    # bound on the optimum and prices for the budgets, used to weigh them in further greedy starts
+    methods = tuple(methods)
+    names = [name for name, budget in budgets.items() if budget is not None]
+    unknown = [name for name in names + list(assumed or ()) if name not in RESOURCES]
+    if unknown:
+        raise ValueError(f"Unknown budget(s) {', '.join(unknown)}, expected: " + ", ".join(RESOURCES))
+    budget = np.array([budgets[name] for name in names], dtype=float).reshape(len(names))
+    if (budget < 0).any() or any(figure < 0 for figure in (assumed or {}).values()):
+        raise ValueError("Budgets and assumed figures cannot be negative")
+
+    scores = np.asarray(scores, dtype=float)
+    n_wells = len(scores)
+    if usage is None:
+        usage = resource_usage(methods, names)
+    usage = np.asarray(usage, dtype=float)
+    if assumed:
+        usage = np.where(np.isnan(usage), [assumed.get(name, np.nan) for name in names], usage)
+    usage = np.broadcast_to(usage, (n_wells, len(methods), len(names)))
+    allowed = np.ones(scores.shape, dtype=bool) if allowed is None else np.asarray(allowed, dtype=bool)
+    unpriced = np.isnan(usage).any(axis=0) & allowed.any(axis=0)[:, None]
+
+    # Use as a fraction of each budget. A zero budget cuts every method using any of it (cut, per budget),
+    # those stay in the demand and make the budget binding when they would score higher. The last column
+    # is "no method": no score, no use
+    known = allowed & ~np.isnan(usage).any(axis=2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(budget > 0, usage / np.where(budget > 0, budget, 1), np.where(usage > 0, np.inf, usage))
+    cut = known[:, :, None] & ~np.isfinite(share)
+    allowed = known & ~cut.any(axis=2)
+    value = np.concatenate([np.where(allowed, scores, -np.inf), np.zeros((n_wells, 1))], axis=1)
+    share = np.concatenate([np.where(allowed[:, :, None], share, 0), np.zeros((n_wells, 1, len(names)))], axis=1)
+
+    solver = _Solver(value, share)
+    unconstrained = value.argmax(axis=1)
+    upper_bound, multipliers, priced = solver.dual_bound(rounds)
+    best = solver.solve(unconstrained.copy())
+    if multipliers.any():
+        # Budgets weighed by their multipliers, those not limiting the relaxation hardly count. Two more
+        # starts: the priced choice repaired, and every well's best method using no budget upgraded
+        prices = multipliers / multipliers.max() + PRICE_FLOOR
+        free = np.where((share > 0).any(axis=2), -np.inf, value).argmax(axis=1)
+        best = max([best, solver.solve(priced.copy(), prices), solver.fill(free, prices)], key=solver.total)
+
+    rows = np.arange(n_wells)
+    used = share[rows, best].sum(axis=0) * budget
+    wanted = np.concatenate([np.where(known, scores, -np.inf), np.zeros((n_wells, 1))], axis=1)
+    first = wanted.argmax(axis=1)
+    demand = np.where((first < len(methods))[:, None], usage[rows, np.minimum(first, len(methods) - 1)], 0).sum(axis=0)
+    gain = wanted[:, :-1] > value[rows, best][:, None]
+    binding = solver.binding(best) | (cut & gain[:, :, None]).any(axis=(0, 1))
+    assignment = np.where(best == len(methods), -1, best)
+    total = solver.total(best)
+    report = {}
+    for r, name in enumerate(names):
+        # demand is what every well's best allowed method would use without the budgets. The shadow price
+        # is the score the Lagrangian relaxation would gain per extra unit of budget
+        report[name] = {'budget': float(budget[r]), 'used': float(used[r]), 'demand': float(demand[r]),
+                        'slack': float(budget[r] - used[r]), 'binding': bool(binding[r]),
+                        'shadow_price': float(multipliers[r] / budget[r]) if budget[r] > 0 else None,
+                        'unknown': [method for method, missing in zip(methods, unpriced[:, r]) if missing]}
+    counts = np.bincount(best, minlength=len(methods) + 1)
+    return {'methods': methods, 'assignment': assignment, 'total_score': total, 'upper_bound': upper_bound,
+            'gap': (upper_bound - total) / upper_bound if upper_bound > 0 else 0.0,
+            'counts': dict(zip(methods, counts[:-1].tolist())), 'unassigned': int(counts[-1]), 'budgets': report}
+
+
+def optimize_field(wells, budgets, constraints=None, criteria=None, assumed=None):
+    # optimize_portfolio for well records on the criteria met, with lift_ranking's hard constraints
+    criteria = criteria or default_criteria()
+    scores = criteria.score(*criteria.encode(wells))
+    allowed = allowed_methods(criteria.methods, constraints, len(scores))
+    return optimize_portfolio(scores, criteria.methods, budgets, allowed, assumed=assumed)
+
+
+class _Solver:
+    # value (wells x choices, -inf where not allowed) and share (wells x choices x budgets, fractions of
+    # each budget) with the last choice being "no method"
+    def __init__(self, value, share):
+        self.value = value
+        self.share = share
+        self.rows = np.arange(len(value))
+
+    def total(self, choice):
+        return float(self.value[self.rows, choice].sum())
+
+    def solve(self, choice, prices=None):
+        # prices weigh the budgets against each other (default: by how much each is over-spent, then equally)
+        choice = self.repair(choice, prices)
+        return self.fill(choice, prices)
+
+    def repair(self, choice, prices=None):
+        # While a budget is over-spent, apply the moves with the least score lost per unit of (price-
+        # weighted) budget freed until they cover the excess, then look again
+        for _ in range(MAX_ROUNDS):
+            excess = self.share[self.rows, choice].sum(axis=0) - 1
+            if not (excess > TOLERANCE).any():
+                return choice
+            weights = np.where(excess > TOLERANCE, excess if prices is None else prices, 0)
+            weighted = self.share @ weights
+            relief = weighted[self.rows, choice][:, None] - weighted
+            loss = self.value[self.rows, choice][:, None] - self.value
+            with np.errstate(invalid='ignore'):
+                ratio = np.where(relief > TOLERANCE, loss / np.where(relief > TOLERANCE, relief, 1), np.inf)
+            move = ratio.argmin(axis=1)
+            move_ratio = ratio[self.rows, move]
+            candidates = np.flatnonzero(np.isfinite(move_ratio))
+            if not len(candidates):
+                break
+            order = candidates[np.argsort(move_ratio[candidates], kind='stable')]
+            freed = np.cumsum(relief[order, move[order]])
+            take = order[:np.searchsorted(freed, weights @ excess - TOLERANCE) + 1]
+            choice[take] = move[take]
+
+        # Still over budget after MAX_ROUNDS: drop methods, least score per unit of budget first
+        excess = self.share[self.rows, choice].sum(axis=0) - 1
+        for i in np.argsort(self.value[self.rows, choice] / (self.share[self.rows, choice].sum(axis=1) + TOLERANCE)):
+            if not (excess > TOLERANCE).any():
+                break
+            excess -= self.share[i, choice[i]]
+            choice[i] = self.value.shape[1] - 1
+        return choice
+
+    def fill(self, choice, prices=None):
+        # Spend the budget left on upgrades, the most score gained per unit of budget first. Each upgrade is
+        # checked against what the earlier ones left
+        for _ in range(MAX_ROUNDS):
+            slack = 1 - self.share[self.rows, choice].sum(axis=0)
+            gain = self.value - self.value[self.rows, choice][:, None]
+            extra = self.share - self.share[self.rows, choice][:, None, :]
+            fits = (gain > 0) & (extra <= slack + TOLERANCE).all(axis=2)
+            price = np.clip(extra, 0, None) @ (np.ones(extra.shape[2]) if prices is None else prices)
+            ratio = np.where(fits, gain / (price + TOLERANCE), -np.inf)
+            move = ratio.argmax(axis=1)
+            candidates = np.flatnonzero(np.isfinite(ratio[self.rows, move]))
+            if not len(candidates):
+                break
+            changed = False
+            slack = slack.tolist()
+            for i in candidates[np.argsort(-ratio[candidates, move[candidates]], kind='stable')].tolist():
+                needed = extra[i, move[i]].tolist()
+                if all(n <= s + TOLERANCE for n, s in zip(needed, slack)):
+                    slack = [s - n for n, s in zip(needed, slack)]
+                    choice[i] = move[i]
+                    changed = True
+            if not changed:
+                break
+        return choice
+
+    def binding(self, choice):
+        # Per budget, whether what is left of it is too little for a move that would raise the score
+        slack = 1 - self.share[self.rows, choice].sum(axis=0)
+        gain = self.value > self.value[self.rows, choice][:, None]
+        extra = self.share - self.share[self.rows, choice][:, None, :]
+        return (gain[:, :, None] & (extra > slack + TOLERANCE)).any(axis=(0, 1))
+
+    def lagrangian(self, multipliers):
+        # Upper bound on the optimum for multipliers >= 0 (one per budget): every well takes its best
+        # method at those prices, plus the value of the budgets at those prices. Returns it with the choice
+        choice = (self.value - self.share @ multipliers).argmax(axis=1)
+        priced = self.value[self.rows, choice] - self.share[self.rows, choice] @ multipliers
+        return float(priced.sum() + multipliers.sum()), choice
+
+    def dual_bound(self, rounds):
+        # Minimize the Lagrangian one multiplier at a time: it is convex and piecewise linear in each, with
+        # its minimum where that budget's use at the priced choice crosses the budget, found by bisection.
+        # Returns the lowest bound, its multipliers and the choice they price, a start for the greedy
+        n_budgets = self.share.shape[2]
+        multipliers = np.zeros(n_budgets)
+        bound, choice = self.lagrangian(multipliers)
+        best = (bound, multipliers.copy(), choice)
+        finite = self.value[np.isfinite(self.value)]
+        for _ in range(rounds):
+            previous = best[0]
+            for r in range(n_budgets):
+                # No well takes a method using budget r once it costs more than any score per share
+                positive = self.share[:, :, r][self.share[:, :, r] > 0]
+                if not len(positive):
+                    continue
+                low, high = 0.0, (finite.max() + 1) / positive.min()
+                multipliers[r] = low
+                if self.share[self.rows, self.lagrangian(multipliers)[1], r].sum() <= 1:
+                    high = low
+                for _ in range(BISECTION_STEPS if high > low else 0):
+                    multipliers[r] = (low + high) / 2
+                    choice = self.lagrangian(multipliers)[1]
+                    if self.share[self.rows, choice, r].sum() > 1:
+                        low = multipliers[r]
+                    else:
+                        high = multipliers[r]
+                for multipliers[r] in (low, high):
+                    bound, choice = self.lagrangian(multipliers)
+                    if bound < best[0]:
+                        best = (bound, multipliers.copy(), choice)
+                multipliers[r] = best[1][r]
+            if previous - best[0] <= TOLERANCE * max(abs(previous), 1):
+                break
+        return best
@@ -0,0 +1,124 @@
+import numpy as np
+
+from lift_engine import BLOCK_SIZE, default_criteria
+
+# Typical capital cost (USD, None where no figure is known) and operating needs of each lift method:
+# electric_power for methods that need electricity at the well, injection_gas for a gas supply, offshore
+# for methods suited to offshore installations. gas_rate (injection gas, Mscf/d) and electric_kw
+# (electricity drawn at the well, kW, 0 where electric_power is False) are typical per-well figures for the
+# field budgets of lift_portfolio
+METHOD_PROPERTIES = {
+    'Gas Lift': {'capital_cost': 331107, 'electric_power': False, 'injection_gas': True, 'offshore': True,
+                 'gas_rate': 600, 'electric_kw': 0},
+    'Sucker Rod Pump': {'capital_cost': 205433, 'electric_power': False, 'injection_gas': False, 'offshore': False,
+                        'gas_rate': 0, 'electric_kw': 0},
+    'ESP': {'capital_cost': 215694, 'electric_power': True, 'injection_gas': False, 'offshore': True,
+            'gas_rate': 0, 'electric_kw': 110},
+    'Hydraulic Piston Pump': {'capital_cost': None, 'electric_power': False, 'injection_gas': False, 'offshore': True,
+                              'gas_rate': 0, 'electric_kw': 0},
+    'Hydraulic Jet Pump': {'capital_cost': None, 'electric_power': False, 'injection_gas': False, 'offshore': True,
+                           'gas_rate': 0, 'electric_kw': 0},
+    'Plunger Lift': {'capital_cost': None, 'electric_power': False, 'injection_gas': False, 'offshore': False,
+                     'gas_rate': 0, 'electric_kw': 0},
+    'PCP': {'capital_cost': 211412, 'electric_power': True, 'injection_gas': False, 'offshore': False,
+            'gas_rate': 0, 'electric_kw': 22},
+}
+
+# Hard constraints: the property every allowed method must have that value for. A method with no
+# properties (e.g. added by a criteria file) is excluded by any active constraint
+CONSTRAINTS = {
+    'no_power': ('electric_power', False),
+    'no_gas': ('injection_gas', False),
+    'offshore': ('offshore', True),
+}
+
+
+def method_costs(methods):
+    # Capital cost of each method, NaN when unknown
+    return np.array([np.nan if METHOD_PROPERTIES.get(method, {}).get('capital_cost') is None
+                     else METHOD_PROPERTIES[method]['capital_cost'] for method in methods], dtype=float)
+
+
+def format_cost(method):
+    cost = METHOD_PROPERTIES.get(method, {}).get('capital_cost')
+    return "$ UNKNOWN" if cost is None else f"$ {cost:,}"
+
+
+def allowed_methods(methods, constraints=None, n_wells=1, max_cost=None):
+    # (wells x methods) mask of the methods meeting every hard constraint. constraints maps a CONSTRAINTS
+    # name to True/False for the whole field or to one flag per well; max_cost (a number or one per well)
+    # excludes methods costing more and those of unknown cost
+    allowed = np.ones((n_wells, len(methods)), dtype=bool)
+    for name, active in (constraints or {}).items():
+        if name not in CONSTRAINTS:
+            raise ValueError(f"Unknown constraint {name!r}, expected one of: " + ", ".join(CONSTRAINTS))
+        key, value = CONSTRAINTS[name]
+        meets = np.array([METHOD_PROPERTIES.get(method, {}).get(key) is value for method in methods])
+        allowed &= ~np.asarray(active, dtype=bool).reshape(-1, 1) | meets
+    if max_cost is not None:
+        with np.errstate(invalid='ignore'):
+            allowed &= method_costs(methods) <= np.asarray(max_cost, dtype=float).reshape(-1, 1)
+    return allowed
+
+
+def rank_scores(scores, allowed):
+    # Order of the methods per well, best first, and their competition rank: 1 + the number of allowed
+    # methods with a strictly higher score, so tied methods share a rank (0 for an excluded method).
+    # Ties keep the criteria table order, the first method is then the one predict_best_lift_method picks
+    key = np.where(allowed, scores, -np.inf)
+    order = np.argsort(-key, axis=1, kind='stable')
+    higher = (key[:, None, :] > key[:, :, None]).sum(axis=2)
+    return order, np.where(allowed, higher + 1, 0)
+
+
+def pareto_front(scores, costs, allowed):
+    # Allowed methods no other allowed method beats on both technical score (higher) and capital cost
+    # (lower) without being worse on either. An unknown cost counts as infinite, so such a method is only
+    # on the front when nothing scores as high
+    costs = np.broadcast_to(np.where(np.isnan(costs), np.inf, costs), scores.shape)
+    s_j, s_k = scores[:, :, None], scores[:, None, :]
+    c_j, c_k = costs[:, :, None], costs[:, None, :]
+    dominates = allowed[:, None, :] & (s_k >= s_j) & (c_k <= c_j) & ((s_k > s_j) | (c_k < c_j))
+    return allowed & ~dominates.any(axis=2)
+
+
+def rank_field(scores, methods, constraints=None, max_cost=None):
+    # Ranking of every method for every well of a field in one pass: the score matrix (wells x methods)
+    # with the hard constraints applied, the Pareto front of score vs capital cost, the best allowed
+    # method per well (-1 when none is allowed) and whether it is tied
+    scores = np.asarray(scores)
+    methods = tuple(methods)
+    costs = method_costs(methods)
+    allowed = allowed_methods(methods, constraints, len(scores), max_cost)
+    order = np.empty(scores.shape, dtype=np.intp)
+    rank = np.empty(scores.shape, dtype=np.int16)
+    pareto = np.empty(scores.shape, dtype=bool)
+
+    # The pairwise comparisons are (wells x methods x methods), computed block by block to bound memory
+    for start in range(0, len(scores), BLOCK_SIZE):
+        block = slice(start, start + BLOCK_SIZE)
+        order[block], rank[block] = rank_scores(scores[block], allowed[block])
+        pareto[block] = pareto_front(scores[block], costs, allowed[block])
+
+    best = np.where(allowed.any(axis=1), order[:, 0], -1)
+    tied = (rank == 1).sum(axis=1) > 1
+    return {'methods': methods, 'scores': scores, 'costs': costs, 'allowed': allowed, 'order': order,
+            'rank': rank, 'best': best, 'tied': tied, 'pareto': pareto}
+
+
+def rank_wells(wells, constraints=None, max_cost=None, criteria=None):
+    # rank_field for well records (see CompiledCriteria.encode), scored on the criteria met
+    criteria = criteria or default_criteria()
+    scores = criteria.score(*criteria.encode(wells))
+    return rank_field(scores, criteria.methods, constraints, max_cost)
+
+
+def rank_well(values, constraints=None, max_cost=None, criteria=None):
+    # Full ranking of one well, values in the argument order of predict_best_lift_method. Returns a list
+    # best first of {'method', 'criteria_met', 'rank', 'capital_cost', 'allowed', 'pareto'}
+    ranking = rank_wells([tuple(values)], constraints, max_cost, criteria)
+    costs = ranking['costs']
+    return [{'method': ranking['methods'][j], 'criteria_met': int(ranking['scores'][0, j]),
+             'rank': int(ranking['rank'][0, j]), 'capital_cost': None if np.isnan(costs[j]) else float(costs[j]),
+             'allowed': bool(ranking['allowed'][0, j]), 'pareto': bool(ranking['pareto'][0, j])}
+            for j in ranking['order'][0]]
@@ -0,0 +1,291 @@
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from lift_cache import canonical_value
+from lift_criteria import PARAMETER_KINDS, PARAMETER_NAMES
+from lift_engine import CompiledCriteria, default_criteria
+from lift_ranking import rank_field
+
+# Environment variable naming the scenario store of the GUI and the scenarios command
+SCENARIO_FILE_ENV = 'LIFT_SCENARIO_FILE'
+DEFAULT_SCENARIO_FILE = 'lift_scenarios.db'
+
+# A scenario is every input of the Criteria tab: the criteria in the argument order of
+# predict_best_lift_method followed by the Surface Infrastructure selections
+INFRASTRUCTURE_FIELDS = ('offshore_application', 'electrical_power', 'space_restrictions', 'well_service')
+SCENARIO_FIELDS = PARAMETER_NAMES + INFRASTRUCTURE_FIELDS
+
+# The scenarios shown in a list are capped, replay and diff always cover every match
+LIST_LIMIT = 1000
+
+_SCHEMA = (
+    # The inputs are stored once per distinct content, as a compact JSON array in SCENARIO_FIELDS order
+    # keyed by its hash, however many scenarios share them
+    "CREATE TABLE IF NOT EXISTS contents (hash TEXT PRIMARY KEY, inputs TEXT NOT NULL) WITHOUT ROWID",
+    # method and scores are the recommendation when the scenario was saved, under the criteria version
+    "CREATE TABLE IF NOT EXISTS scenarios (id INTEGER PRIMARY KEY, well_id TEXT NOT NULL, name TEXT NOT NULL, "
+    "hash TEXT NOT NULL REFERENCES contents (hash), saved REAL NOT NULL, criteria TEXT NOT NULL, "
+    "method TEXT NOT NULL, scores TEXT NOT NULL, UNIQUE (well_id, name))",
+    "CREATE INDEX IF NOT EXISTS scenarios_hash ON scenarios (hash)",
+    "CREATE TABLE IF NOT EXISTS tags (tag TEXT NOT NULL, scenario INTEGER NOT NULL REFERENCES scenarios (id), "
+    "PRIMARY KEY (tag, scenario)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS tags_scenario ON tags (scenario)",
+)
+
+
+def scenario_constraints(infrastructure):
+    # Hard constraints of lift_ranking from the Surface Infrastructure selections: no electrical power at the
+    # well, and an offshore well that needs a method with excellent offshore application. Each value may be
+    # one selection or one per scenario
+    return {'no_power': np.asarray(infrastructure['electrical_power']) == 'N/A',
+            'offshore': np.asarray(infrastructure['offshore_application']) == 'Excellent'}
+
+
+def canonical_inputs(values):
+    # The inputs of one scenario ({field: value}) as a list in SCENARIO_FIELDS order: numbers as floats, so
+    # 5 and 5.0 are the same content, text as given. Blank numbers are None, a missing selection is blank
+    missing = [name for name in PARAMETER_NAMES if name not in values]
+    if missing:
+        raise ValueError("Missing input(s): " + ", ".join(missing))
+    inputs = []
+    for name in SCENARIO_FIELDS:
+        value = values.get(name)
+        if PARAMETER_KINDS.get(name, 'in') == 'in':
+            inputs.append('' if value is None else str(value))
+        else:
+            value = canonical_value(value) if value is not None else None
+            inputs.append(None if value is None or value != value else value)
+    return inputs
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+def encode_inputs(values):
+    # (hash, compact JSON text) of one scenario's inputs, equal inputs give the same hash
+    text = json.dumps(canonical_inputs(values), separators=(',', ':'), ensure_ascii=False)
+    return content_hash(text), text
+
+
+def decode_inputs(texts):
+    # Columns ({field: list}) of the inputs stored as encode_inputs texts, blank numbers become NaN. The
+    # texts are parsed as one JSON array, much faster than one by one
+    rows = json.loads('[' + ','.join(texts) + ']')
+    columns = {name: list(values) for name, values in zip(SCENARIO_FIELDS, zip(*rows))} if rows else \
+        {name: [] for name in SCENARIO_FIELDS}
+    for name in PARAMETER_NAMES:
+        if PARAMETER_KINDS[name] != 'in':
+            columns[name] = np.array([np.nan if value is None else value for value in columns[name]], dtype=float)
+    return columns
+
+
+def recommend(columns, criteria=None):
+    # Score scenario columns in one vectorized run: lift_ranking.rank_field of the criteria met, with each
+    # scenario's infrastructure as its hard constraints. 'best' is -1 where no method is allowed
+    if criteria is None:
+        criteria = default_criteria()
+    elif not isinstance(criteria, CompiledCriteria):
+        criteria = CompiledCriteria(criteria)
+    scores = criteria.score(*criteria.encode({name: columns[name] for name in PARAMETER_NAMES}))
+    ranking = rank_field(scores, criteria.methods, scenario_constraints(columns))
+    ranking['version'] = criteria.version
+    return ranking
+
+
+def best_methods(ranking):
+    # Name of the recommended method per scenario, blank when no method is allowed
+    return np.asarray(ranking['methods'] + ('',), dtype=object)[ranking['best']]
+
+
+class ScenarioStore:
+    # Saved scenarios in a SQLite file: many named scenarios per well, each with tags and the recommendation
+    # it had when saved. The inputs are content-addressed, so identical inputs are stored and scored once;
+    # lookups by well ID and by tag use indexes
+    def __init__(self, path=None):
+        self.path = path or os.environ.get(SCENARIO_FILE_ENV) or DEFAULT_SCENARIO_FILE
+        self._db = sqlite3.connect(self.path)
+        with self._db:
+            for statement in _SCHEMA:
+                self._db.execute(statement)
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM scenarios").fetchone()[0]
+
+    def save(self, well_id, name, values, tags=(), criteria=None):
+        # Save one scenario ({field: value}, see SCENARIO_FIELDS) and return its id. Saving again under the
+        # same well ID and name replaces it
+        return self.save_many([well_id], [name], {field: [value] for field, value in values.items()}, tags,
+                              criteria)[0]
+
+    def save_many(self, well_ids, names, columns, tags=(), criteria=None):
+        # Save a batch of scenarios given as columns ({field: values}), scoring them in one run, in a single
+        # transaction. tags apply to every scenario. Returns the ids
+        n_rows = len(well_ids)
+        if len(names) != n_rows:
+            raise ValueError("One name is needed per well ID")
+        well_ids = [str(well_id).strip() for well_id in well_ids]
+        names = [str(name).strip() for name in names]
+        if not all(well_ids) or not all(names):
+            raise ValueError("Scenarios need a well ID and a name")
+        missing = [name for name in PARAMETER_NAMES if name not in columns]
+        if missing:
+            raise ValueError("Missing input(s): " + ", ".join(missing))
+        columns = {field: columns[field] if field in columns else [''] * n_rows for field in SCENARIO_FIELDS}
+        tags = sorted({tag.strip() for tag in tags if tag.strip()})
+
+        encoded = [encode_inputs({field: columns[field][row] for field in SCENARIO_FIELDS})
+                   for row in range(n_rows)]
+        ranking = recommend(decode_inputs([text for _, text in encoded]), criteria)
+        methods = best_methods(ranking).tolist()
+        scores = [json.dumps(dict(zip(ranking['methods'], row)), separators=(',', ':'))
+                  for row in ranking['scores'].tolist()]
+        now = time.time()
+
+        with self._db:
+            self._db.executemany("INSERT OR IGNORE INTO contents (hash, inputs) VALUES (?, ?)", encoded)
+            self._db.executemany(
+                "INSERT INTO scenarios (well_id, name, hash, saved, criteria, method, scores) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (well_id, name) DO UPDATE SET hash = excluded.hash, "
+                "saved = excluded.saved, criteria = excluded.criteria, method = excluded.method, "
+                "scores = excluded.scores",
+                [(well_id, name, content, now, ranking['version'], method, score)
+                 for well_id, name, (content, _), method, score in zip(well_ids, names, encoded, methods, scores)])
+            ids = [self._db.execute("SELECT id FROM scenarios WHERE well_id = ? AND name = ?", key).fetchone()[0]
+                   for key in zip(well_ids, names)]
+            self._db.executemany("DELETE FROM tags WHERE scenario = ?", [(id_,) for id_ in ids])
+            self._db.executemany("INSERT OR IGNORE INTO tags (tag, scenario) VALUES (?, ?)",
+                                 [(tag, id_) for id_ in ids for tag in tags])
+            self._prune_contents()
+        return ids
+
+    def delete(self, scenario_id):
+        with self._db:
+            self._db.execute("DELETE FROM tags WHERE scenario = ?", (scenario_id,))
+            self._db.execute("DELETE FROM scenarios WHERE id = ?", (scenario_id,))
+            self._prune_contents()
+
+    def _prune_contents(self):
+        # Drop the inputs no scenario refers to any more, e.g. after a scenario was replaced
+        self._db.execute("DELETE FROM contents WHERE NOT EXISTS "
+                         "(SELECT 1 FROM scenarios WHERE scenarios.hash = contents.hash)")
+
+    def find(self, well_id=None, tag=None, limit=None):
+        # Scenarios of a well and/or with a tag (all of them without either), newest first. Each is
+        # {'id', 'well_id', 'name', 'hash', 'saved', 'criteria', 'method', 'scores', 'tags'}, with the saved
+        # recommendation: method under the criteria version and the criteria met per method ({method: met})
+        query = "SELECT id, well_id, name, hash, saved, criteria, method, scores FROM scenarios"
+        conditions, parameters = [], []
+        if well_id is not None:
+            conditions.append("well_id = ?")
+            parameters.append(well_id)
+        if tag is not None:
+            conditions.append("id IN (SELECT scenario FROM tags WHERE tag = ?)")
+            parameters.append(tag)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY saved DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        fields = ('id', 'well_id', 'name', 'hash', 'saved', 'criteria', 'method', 'scores')
+        scenarios = [dict(zip(fields, row)) for row in self._db.execute(query, parameters)]
+        scores = json.loads('[' + ','.join(scenario['scores'] for scenario in scenarios) + ']')
+        for scenario, saved in zip(scenarios, scores):
+            scenario['scores'] = saved
+        tags = collections.defaultdict(list)
+        for start in range(0, len(scenarios), 500):
+            ids = [scenario['id'] for scenario in scenarios[start:start + 500]]
+            for scenario_id, tag in self._db.execute(
+                    f"SELECT scenario, tag FROM tags WHERE scenario IN ({','.join('?' * len(ids))}) ORDER BY tag",
+                    ids):
+                tags[scenario_id].append(tag)
+        for scenario in scenarios:
+            scenario['tags'] = tags[scenario['id']]
+        return scenarios
+
+    def get(self, scenario_id):
+        # One scenario as find() gives it, with its inputs ({field: value})
+        row = self._db.execute("SELECT well_id FROM scenarios WHERE id = ?", (scenario_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No scenario {scenario_id}")
+        scenario = next(item for item in self.find(well_id=row[0]) if item['id'] == scenario_id)
+        text = self.contents([scenario['hash']])[scenario['hash']]
+        scenario['values'] = dict(zip(SCENARIO_FIELDS, json.loads(text)))
+        return scenario
+
+    def contents(self, hashes):
+        # {hash: inputs JSON text} of the given content hashes
+        hashes = list(hashes)
+        found = {}
+        for start in range(0, len(hashes), 500):
+            block = hashes[start:start + 500]
+            found.update(self._db.execute(
+                f"SELECT hash, inputs FROM contents WHERE hash IN ({','.join('?' * len(block))})", block))
+        return found
+
+    def stats(self):
+        scenarios, wells = self._db.execute("SELECT COUNT(*), COUNT(DISTINCT well_id) FROM scenarios").fetchone()
+        contents = self._db.execute("SELECT COUNT(*) FROM contents").fetchone()[0]
+        tags = self._db.execute("SELECT COUNT(DISTINCT tag) FROM tags").fetchone()[0]
+        return {'scenarios': scenarios, 'wells': wells, 'contents': contents, 'tags': tags}
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def replay(store, criteria=None, well_id=None, tag=None):
+    # Score the saved scenarios (of a well and/or with a tag) with the criteria, by default the ones in use,
+    # in one vectorized run. Each distinct content is decoded and scored once. Returns the scenarios as
+    # find() gives them and the rank_field result of the contents, with 'content' the content row of each
+    # scenario
+    scenarios = store.find(well_id, tag)
+    hashes = list(dict.fromkeys(scenario['hash'] for scenario in scenarios))
+    texts = store.contents(hashes)
+    ranking = recommend(decode_inputs([texts[content] for content in hashes]), criteria)
+    index = {content: i for i, content in enumerate(hashes)}
+    ranking['content'] = np.array([index[scenario['hash']] for scenario in scenarios], dtype=np.intp)
+    return scenarios, ranking
+
+
+def diff_recommendations(store, criteria=None, base=None, well_id=None, tag=None):
+    # How the recommendations of the saved scenarios change with the criteria (by default the ones in use):
+    # against the base criteria when given, both replayed, otherwise against the recommendation recorded
+    # when each scenario was saved. Returns {'scenarios', 'old', 'new' (method per scenario, blank for
+    # none), 'old_met', 'new_met' (criteria the method meets, None where unknown), 'changed' (indices of
+    # the scenarios whose method changed), 'transitions' (Counter of (old, new) among them), 'versions' and
+    # 'saved' (whether old is the saved recommendation)}
+    scenarios, ranking = replay(store, criteria, well_id, tag)
+    new = best_methods(ranking)[ranking['content']]
+    new_met = _best_met(ranking)[ranking['content']]
+    if base is None:
+        old = np.array([scenario['method'] for scenario in scenarios], dtype=object)
+        old_met = np.array([scenario['scores'].get(scenario['method']) for scenario in scenarios] + [None],
+                           dtype=object)[:-1]
+        old_versions = sorted({scenario['criteria'] for scenario in scenarios})
+    else:
+        _, base_ranking = replay(store, base, well_id, tag)
+        old = best_methods(base_ranking)[base_ranking['content']]
+        old_met = _best_met(base_ranking)[base_ranking['content']]
+        old_versions = [base_ranking['version']]
+    changed = np.flatnonzero(old != new)
+    transitions = collections.Counter(zip(old[changed].tolist(), new[changed].tolist()))
+    return {'scenarios': scenarios, 'old': old, 'new': new, 'old_met': old_met, 'new_met': new_met,
+            'changed': changed, 'transitions': transitions,
+            'versions': {'old': old_versions, 'new': ranking['version']}, 'saved': base is None}
+
+
+def _best_met(ranking):
+    # Criteria met by the recommended method of each content, None when no method is allowed
+    best = ranking['best']
+    met = ranking['scores'][np.arange(len(best)), np.maximum(best, 0)].astype(object)
+    met[best < 0] = None
+    return met
@@ -0,0 +1,53 @@
+from lift_cache import memoize
+from lift_criteria import current_criteria
+from lift_metrics import count, metrics_enabled, record_error, timed, timer
+from lift_topsis import topsis_well
+
+# Scoring core of the analyzer, importable without PyQt5 or matplotlib (batch jobs, services, benchmarks)
+
+
+@memoize('topsis')
+@timed('topsis')
+def calculate_scores(water_cut, fluid_viscosity, corrosion_handling, sand_production, gor, contaminants,
+                     treatment, number_of_wells, production_rate, well_depth, casing_size, deviated_well,
+                     dogleg_severity, temperature, safety_barriers, flowing_pressure, reservoir_access,
+                     completion, stability, recovery):
+    # TOPSIS over the criteria each lift method meets for this well: PIS and NIS are the distances to the
+    # positive and negative ideal solutions, the Performance Score (PS) is the closeness to the ideal.
+    # Returns {method: (pis, nis, ps)} for every method in the criteria table
+    scores = topsis_well((
+        water_cut, fluid_viscosity, corrosion_handling, sand_production, gor, contaminants,
+        treatment, number_of_wells, production_rate, well_depth, casing_size, deviated_well,
+        dogleg_severity, temperature, safety_barriers, flowing_pressure, reservoir_access,
+        completion, stability, recovery
+    ))
+    return {method: (round(pis, 6), round(nis, 6), round(ps, 4)) for method, (pis, nis, ps) in scores.items()}
+
+
+@memoize('best_method')
+def predict_best_lift_method(water_cut, fluid_viscosity, corrosion_handling, sand_production, gor, contaminants,
+                            treatment, number_of_wells, production_rate, well_depth, casing_size, deviated_well,
+                            dogleg_severity, temperature, safety_barriers, flowing_pressure, reservoir_access,
+                            completion, stability, recovery):
+    try:
+        # Score every lift method against the compiled criteria table, one lookup per parameter
+        criteria = current_criteria()
+        with timer('criteria_evaluation'):
+            lift_scores = criteria.score_well((
+                water_cut, fluid_viscosity, corrosion_handling, sand_production, gor, contaminants,
+                treatment, number_of_wells, production_rate, well_depth, casing_size, deviated_well,
+                dogleg_severity, temperature, safety_barriers, flowing_pressure, reservoir_access,
+                completion, stability, recovery
+            ))
+        if metrics_enabled():
+            for method, score in lift_scores.items():
+                count('criteria_met', score, method=method)
+
+        # Find the lift method with the highest score
+        with timer('ranking'):
+            best_lift_method = max(lift_scores, key=lift_scores.get)
+    except Exception as e:
+        # Recorded and raised, the caller reports the failure instead of getting None
+        record_error('predict_best_lift_method', e)
+        raise
+    return best_lift_method
@@ -0,0 +1,106 @@
+import numpy as np
+
+from lift_criteria import CATEGORY_OPTIONS, PARAMETER_KINDS, PARAMETER_NAMES
+from lift_engine import PARAMETER_INDEX, SYNTHETIC_RANGES, default_criteria
+
+DEFAULT_POINTS = 200
+MAX_GRID_POINTS = 1000
+
+# Default sweep range of every numeric parameter, and the values of the binary ones
+SWEEP_RANGES = dict(SYNTHETIC_RANGES, dogleg_severity=(0, 40), flowing_pressure=(0, 2000))
+SWEEP_CHOICES = {'reservoir_access': [0.0, 1.0]}
+
+
+def sweep_values(name, n_points=DEFAULT_POINTS, low=None, high=None, criteria=None):
+    # Grid for one parameter. Categorical parameters take their combo box choices; numeric ones an even
+    # grid plus every criterion bound or value inside it, so each decision boundary is sampled exactly
+    kind = PARAMETER_KINDS[name]
+    if kind == 'in':
+        return list(CATEGORY_OPTIONS[name])
+    if name in SWEEP_CHOICES:
+        return np.asarray(SWEEP_CHOICES[name])
+
+    criteria = criteria or default_criteria()
+    default_low, default_high = SWEEP_RANGES[name]
+    low = default_low if low is None else low
+    high = default_high if high is None else high
+    marks = np.asarray(criteria.table.intervals[name], dtype=float).ravel()
+    marks = marks[(marks >= low) & (marks <= high)]
+    return np.union1d(np.linspace(low, high, min(n_points, MAX_GRID_POINTS)), marks)
+
+
+def base_contributions(base_well, criteria=None):
+    # (parameters x methods) matches of the base well, values in the argument order of
+    # predict_best_lift_method or a {parameter: value} mapping
+    criteria = criteria or default_criteria()
+    if hasattr(base_well, 'keys'):
+        base_well = [base_well[name] for name in PARAMETER_NAMES]
+    matrix, category_mask = criteria.encode([tuple(base_well)])
+    return criteria.matches(matrix, category_mask)[0].astype(np.int16)
+
+
+def decision_boundaries(values, best, methods):
+    # Where the recommended method changes along a 1-D sweep
+    changes = np.flatnonzero(best[1:] != best[:-1])
+    return [{'between': (values[k], values[k + 1]), 'from': methods[best[k]], 'to': methods[best[k + 1]]}
+            for k in changes]
+
+
+def sweep(base_well, name, values=None, criteria=None):
+    # Vary one parameter with all others at the base well. Scores are additive over the criteria, so the
+    # whole grid is the base total with one criterion's row replaced: one (values x methods) broadcast
+    criteria = criteria or default_criteria()
+    values = sweep_values(name, criteria=criteria) if values is None else values
+    contributions = base_contributions(base_well, criteria)
+    fixed = contributions.sum(axis=0) - contributions[PARAMETER_INDEX[name]]
+
+    scores = fixed + criteria.parameter_matches(name, values)
+    best = scores.argmax(axis=1)
+    return {'parameter': name, 'values': values, 'methods': criteria.methods, 'scores': scores, 'best': best,
+            'boundaries': decision_boundaries(values, best, criteria.methods)}
+
+
+def sweep_2d(base_well, name_x, name_y, xs=None, ys=None, criteria=None):
+    # Vary two parameters over an (ys x xs) grid, up to 1000 x 1000, in one broadcast:
+    # fixed (methods) + x matches (1 x X x methods) + y matches (Y x 1 x methods)
+    if name_x == name_y:
+        raise ValueError("Pick two different parameters for a decision map")
+    criteria = criteria or default_criteria()
+    xs = sweep_values(name_x, criteria=criteria) if xs is None else xs
+    ys = sweep_values(name_y, criteria=criteria) if ys is None else ys
+    contributions = base_contributions(base_well, criteria)
+    fixed = (contributions.sum(axis=0) - contributions[PARAMETER_INDEX[name_x]]
+             - contributions[PARAMETER_INDEX[name_y]])
+
+    x_matches = criteria.parameter_matches(name_x, xs).astype(np.int16)
+    y_matches = criteria.parameter_matches(name_y, ys).astype(np.int16)
+    scores = fixed + x_matches[None, :, :] + y_matches[:, None, :]
+    best = scores.argmax(axis=-1)
+
+    # Cells whose recommendation differs from the neighbour on the right or above
+    boundary = np.zeros(best.shape, dtype=bool)
+    boundary[:, 1:] |= best[:, 1:] != best[:, :-1]
+    boundary[1:, :] |= best[1:, :] != best[:-1, :]
+    return {'x': name_x, 'y': name_y, 'xs': xs, 'ys': ys, 'methods': criteria.methods, 'best': best,
+            'boundary': boundary}
+
+
+def tornado(base_well, parameters=PARAMETER_NAMES, n_points=DEFAULT_POINTS, criteria=None):
+    # Swing of each parameter: how far the recommended method's lead over the runner-up moves when that
+    # parameter alone is swept over its range. Sorted from the largest swing down
+    criteria = criteria or default_criteria()
+    contributions = base_contributions(base_well, criteria)
+    base_best = int(contributions.sum(axis=0).argmax())
+    others = [j for j in range(len(criteria.methods)) if j != base_best]
+
+    bars = []
+    for name in parameters:
+        result = sweep(base_well, name, sweep_values(name, n_points, criteria=criteria), criteria)
+        margin = result['scores'][:, base_best] - result['scores'][:, others].max(axis=1)
+        takeovers = sorted({criteria.methods[j] for j in result['best'] if j != base_best})
+        bars.append({'parameter': name, 'swing': int(margin.max() - margin.min()), 'low': int(margin.min()),
+                     'high': int(margin.max()), 'takeovers': takeovers, 'boundaries': result['boundaries']})
+
+    bars.sort(key=lambda bar: bar['swing'], reverse=True)
+    return {'method': criteria.methods[base_best], 'bars': bars}
+
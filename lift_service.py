@@ -0,0 +1,387 @@
+import asyncio
+import collections
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from lift_criteria import PARAMETERS, PARAMETER_NAMES
+from lift_engine import default_criteria, synthetic_wells
+from lift_metrics import count, metrics, timer
+from lift_topsis import topsis_wells
+from lift_validation import check_value
+
+# Local JSON scoring service: POST /predict (predict_best_lift_method) and POST /scores (calculate_scores)
+# for one well or {"wells": [...]}, GET /health and GET /stats (latency percentiles, batch sizes)
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# A batch is scored as soon as no new request arrived during one pass of the event loop, or once it holds
+# MAX_BATCH wells or has waited MAX_WAIT seconds
+MAX_BATCH = 2048
+MAX_WAIT = 0.002
+
+# Requests per route kept for the latency percentiles, and the largest request body accepted
+LATENCY_WINDOW = 10000
+MAX_BODY = 1 << 20
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+def parse_well(data):
+    # One well from JSON, {parameter: value} or a list in the argument order of predict_best_lift_method.
+    # Returns the values in that order, numbers as floats within their physical limits
+    if isinstance(data, dict):
+        missing = [name for name in PARAMETER_NAMES if name not in data]
+        if missing:
+            raise ValueError("Missing parameter(s): " + ", ".join(missing))
+        values = [data[name] for name in PARAMETER_NAMES]
+    elif isinstance(data, list) and len(data) == len(PARAMETER_NAMES):
+        values = data
+    else:
+        raise ValueError(f"A well is an object with the {len(PARAMETER_NAMES)} parameters or a list of their "
+                         "values")
+
+    row = []
+    for (name, kind), value in zip(PARAMETERS, values):
+        if kind == 'in':
+            if not isinstance(value, str):
+                raise ValueError(f"{name} must be a string")
+            row.append(value)
+            continue
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number") from None
+        # The same physical limits as bulk validation (lift_validation)
+        problem = check_value(name, number)
+        if problem:
+            raise ValueError(f"{name} {number:g} is {problem}")
+        row.append(number)
+    return tuple(row)
+
+
+def parse_wells(payload):
+    # ([rows], True) for {"wells": [...]}, ([row], False) for a single well
+    if isinstance(payload, dict) and 'wells' in payload:
+        if not isinstance(payload['wells'], list) or not payload['wells']:
+            raise ValueError("wells must be a non-empty list")
+        return [parse_well(well) for well in payload['wells']], True
+    return [parse_well(payload)], False
+
+
+def predict_rows(rows):
+    # Vectorized predict_best_lift_method for parsed wells, with the criteria met per method
+    criteria = default_criteria()
+    scores = criteria.score(*criteria.encode(rows))
+    best = scores.argmax(axis=1)
+    return [{'method': criteria.methods[j], 'criteria_met': dict(zip(criteria.methods, row))}
+            for j, row in zip(best.tolist(), scores.tolist())]
+
+
+def score_rows(rows):
+    # Vectorized calculate_scores for parsed wells, rounded the same way
+    criteria = default_criteria()
+    d_positive, d_negative, closeness = (values.tolist() for values in topsis_wells(rows, criteria))
+    return [{'scores': {method: {'pis': round(pis[j], 6), 'nis': round(nis[j], 6), 'ps': round(ps[j], 4)}
+                        for j, method in enumerate(criteria.methods)}}
+            for pis, nis, ps in zip(d_positive, d_negative, closeness)]
+
+
+class MicroBatcher:
+    # Collects the wells of concurrent requests and scores them in one call of function (rows -> results).
+    # Scoring runs on the event loop: requests that arrive meanwhile wait in the socket buffers and are
+    # read straight after, so they form the next batch
+    def __init__(self, name, function, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+        self.name = name
+        self.function = function
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending = collections.deque()
+        self.n_pending = 0
+        self.wakeup = asyncio.Event()
+        self.batches = 0
+        self.wells = 0
+        self.largest = 0
+
+    async def submit(self, rows):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((rows, future))
+        self.n_pending += len(rows)
+        self.wakeup.set()
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.wakeup.wait()
+            started = loop.time()
+            while self.n_pending < self.max_batch and loop.time() - started < self.max_wait:
+                waiting = self.n_pending
+                await asyncio.sleep(0)
+                if self.n_pending == waiting:
+                    break
+            self.wakeup.clear()
+
+            # Whole requests up to max_batch wells, a larger request goes alone
+            batch, n_wells = [], 0
+            while self.pending and (not batch or n_wells + len(self.pending[0][0]) <= self.max_batch):
+                rows, future = self.pending.popleft()
+                batch.append((rows, future))
+                n_wells += len(rows)
+            self.n_pending -= n_wells
+            if self.pending:
+                self.wakeup.set()
+            self._score(batch, n_wells)
+
+    def _score(self, batch, n_wells):
+        try:
+            with timer('service.batch', route=self.name):
+                results = self.function([row for rows, _ in batch for row in rows])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.wells += n_wells
+        self.largest = max(self.largest, n_wells)
+        count('service.wells', n_wells, route=self.name)
+        start = 0
+        for rows, future in batch:
+            if not future.done():
+                future.set_result(results[start:start + len(rows)])
+            start += len(rows)
+
+    def stats(self):
+        return {'batches': self.batches, 'wells': self.wells, 'largest_batch': self.largest,
+                'mean_batch': self.wells / self.batches if self.batches else 0}
+
+
+class ScoringService:
+    # The HTTP side: HTTP/1.1 with keep-alive over asyncio streams, one MicroBatcher per scoring route
+    def __init__(self, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+        self.batchers = {'/predict': MicroBatcher('predict', predict_rows, max_batch, max_wait),
+                         '/scores': MicroBatcher('scores', score_rows, max_batch, max_wait)}
+        self.latencies = {route: collections.deque(maxlen=LATENCY_WINDOW) for route in self.batchers}
+        self.requests = collections.Counter()
+        self.errors = collections.Counter()
+        self.started = time.time()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        # Compile the criteria and run one batch of each kind before accepting requests, so the first
+        # caller does not pay for it
+        warm_up = [parse_well(well) for well in sample_wells(1)]
+        for batcher in self.batchers.values():
+            batcher.function(warm_up)
+            asyncio.get_running_loop().create_task(batcher.run())
+        return await asyncio.start_server(self.handle, host, port, reuse_address=True)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'Malformed request line'}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {'error': f'Request body over {MAX_BODY} bytes'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' or (version == 'HTTP/1.1' and connection != 'close')
+
+                start = time.perf_counter()
+                route = target.split('?', 1)[0]
+                status, payload = await self.dispatch(method, route, body)
+                await self.respond(writer, status, payload, keep_alive)
+                seconds = time.perf_counter() - start
+                self.requests[route] += 1
+                if status != 200:
+                    self.errors[route] += 1
+                if route in self.latencies:
+                    self.latencies[route].append(seconds)
+                    metrics().observe('service.request', seconds, route=route)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Service shutting down with the connection still open
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, route, body):
+        if route in self.batchers:
+            if method != 'POST':
+                return 405, {'error': f'Use POST for {route}'}
+            try:
+                rows, many = parse_wells(json.loads(body))
+            except ValueError as e:
+                return 400, {'error': str(e)}
+            try:
+                results = await self.batchers[route].submit(rows)
+            except Exception as e:
+                return 500, {'error': f'{e.__class__.__name__}: {e}'}
+            return 200, ({'results': results} if many else results[0])
+        if route in ('/health', '/stats'):
+            if method != 'GET':
+                return 405, {'error': f'Use GET for {route}'}
+            return 200, self.health() if route == '/health' else self.stats()
+        return 404, {'error': f'No route {route}'}
+
+    async def respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                     f"\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+    def health(self):
+        criteria = default_criteria()
+        return {'status': 'ok', 'criteria': criteria.version, 'methods': list(criteria.methods)}
+
+    def stats(self):
+        # Service-side latency (request read to response written) over the last LATENCY_WINDOW requests
+        routes = {}
+        for route, batcher in self.batchers.items():
+            latencies = np.asarray(self.latencies[route]) * 1e3
+            routes[route] = dict(batcher.stats(), requests=self.requests[route], errors=self.errors[route],
+                                 latency_ms=latency_summary(latencies))
+        return {'uptime': time.time() - self.started, 'criteria': default_criteria().version, 'routes': routes}
+
+
+def latency_summary(milliseconds):
+    if not len(milliseconds):
+        return {'p50': None, 'p99': None, 'mean': None, 'max': None}
+    p50, p99 = np.percentile(milliseconds, [50, 99])
+    return {'p50': float(p50), 'p99': float(p99), 'mean': float(np.mean(milliseconds)),
+            'max': float(np.max(milliseconds))}
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+    # Run the service until interrupted, returns its final stats
+    service = ScoringService(max_batch, max_wait)
+
+    async def main():
+        server = await service.start(host, port)
+        print(f"Serving lift recommendations on http://{host}:{port}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    return service.stats()
+
+
+def sample_wells(n_wells, seed=0):
+    # Synthetic wells as JSON objects, e.g. for load tests
+    columns = synthetic_wells(n_wells, seed)
+    return [{name: columns[name][i].item() for name in PARAMETER_NAMES} for i in range(n_wells)]
+
+
+async def http_request(reader, writer, method, path, body=b''):
+    # One request on an open keep-alive connection, returns (status, decoded JSON body)
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def load_test(host=DEFAULT_HOST, port=DEFAULT_PORT, n_requests=20000, concurrency=64, route='/predict',
+                    wells_per_request=1):
+    # Closed-loop load: concurrency keep-alive connections each sending its next request as soon as the
+    # previous one is answered, until n_requests are done. Returns the throughput, the client-side
+    # latency percentiles and the service's own stats
+    wells = sample_wells(256)
+    bodies = []
+    for i in range(0, len(wells), wells_per_request):
+        chunk = [wells[(i + k) % len(wells)] for k in range(wells_per_request)]
+        bodies.append(json.dumps({'wells': chunk} if wells_per_request > 1 else chunk[0]).encode('utf-8'))
+    requests = iter(range(n_requests))
+    latencies = []
+    errors = collections.Counter()
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for i in requests:
+                start = time.perf_counter()
+                status, _ = await http_request(reader, writer, 'POST', route, bodies[i % len(bodies)])
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors[status] += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, server = await http_request(reader, writer, 'GET', '/stats')
+    writer.close()
+    return {'requests': n_requests, 'concurrency': concurrency, 'route': route,
+            'wells_per_request': wells_per_request, 'seconds': seconds, 'requests_per_second': n_requests / seconds,
+            'errors': dict(errors), 'latency_ms': latency_summary(np.asarray(latencies) * 1e3),
+            'server': server['routes'][route]}
+
+
+def run_load_test(host=DEFAULT_HOST, port=DEFAULT_PORT, n_requests=20000, concurrency=64, route='/predict',
+                  wells_per_request=1, spawn=False):
+    # load_test from synchronous code. With spawn, a service is started on host:port in a separate process
+    # for the run and stopped afterwards, so client and service do not share an interpreter
+    process = None
+    if spawn:
+        process = subprocess.Popen([sys.executable, '-m', 'lift_batch', 'serve', '--host', host, '--port', str(port)],
+                                   cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL)
+        wait_for_port(host, port, process)
+    try:
+        return asyncio.run(load_test(host, port, n_requests, concurrency, route, wells_per_request))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+def wait_for_port(host, port, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The service exited with code {process.returncode}")
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"The service did not start on {host}:{port}")
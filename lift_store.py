@@ -0,0 +1,251 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+from lift_criteria import PARAMETERS, PARAMETER_KINDS, PARAMETER_NAMES
+from lift_engine import BLOCK_SIZE, default_criteria
+
+# Well stores are single files: MAGIC, then row groups of contiguous columns, then a JSON footer, its
+# length (8 bytes) and MAGIC again. Every column starts on an ALIGNMENT boundary so it maps as an array
+STORE_EXTENSION = '.wells'
+MAGIC = b'LIFTWEL1'
+ALIGNMENT = 64
+FORMAT_VERSION = 1
+
+# Numeric parameters are stored as float64 like the engine compares them, categorical ones as the
+# smallest of these code types that indexes the vocabulary
+NUMERIC_DTYPE = '<f8'
+CODE_DTYPES = ('|u1', '<u2', '<u4')
+
+CATEGORICAL_NAMES = tuple(name for name, kind in PARAMETERS if kind == 'in')
+
+
+def is_store(path):
+    return path.lower().endswith(STORE_EXTENSION)
+
+
+class WellStoreWriter:
+    # Appends chunks of prepared well columns (see lift_batch.prepare_columns) as row groups. Categorical
+    # values are dictionary encoded against a vocabulary per parameter that grows as new values appear.
+    # The file is written next to path and renamed over it by close(), so a store is never half written
+    def __init__(self, path):
+        self.path = path
+        self.temporary = f"{path}.{os.getpid()}.tmp"
+        self.handle = open(self.temporary, 'wb')
+        self.handle.write(MAGIC)
+        self.vocabularies = {name: {} for name in CATEGORICAL_NAMES}
+        self.row_groups = []
+        self.n_wells = 0
+
+    def write(self, columns, well_ids=None):
+        n_rows = len(columns[PARAMETER_NAMES[0]])
+        if not n_rows:
+            return
+        group = {'rows': n_rows, 'columns': {}, 'well_ids': None}
+        for name in PARAMETER_NAMES:
+            if PARAMETER_KINDS[name] == 'in':
+                values = self._encode(name, columns[name])
+            else:
+                values = np.asarray(columns[name], dtype=NUMERIC_DTYPE)
+            group['columns'][name] = self._write_array(values)
+        if well_ids is not None:
+            # Fixed-width UTF-8 per row group, decoded in one vectorized step when read
+            ids = np.char.encode(np.asarray(well_ids, dtype=str), 'utf-8')
+            group['well_ids'] = self._write_array(ids)
+        self.row_groups.append(group)
+        self.n_wells += n_rows
+
+    def _encode(self, name, values):
+        vocabulary = self.vocabularies[name]
+        distinct, inverse = np.unique(np.asarray(values).astype(str), return_inverse=True)
+        lookup = np.array([vocabulary.setdefault(value, len(vocabulary)) for value in distinct.tolist()])
+        dtype = next(dtype for dtype in CODE_DTYPES if len(vocabulary) <= np.iinfo(dtype).max + 1)
+        return lookup[inverse.reshape(-1)].astype(dtype)
+
+    def _write_array(self, values):
+        padding = -self.handle.tell() % ALIGNMENT
+        self.handle.write(b'\0' * padding)
+        offset = self.handle.tell()
+        self.handle.write(np.ascontiguousarray(values).tobytes())
+        return [offset, values.dtype.str, values.shape[0]]
+
+    def close(self):
+        footer = json.dumps({'format': FORMAT_VERSION, 'n_wells': self.n_wells,
+                             'vocabularies': {name: list(vocabulary)
+                                              for name, vocabulary in self.vocabularies.items()},
+                             'row_groups': self.row_groups}).encode('utf-8')
+        self.handle.write(footer)
+        self.handle.write(struct.pack('<Q', len(footer)) + MAGIC)
+        self.handle.close()
+        os.replace(self.temporary, self.path)
+
+    def abort(self):
+        self.handle.close()
+        os.remove(self.temporary)
+
+
+class WellStore:
+    # Read-only, memory-mapped well store. Opening reads the footer only; columns are array views on the
+    # mapping, so pages are read when a column is used and the OS can drop them again. Indexing by
+    # parameter name gives the whole column (categorical values decoded), like a {name: column} mapping
+    def __init__(self, path):
+        self.path = path
+        self.buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        size = len(self.buffer)
+        if size < 2 * len(MAGIC) + 8 or bytes(self.buffer[:len(MAGIC)]) != MAGIC \
+                or bytes(self.buffer[-len(MAGIC):]) != MAGIC:
+            raise ValueError(f"Not a well store: {path}")
+        footer_length = struct.unpack('<Q', bytes(self.buffer[-len(MAGIC) - 8:-len(MAGIC)]))[0]
+        footer_start = size - len(MAGIC) - 8 - footer_length
+        try:
+            if footer_start < len(MAGIC):
+                raise ValueError("footer length out of range")
+            footer = json.loads(bytes(self.buffer[footer_start:footer_start + footer_length]))
+            newer = footer['format'] > FORMAT_VERSION
+            if not newer:
+                self.n_wells = footer['n_wells']
+                self.vocabularies = {name: tuple(values) for name, values in footer['vocabularies'].items()}
+                self.row_groups = footer['row_groups']
+                self._check_layout(footer_start)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Damaged well store {path}: {e}") from e
+        if newer:
+            raise ValueError(f"Well store {path} was written by a newer version (format {footer['format']})")
+        self.starts = np.cumsum([0] + [group['rows'] for group in self.row_groups])
+        self._columns = {}
+
+    def _check_layout(self, footer_start):
+        # Every array of the footer must lie between the header and the footer with one value per row, so a
+        # file cut or spliced after writing is rejected here instead of read as other data
+        if sum(group['rows'] for group in self.row_groups) != self.n_wells:
+            raise ValueError("row groups do not add up to the well count")
+        for group in self.row_groups:
+            if set(group['columns']) != set(PARAMETER_NAMES):
+                raise ValueError("missing columns")
+            specs = list(group['columns'].values()) + ([group['well_ids']] if group['well_ids'] else [])
+            for offset, dtype, length in specs:
+                if length != group['rows'] or offset < len(MAGIC) or \
+                        offset + length * np.dtype(dtype).itemsize > footer_start:
+                    raise ValueError("array outside the data")
+
+    def __len__(self):
+        return self.n_wells
+
+    def keys(self):
+        return PARAMETER_NAMES
+
+    def __contains__(self, name):
+        return name in PARAMETER_NAMES or (name == 'well_id' and self.has_well_ids())
+
+    def __getitem__(self, name):
+        # Whole column, kept once built: a view on the mapping when the store has one row group
+        if name not in self._columns:
+            if name == 'well_id':
+                column = self.well_ids()
+            elif name not in PARAMETER_KINDS:
+                raise KeyError(name)
+            elif PARAMETER_KINDS[name] == 'in':
+                column = self.decode(name, self.codes(name))
+            else:
+                column = self._concatenate(name)
+            self._columns[name] = column
+        return self._columns[name]
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def codes(self, name):
+        # Dictionary codes of a categorical parameter, indices into self.vocabularies[name]
+        return self._concatenate(name)
+
+    def decode(self, name, codes):
+        return np.asarray(self.vocabularies[name], dtype=str)[codes]
+
+    def has_well_ids(self):
+        return bool(self.row_groups) and self.row_groups[0]['well_ids'] is not None
+
+    def well_ids(self):
+        # The inventory's well_id column, or None when it had none
+        if not self.has_well_ids():
+            return None
+        return np.concatenate([np.char.decode(self._array(group['well_ids']), 'utf-8')
+                               for group in self.row_groups])
+
+    def group(self, k):
+        # {parameter: array view} of row group k, categorical parameters as codes
+        return {name: self._array(spec) for name, spec in self.row_groups[k]['columns'].items()}
+
+    def chunks(self, chunk_size=None):
+        # Yield the wells as {column: values} with decoded categorical values, like lift_batch.read_chunks,
+        # at most chunk_size rows (default: a row group) at a time
+        for k, group in enumerate(self.row_groups):
+            columns = self.group(k)
+            for name in CATEGORICAL_NAMES:
+                columns[name] = self.decode(name, columns[name])
+            if group['well_ids'] is not None:
+                columns['well_id'] = np.char.decode(self._array(group['well_ids']), 'utf-8')
+            step = chunk_size or group['rows']
+            for start in range(0, group['rows'], step):
+                yield {name: values[start:start + step] for name, values in columns.items()}
+
+    def well(self, i):
+        # One well's values in the argument order of predict_best_lift_method
+        k = int(np.searchsorted(self.starts, i, side='right')) - 1
+        if not 0 <= i < self.n_wells:
+            raise IndexError(i)
+        columns = self.group(k)
+        row = i - self.starts[k]
+        return tuple(self.vocabularies[name][columns[name][row]] if PARAMETER_KINDS[name] == 'in'
+                     else columns[name][row].item() for name in PARAMETER_NAMES)
+
+    def category_mask(self, criteria):
+        # (vocabulary x methods) acceptance of every categorical value in the store and the offset of each
+        # parameter's vocabulary in it, the layout CompiledCriteria.encode() gives its matrix
+        masks, offsets = [], {}
+        offset = 0
+        for name in CATEGORICAL_NAMES:
+            masks.append(criteria.category_mask(name, list(self.vocabularies[name])))
+            offsets[name] = offset
+            offset += len(self.vocabularies[name])
+        return np.concatenate(masks), offsets
+
+    def _array(self, spec):
+        offset, dtype, length = spec
+        dtype = np.dtype(dtype)
+        return self.buffer[offset:offset + length * dtype.itemsize].view(dtype)
+
+    def _concatenate(self, name):
+        parts = [self._array(group['columns'][name]) for group in self.row_groups]
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts) if parts else np.empty(0)
+
+
+def open_store(path):
+    return WellStore(path)
+
+
+def score_store(store, criteria=None, progress=None):
+    # (wells x methods) scores read straight from the mapped columns: each row group is laid into one
+    # block matrix (categorical codes shifted into the shared category mask) and scored, so memory use is
+    # one block plus the scores whatever the store's size. progress(n_wells, block_scores) follows each block
+    criteria = criteria or default_criteria()
+    category_mask, offsets = store.category_mask(criteria)
+    scores = np.empty((len(store), len(criteria.methods)), dtype=np.int16)
+    for k, start in enumerate(store.starts[:-1]):
+        group = store.group(k)
+        n_rows = store.row_groups[k]['rows']
+        for block_start in range(0, n_rows, BLOCK_SIZE):
+            block_stop = min(block_start + BLOCK_SIZE, n_rows)
+            matrix = np.empty((block_stop - block_start, len(PARAMETERS)))
+            for i, name in enumerate(PARAMETER_NAMES):
+                matrix[:, i] = group[name][block_start:block_stop]
+                if name in offsets:
+                    matrix[:, i] += offsets[name]
+            block = slice(start + block_start, start + block_stop)
+            scores[block] = criteria.score(matrix, category_mask)
+            if progress is not None:
+                progress(block.stop, scores[block])
+    return scores
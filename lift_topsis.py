@@ -0,0 +1,60 @@
+import numpy as np
+
+from lift_engine import BLOCK_SIZE, default_criteria
+
+
+def decision_matrices(wells, criteria=None):
+    # (N wells x methods x criteria) decision array: 1 where the method's criterion accepts the well's value
+    criteria = criteria or default_criteria()
+    matrix, category_mask = criteria.encode(wells)
+    return criteria.matches(matrix, category_mask).swapaxes(1, 2).astype(float)
+
+
+def topsis(decision, weights=None):
+    # TOPSIS over the last two axes (methods x criteria), so a 2-D matrix scores one well and a
+    # 3-D array scores a whole field in the same operation. All criteria are benefit criteria.
+    # Returns the distances to the positive and negative ideal solutions and the closeness score
+    decision = np.asarray(decision, dtype=float)
+    n_criteria = decision.shape[-1]
+    weights = np.full(n_criteria, 1 / n_criteria) if weights is None else np.asarray(weights, dtype=float)
+
+    # Vector normalization per criterion, a criterion no method meets stays at zero
+    norms = np.sqrt((decision ** 2).sum(axis=-2, keepdims=True))
+    weighted = np.divide(decision, norms, out=np.zeros_like(decision), where=norms > 0) * weights
+
+    positive_ideal = weighted.max(axis=-2, keepdims=True)
+    negative_ideal = weighted.min(axis=-2, keepdims=True)
+    d_positive = np.sqrt(((weighted - positive_ideal) ** 2).sum(axis=-1))
+    d_negative = np.sqrt(((weighted - negative_ideal) ** 2).sum(axis=-1))
+
+    # When every method is identical both distances are zero, all methods are then equally close
+    total = d_positive + d_negative
+    closeness = np.divide(d_negative, total, out=np.full_like(total, 0.5), where=total > 0)
+    return d_positive, d_negative, closeness
+
+
+def topsis_wells(wells, criteria=None, weights=None):
+    # Batch TOPSIS for a field, each (N x methods) result is computed block by block to bound memory.
+    # weights default to the criteria table's (equal unless calibrated, see lift_calibration)
+    criteria = criteria or default_criteria()
+    weights = criteria.table.weights if weights is None else weights
+    matrix, category_mask = criteria.encode(wells)
+    results = np.empty((3, len(matrix), len(criteria.methods)))
+
+    for start in range(0, len(matrix), BLOCK_SIZE):
+        block = matrix[start:start + BLOCK_SIZE]
+        decision = criteria.matches(block, category_mask).swapaxes(1, 2).astype(float)
+        results[:, start:start + BLOCK_SIZE] = topsis(decision, weights)
+
+    d_positive, d_negative, closeness = results
+    return d_positive, d_negative, closeness
+
+
+def topsis_well(values, criteria=None, weights=None):
+    # TOPSIS for one well, values in the argument order of predict_best_lift_method.
+    # Returns {method: (distance to PIS, distance to NIS, closeness)}
+    criteria = criteria or default_criteria()
+    d_positive, d_negative, closeness = topsis_wells([values], criteria, weights)
+    return {method: (float(d_positive[0, j]), float(d_negative[0, j]), float(closeness[0, j]))
+            for j, method in enumerate(criteria.methods)}
+
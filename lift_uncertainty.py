@@ -0,0 +1,155 @@
+import numpy as np
+
+from lift_criteria import PARAMETERS, PARAMETER_KINDS, PARAMETER_NAMES
+from lift_engine import default_criteria
+
+DEFAULT_SAMPLES = 100000
+DEFAULT_CHUNK_SIZE = 50000
+DEFAULT_PERCENTILES = (5, 50, 95)
+
+# Distribution kinds and their parameters:
+#   ('fixed', value)
+#   ('uniform', low, high)
+#   ('triangular', low, mode, high)
+#   ('normal', mean, std[, low, high])     optional low/high clip the samples to physical limits
+#   ('lognormal', median, sigma)           sigma of the underlying normal, e.g. sand ppm or viscosity
+#   ('choice', values[, probabilities])    categorical inputs
+DISTRIBUTIONS = ('fixed', 'uniform', 'triangular', 'normal', 'lognormal', 'choice')
+
+
+def sample(rng, distribution, size):
+    kind, args = distribution[0], distribution[1:]
+    if kind == 'fixed':
+        return np.full(size, args[0], dtype=float)
+    if kind == 'uniform':
+        return rng.uniform(args[0], args[1], size)
+    if kind == 'triangular':
+        return rng.triangular(args[0], args[1], args[2], size)
+    if kind == 'normal':
+        values = rng.normal(args[0], args[1], size)
+        if len(args) > 2:
+            values = np.clip(values, args[2], args[3] if len(args) > 3 else None)
+        return values
+    if kind == 'lognormal':
+        return rng.lognormal(np.log(args[0]), args[1], size)
+    if kind == 'choice':
+        probabilities = args[1] if len(args) > 1 else None
+        return rng.choice(np.asarray(args[0]), size, p=probabilities)
+    raise ValueError(f"Unknown distribution {kind!r}, expected one of {', '.join(DISTRIBUTIONS)}")
+
+
+class MonteCarloSummary:
+    # Running result of an uncertainty run. Scores are small integers (0..number of criteria), so a
+    # per-method histogram gives exact percentiles in constant memory however many samples are drawn
+    def __init__(self, methods):
+        self.methods = tuple(methods)
+        self.n_samples = 0
+        self.first_counts = np.zeros(len(self.methods), dtype=np.int64)
+        self.score_counts = np.zeros((len(self.methods), len(PARAMETERS) + 1), dtype=np.int64)
+
+    def add(self, scores):
+        n_methods = len(self.methods)
+        self.n_samples += len(scores)
+        self.first_counts += np.bincount(scores.argmax(axis=1), minlength=n_methods)
+        flat = (np.arange(n_methods) * self.score_counts.shape[1] + scores).ravel()
+        self.score_counts += np.bincount(flat, minlength=self.score_counts.size).reshape(self.score_counts.shape)
+
+    def probability_first(self):
+        # Share of the samples in which each method ranks first (ties go to the first method, as in
+        # predict_best_lift_method)
+        return dict(zip(self.methods, (self.first_counts / max(self.n_samples, 1)).tolist()))
+
+    def mean_scores(self):
+        totals = self.score_counts @ np.arange(self.score_counts.shape[1])
+        return dict(zip(self.methods, (totals / max(self.n_samples, 1)).tolist()))
+
+    def percentiles(self, percentiles=DEFAULT_PERCENTILES):
+        # {method: {percentile: score}}, the lowest score whose cumulative share reaches the percentile
+        cumulative = np.cumsum(self.score_counts, axis=1)
+        result = {}
+        for j, method in enumerate(self.methods):
+            result[method] = {p: int(np.searchsorted(cumulative[j], max(np.ceil(p / 100 * self.n_samples), 1)))
+                              for p in percentiles}
+        return result
+
+
+def iter_monte_carlo(base_well, distributions, n_samples=DEFAULT_SAMPLES, seed=0,
+                     chunk_size=DEFAULT_CHUNK_SIZE, criteria=None):
+    # Draw n_samples wells around base_well, score them chunk by chunk and yield the running summary
+    # after each chunk. Every uncertain input has its own random stream spawned from the seed, so a
+    # seed reproduces the run exactly
+    if n_samples <= 0 or chunk_size <= 0:
+        raise ValueError(f"The number of samples and the chunk size must be positive, got {n_samples} and "
+                         f"{chunk_size}")
+    criteria = criteria or default_criteria()
+    unknown = [name for name in distributions if name not in PARAMETER_NAMES]
+    if unknown:
+        raise ValueError("Unknown parameter(s): " + ", ".join(unknown))
+    missing = [name for name in PARAMETER_NAMES if name not in distributions and name not in base_well]
+    if missing:
+        raise ValueError("No value or distribution for: " + ", ".join(missing))
+
+    streams = dict(zip(PARAMETER_NAMES, (np.random.default_rng(child)
+                                         for child in np.random.SeedSequence(seed).spawn(len(PARAMETER_NAMES)))))
+
+    # Categorical inputs are drawn directly as codes into a category mask built once for the run,
+    # so the chunks go straight into the (samples x parameters) matrix without string handling
+    categories = {}
+    masks = []
+    offset = 0
+    for name, kind in PARAMETERS:
+        if kind != 'in':
+            continue
+        distribution = distributions.get(name, ('fixed', base_well.get(name)))
+        if distribution[0] == 'fixed':
+            choices, probabilities = [distribution[1]], None
+        elif distribution[0] == 'choice':
+            choices, probabilities = list(distribution[1]), distribution[2] if len(distribution) > 2 else None
+        else:
+            raise ValueError(f"{name} is categorical, give it a fixed value or a choice distribution")
+        categories[name] = (offset, len(choices), probabilities)
+        masks.append(criteria.category_mask(name, [str(choice) for choice in choices]))
+        offset += len(choices)
+    category_mask = np.concatenate(masks)
+
+    summary = MonteCarloSummary(criteria.methods)
+
+    for start in range(0, n_samples, chunk_size):
+        size = min(chunk_size, n_samples - start)
+        matrix = np.empty((size, len(PARAMETERS)))
+        for i, name in enumerate(PARAMETER_NAMES):
+            if name in categories:
+                offset, n_choices, probabilities = categories[name]
+                matrix[:, i] = offset
+                if n_choices > 1:
+                    matrix[:, i] += streams[name].choice(n_choices, size, p=probabilities)
+            else:
+                matrix[:, i] = sample(streams[name], distributions.get(name, ('fixed', base_well.get(name))), size)
+        summary.add(criteria.score(matrix, category_mask))
+        yield summary
+
+
+def run_monte_carlo(base_well, distributions, n_samples=DEFAULT_SAMPLES, seed=0,
+                    chunk_size=DEFAULT_CHUNK_SIZE, criteria=None):
+    summary = None
+    for summary in iter_monte_carlo(base_well, distributions, n_samples, seed, chunk_size, criteria):
+        pass
+    return summary
+
+
+def parse_distribution(text):
+    # Parse a command line spec such as "gor=triangular:800,1200,1600", "sand_production=lognormal:5,0.8"
+    # or "recovery=choice:secondary,primary@0.7,0.3"
+    name, _, spec = text.partition('=')
+    kind, _, args = spec.partition(':')
+    if not name or kind not in DISTRIBUTIONS:
+        raise ValueError(f"Invalid distribution {text!r}, expected name=kind:arguments")
+    if kind == 'choice':
+        values, _, weights = args.partition('@')
+        distribution = ('choice', values.split(','))
+        if weights:
+            distribution += ([float(weight) for weight in weights.split(',')],)
+        return name, distribution
+    if kind == 'fixed' and PARAMETER_KINDS.get(name) == 'in':
+        return name, ('fixed', args)
+    return name, (kind,) + tuple(float(arg) for arg in args.split(','))
@@ -0,0 +1,272 @@
+import csv
+
+import numpy as np
+
+from lift_criteria import PARAMETERS, PARAMETER_NAMES
+
+# Physically possible values of every numeric parameter in the units of the criteria table; a well
+# outside them is rejected as a data error rather than scored
+LIMITS = {
+    'water_cut': (0, 100),
+    'fluid_viscosity': (0, np.inf),
+    'sand_production': (0, np.inf),
+    'gor': (0, np.inf),
+    'production_rate': (0, np.inf),
+    'well_depth': (0, np.inf),
+    'casing_size': (0, np.inf),
+    'dogleg_severity': (0, np.inf),
+    'temperature': (-459.67, np.inf),
+    'flowing_pressure': (0, np.inf),
+    'reservoir_access': (0, 1),
+}
+
+# Units of the criteria table, and the other units a value may be given in as (scale, offset) to them.
+# A unit follows the number in a cell ("1524 m") or applies to a whole column (units={'well_depth': 'm'})
+UNITS = {
+    'water_cut': {'%': (1, 0), 'fraction': (100, 0)},
+    'fluid_viscosity': {'cp': (1, 0), 'mpa.s': (1, 0), 'pa.s': (1000, 0)},
+    'gor': {'scf/bbl': (1, 0), 'scf/stb': (1, 0), 'm3/m3': (5.6146, 0), 'sm3/sm3': (5.6146, 0)},
+    'production_rate': {'bbl/d': (1, 0), 'bpd': (1, 0), 'stb/d': (1, 0), 'm3/d': (6.2898, 0)},
+    'well_depth': {'ft': (1, 0), 'm': (3.28084, 0)},
+    'casing_size': {'in': (1, 0), 'mm': (1 / 25.4, 0)},
+    'dogleg_severity': {'deg/100ft': (1, 0), 'deg/30m': (100 / 98.4252, 0)},
+    'temperature': {'f': (1, 0), 'degf': (1, 0), 'c': (1.8, 32), 'degc': (1.8, 32), 'k': (1.8, -459.67)},
+    'flowing_pressure': {'psi': (1, 0), 'psia': (1, 0), 'bar': (14.5038, 0), 'kpa': (0.145038, 0),
+                         'mpa': (145.038, 0)},
+}
+
+NUMERIC_NAMES = tuple(name for name, kind in PARAMETERS if kind != 'in')
+
+# Columns of an error report, one row per rejected value
+ERROR_FIELDS = ('row', 'well_id', 'parameter', 'value', 'error')
+
+
+def parse_value(name, text, unit=None):
+    # One number in the units of the criteria table, None for blank or unreadable text
+    numbers, problems = parse_column(name, [text], unit)
+    return None if problems[0] or numbers[0] != numbers[0] else float(numbers[0])
+
+
+def parse_column(name, values, unit=None):
+    # Whole column to float in the units of the criteria table. Returns the numbers (NaN for blanks and
+    # unreadable values) and the problem of each value ('' when fine). Plain numbers convert in one step;
+    # otherwise the stripped text converts in one step, and only the cells that do not are looked at
+    # again, together, for a unit of UNITS[name] after the number, which takes precedence over the column's
+    scale, offset = _unit(name, unit) if unit else (1, 0)
+    problems = np.zeros(len(values), dtype=object)
+    problems[:] = ''
+    try:
+        numbers = _to_float(values)
+        return numbers * scale + offset if unit else numbers, problems
+    except (TypeError, ValueError):
+        pass
+
+    values = np.asarray(values)
+    text = np.char.strip(values.astype(str))
+    if values.dtype == object:
+        text[np.equal(values, None)] = ''
+    numbers, converted = _floats(np.where((text == '') | (text == 'None'), 'nan', text))
+    if unit:
+        numbers = numbers * scale + offset
+    failed = np.flatnonzero(~converted)
+    if not len(failed):
+        return numbers, problems
+
+    # Each cell is read with the longest unit it ends with, and is an error if the rest is not a number
+    lowered = np.char.lower(text[failed])
+    matched = np.zeros(len(failed), dtype=bool)
+    bad = np.ones(len(failed), dtype=bool)
+    for cell_unit in sorted(UNITS.get(name, ()), key=len, reverse=True):
+        suffixed = ~matched & np.char.endswith(lowered, cell_unit)
+        if not suffixed.any():
+            continue
+        matched |= suffixed
+        cut, ok = _floats(np.char.rpartition(lowered[suffixed], cell_unit)[:, 0])
+        unit_scale, unit_offset = UNITS[name][cell_unit]
+        numbers[failed[suffixed]] = cut * unit_scale + unit_offset
+        bad[np.flatnonzero(suffixed)[ok]] = False
+    problems[failed[bad]] = 'not a number' if name not in UNITS else 'not a number in ' + ', '.join(UNITS[name])
+    return numbers, problems
+
+
+def _to_float(values):
+    # np.asarray(values, dtype=float), with a numpy string array converted by way of Python strings, which
+    # numpy parses several times faster than its own
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'SU':
+        values = values.tolist()
+    return np.asarray(values, dtype=float)
+
+
+def _floats(text):
+    # text.astype(float), with NaN and False in the returned mask for the cells that do not convert. A
+    # failing block is halved until the bad cells are found, so a few of them cost a few more conversions
+    numbers = np.full(len(text), np.nan)
+    converted = np.ones(len(text), dtype=bool)
+    blocks = [(0, len(text))]
+    while blocks:
+        start, stop = blocks.pop()
+        try:
+            numbers[start:stop] = _to_float(text[start:stop])
+        except ValueError:
+            if stop - start > 16:
+                middle = (start + stop) // 2
+                blocks += [(start, middle), (middle, stop)]
+                continue
+            for i, cell in enumerate(text[start:stop].tolist(), start):
+                try:
+                    numbers[i] = float(cell)
+                except ValueError:
+                    converted[i] = False
+    return numbers, converted
+
+
+def _unit(name, unit):
+    units = UNITS.get(name, {})
+    if unit.lower() not in units:
+        raise ValueError(f"Unknown unit {unit!r} for {name}" + (", expected one of: " + ", ".join(units)
+                                                                 if units else ", it has none"))
+    return units[unit.lower()]
+
+
+def parse_unit(text):
+    # "NAME=UNIT" from the command line, e.g. well_depth=m
+    name, _, unit = text.partition('=')
+    name, unit = name.strip(), unit.strip()
+    if name not in NUMERIC_NAMES:
+        raise ValueError(f"Unknown numeric parameter {name!r} in {text!r}")
+    _unit(name, unit)
+    return name, unit
+
+
+def check_value(name, number):
+    # The problem with one parsed number of a numeric parameter, '' when it is possible
+    low, high = LIMITS[name]
+    if number < low:
+        return f"below {low:g}"
+    if number > high:
+        return f"above {high:g}"
+    return ''
+
+
+def validate_columns(columns, units=None, required=False):
+    # Parse and check a chunk of well columns ({name: values}) at once. units ({name: unit}) gives the
+    # unit of a whole column; with required, blank values are errors too (otherwise the well just fails
+    # those criteria). Returns {'columns': the columns the engine expects (numbers as float arrays),
+    # 'valid': per-row mask, 'errors': {field: array} per ERROR_FIELDS, rows counted from 0}. All rows
+    # are checked in one pass per parameter, only the rejected values are looked at one by one
+    missing = [name for name in PARAMETER_NAMES if name not in columns]
+    if missing:
+        raise ValueError("Missing column(s): " + ", ".join(missing))
+    units = units or {}
+    unknown = [name for name in units if name not in NUMERIC_NAMES]
+    if unknown:
+        raise ValueError("Units given for unknown or non-numeric parameter(s): " + ", ".join(unknown))
+
+    prepared = {}
+    found = []
+    n_rows = len(columns[PARAMETER_NAMES[0]])
+    for name, kind in PARAMETERS:
+        values = columns[name]
+        if kind == 'in':
+            prepared[name] = category_text(values)
+            if required:
+                found.append((name, prepared[name] == '', 'missing'))
+            continue
+        numbers, problems = parse_column(name, values, units.get(name))
+        prepared[name] = numbers
+        found.append((name, problems != '', problems))
+        if required:
+            found.append((name, np.isnan(numbers) & (problems == ''), 'missing'))
+        low, high = LIMITS[name]
+        found.append((name, numbers < low, f"below {low:g}"))
+        found.append((name, numbers > high, f"above {high:g}"))
+
+    rows, names, messages = [], [], []
+    for name, mask, message in found:
+        flagged = np.flatnonzero(mask)
+        if len(flagged):
+            rows.append(flagged)
+            names.append(np.full(len(flagged), name, dtype=object))
+            messages.append(message[flagged] if isinstance(message, np.ndarray) else
+                            np.full(len(flagged), message, dtype=object))
+    if not rows:
+        return {'columns': prepared, 'valid': np.ones(n_rows, dtype=bool), 'errors': empty_errors()}
+
+    rows, names, messages = np.concatenate(rows), np.concatenate(names), np.concatenate(messages)
+    order = np.argsort(rows, kind='stable')
+    rows, names, messages = rows[order], names[order], messages[order]
+    values = np.array([columns[name][row] for name, row in zip(names.tolist(), rows.tolist())], dtype=object)
+    well_ids = columns.get('well_id')
+    well_ids = np.array(['' if well_ids is None else well_ids[row] for row in rows.tolist()], dtype=object)
+    valid = np.ones(n_rows, dtype=bool)
+    valid[rows] = False
+    return {'columns': prepared, 'valid': valid,
+            'errors': {'row': rows, 'well_id': well_ids, 'parameter': names, 'value': values, 'error': messages}}
+
+
+def category_text(values):
+    # A categorical column as a string array, None as blank. Not stripped: ' primary' is not a choice
+    values = np.asarray(values)
+    text = values.astype(str)
+    if values.dtype == object:
+        text[np.equal(values, None)] = ''
+    return text
+
+
+def empty_errors():
+    errors = {field: np.empty(0, dtype=object) for field in ERROR_FIELDS}
+    errors['row'] = np.empty(0, dtype=np.int64)
+    return errors
+
+
+def select_rows(columns, rows):
+    # The given rows of every column, lists stay lists
+    if isinstance(rows, np.ndarray) and rows.dtype == bool:
+        rows = np.flatnonzero(rows)
+    return {name: values[rows] if isinstance(values, np.ndarray) else [values[i] for i in rows.tolist()]
+            for name, values in columns.items()}
+
+
+def format_error(row, well_id, name, value, error):
+    # One line of an error report for people, row counted from 1
+    well = f" ({well_id})" if well_id != '' else ''
+    return f"row {row}{well}: {name} {str(value)!r} {error}"
+
+
+class ErrorReport:
+    # The errors of a whole run, added chunk by chunk: counts them, keeps the first few as text for a
+    # summary and writes all of them to a CSV file (ERROR_FIELDS, rows counted from 1) when given a path
+    def __init__(self, path=None, keep=10):
+        self.keep = keep
+        self.lines = []
+        self.n_errors = 0
+        self.n_rows = 0
+        self.handle = open(path, 'w', newline='') if path else None
+        self.writer = csv.writer(self.handle) if path else None
+        if self.writer is not None:
+            self.writer.writerow(ERROR_FIELDS)
+
+    def add(self, errors, offset=0):
+        # errors of validate_columns for a chunk starting offset rows into the input
+        if not len(errors['row']):
+            return
+        rows = errors['row'] + 1 + offset
+        records = list(zip(rows.tolist(), *(errors[field].tolist() for field in ERROR_FIELDS[1:])))
+        self.n_errors += len(records)
+        self.n_rows += len(np.unique(rows))
+        self.lines.extend(format_error(*record) for record in records[:self.keep - len(self.lines)])
+        if self.writer is not None:
+            self.writer.writerows(records)
+
+    def summary(self):
+        # Lines describing the rejected rows, empty when there were none
+        if not self.n_errors:
+            return []
+        lines = [f"{self.n_rows} row(s) rejected with {self.n_errors} error(s)"] + self.lines
+        if self.n_errors > len(self.lines):
+            lines.append(f"... and {self.n_errors - len(self.lines)} more")
+        return lines
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
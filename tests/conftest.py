@@ -0,0 +1,50 @@
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lift_cache import ResultCache, set_default_cache  # noqa: E402
+from lift_criteria import PARAMETER_NAMES, use_criteria_file  # noqa: E402
+from lift_engine import synthetic_wells  # noqa: E402
+
+# One well with every criterion, in the argument order of predict_best_lift_method
+WELL = {
+    'water_cut': 50, 'fluid_viscosity': 100, 'corrosion_handling': 'good', 'sand_production': 0, 'gor': 1000,
+    'contaminants': 'paraffin', 'treatment': 'acid', 'number_of_wells': 'single', 'production_rate': 300,
+    'well_depth': 6000, 'casing_size': 5.5, 'deviated_well': 'good', 'dogleg_severity': 15, 'temperature': 200,
+    'safety_barriers': 'No', 'flowing_pressure': 0, 'reservoir_access': 0, 'completion': 'single',
+    'stability': 'stable', 'recovery': 'secondary',
+}
+
+
+@pytest.fixture(autouse=True)
+def isolated_state():
+    # Every test starts from the built-in criteria and an empty in-memory result cache, whatever the
+    # LIFT_CRITERIA_FILE and LIFT_CACHE_FILE of the environment
+    use_criteria_file(None)
+    set_default_cache(ResultCache())
+    yield
+    set_default_cache(None)
+    use_criteria_file(None)
+
+
+@pytest.fixture
+def well():
+    return dict(WELL)
+
+
+def write_wells(path, n_wells, seed=0, edit=None):
+    # CSV inventory of synthetic wells with a well_id column. edit(i, row) may change row i ({name: value})
+    wells = synthetic_wells(n_wells, seed)
+    with open(path, 'w', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(('well_id',) + PARAMETER_NAMES)
+        for i in range(n_wells):
+            row = {name: wells[name][i] for name in PARAMETER_NAMES}
+            if edit is not None:
+                edit(i, row)
+            writer.writerow([f'W{i}'] + [row[name] for name in PARAMETER_NAMES])
+    return path
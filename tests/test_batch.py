@@ -0,0 +1,103 @@
+import csv
+
+import numpy as np
+import pytest
+
+from lift_batch import main, read_chunks, run_batch
+from lift_criteria import PARAMETER_KINDS, PARAMETER_NAMES
+from lift_engine import default_criteria, score_wells, synthetic_wells
+from lift_scoring import predict_best_lift_method
+
+from conftest import write_wells
+
+
+def read_rows(path):
+    with open(path, newline='') as handle:
+        return list(csv.DictReader(handle))
+
+
+def well_args(wells, i):
+    return [wells[name][i].item() if PARAMETER_KINDS[name] != 'in' else str(wells[name][i])
+            for name in PARAMETER_NAMES]
+
+
+def test_batch_scores_every_well_like_the_single_well_prediction(tmp_path):
+    path = write_wells(str(tmp_path / 'wells.csv'), 400, seed=2)
+    output = str(tmp_path / 'scored.csv')
+    assert run_batch(path, output, chunk_size=150) == 400
+
+    wells = synthetic_wells(400, 2)
+    scores, best = score_wells(wells)
+    methods = default_criteria().methods
+    rows = read_rows(output)
+    assert [row['well_id'] for row in rows] == [f'W{i}' for i in range(400)]
+    assert [[int(row[method]) for method in methods] for row in rows] == scores.tolist()
+    assert [row['best_method'] for row in rows] == [methods[j] for j in best]
+    for i in range(0, 400, 37):
+        assert rows[i]['best_method'] == predict_best_lift_method(*well_args(wells, i))
+
+
+def test_chunk_size_does_not_change_the_output(tmp_path):
+    path = write_wells(str(tmp_path / 'wells.csv'), 250, seed=6)
+    outputs = [tmp_path / f'{chunk_size}.csv' for chunk_size in (1, 7, 250, 10000)]
+    for chunk_size, output in zip((1, 7, 250, 10000), outputs):
+        run_batch(path, str(output), chunk_size=chunk_size)
+    assert len({output.read_bytes() for output in outputs}) == 1
+    assert [len(chunk['well_id']) for chunk in read_chunks(path, 100)] == [100, 100, 50]
+
+
+def test_parquet_in_and_out_match_csv(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = write_wells(str(tmp_path / 'wells.csv'), 300, seed=8)
+    pq.write_table(pa.table({name: values for name, values in next(read_chunks(path, 1000)).items()}),
+                   str(tmp_path / 'wells.parquet'))
+
+    run_batch(path, str(tmp_path / 'scored.csv'))
+    run_batch(str(tmp_path / 'wells.parquet'), str(tmp_path / 'scored.parquet'), chunk_size=64)
+    table = pq.read_table(str(tmp_path / 'scored.parquet')).to_pydict()
+    rows = read_rows(tmp_path / 'scored.csv')
+    assert table['well_id'] == [row['well_id'] for row in rows]
+    assert table['best_method'] == [row['best_method'] for row in rows]
+    assert table['ESP'] == [int(row['ESP']) for row in rows]
+
+
+def test_constraints_and_pareto_columns(tmp_path):
+    path = write_wells(str(tmp_path / 'wells.csv'), 300, seed=9)
+    output = str(tmp_path / 'scored.csv')
+    assert main(['batch', path, '-o', output, '--constraint', 'no_power', '--pareto']) == 0
+    rows = read_rows(output)
+    assert not {'ESP', 'PCP'} & {row['best_method'] for row in rows}
+    # a tie on the best score keeps only the cheapest of the tied methods on the front
+    for row in rows:
+        front = row['pareto_front'].split(';')
+        assert not {'ESP', 'PCP'} & set(front)
+        assert max(int(row[method]) for method in front) == int(row[row['best_method']])
+
+
+def test_cli_leaves_out_and_reports_invalid_rows(tmp_path, capsys):
+    def edit(i, row):
+        if i == 3:
+            row['water_cut'] = 150
+        if i == 4:
+            row['well_depth'] = '1524 m'
+
+    path = write_wells(str(tmp_path / 'wells.csv'), 10, edit=edit)
+    output, errors = str(tmp_path / 'scored.csv'), str(tmp_path / 'errors.csv')
+    assert main(['batch', path, '-o', output, '--errors', errors]) == 0
+    assert "Scored 9 wells" in capsys.readouterr().err
+    rows = read_rows(output)
+    assert 'W3' not in [row['well_id'] for row in rows] and rows[3]['well_depth'] == '1524 m'
+    assert read_rows(errors) == [{'row': '4', 'well_id': 'W3', 'parameter': 'water_cut', 'value': '150',
+                                  'error': 'above 100'}]
+
+    assert main(['batch', str(tmp_path / 'missing.csv')]) == 1
+    assert "Input file not found" in capsys.readouterr().err
+
+
+def test_stdout_output_is_csv(tmp_path, capsys):
+    path = write_wells(str(tmp_path / 'wells.csv'), 3)
+    assert main(['batch', path]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith('well_id,') and lines[0].endswith(',best_method') and len(lines) == 4
+    assert np.all([line.startswith(f'W{i},') for i, line in enumerate(lines[1:])])
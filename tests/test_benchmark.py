@@ -0,0 +1,69 @@
+import copy
+import json
+
+import pytest
+
+import lift_benchmark
+from lift_batch import main
+from lift_benchmark import compare_results, load_results, measure_batch, result
+
+
+@pytest.fixture(scope='module')
+def saved_run(tmp_path_factory):
+    # One quick headless run shared by the tests: a single small tier, one repeat, no GUI
+    path = str(tmp_path_factory.mktemp('benchmark') / 'run.json')
+    assert main(['benchmark', '--sizes', '200', '--repeat', '1', '--no-gui', '-o', path]) == 0
+    return path
+
+
+def test_saved_run_has_every_headless_benchmark(saved_run):
+    run = load_results(saved_run)
+    assert set(run['machine']) >= {'date', 'platform', 'python', 'numpy', 'criteria'}
+    assert run['checks'] == {}
+    names = set(run['results'])
+    assert {'single_well.predict_best_lift_method', 'single_well.predict_best_lift_method_cached',
+            'single_well.calculate_scores', 'batch.score_wells.200', 'batch.topsis_wells.200',
+            'batch.score_store.200', 'batch.peak_memory.200'} <= names
+    assert not any(name.startswith(('render.', 'startup.')) for name in names)
+    for measurement in run['results'].values():
+        assert measurement['value'] > 0 and measurement['better'] in ('lower', 'higher')
+
+
+def test_comparison_flags_slowdowns_either_way_round():
+    baseline = {'results': {'latency': result(10.0, 'us'), 'throughput': result(1000.0, 'wells/s', 'higher'),
+                            'gone': result(1.0, 'ms'), 'zero': result(0, 'ms')}}
+    run = {'results': {'latency': result(12.0, 'us'), 'throughput': result(500.0, 'wells/s', 'higher'),
+                       'new': result(1.0, 'ms'), 'zero': result(1.0, 'ms')}}
+    rows = {row[0]: row for row in compare_results(run, baseline, threshold=0.25)}
+    assert sorted(rows) == ['latency', 'throughput']
+    assert rows['latency'][3] == pytest.approx(0.2) and not rows['latency'][4]
+    assert rows['throughput'][3] == pytest.approx(1.0) and rows['throughput'][4]
+
+
+def test_cli_fails_on_a_regression(saved_run, tmp_path, capsys):
+    # Against itself nothing regresses; against a baseline ten times faster everything does
+    assert main(['benchmark', '--sizes', '200', '--repeat', '1', '--no-gui', '--baseline', saved_run,
+                 '--threshold', '100']) == 0
+    assert "0 regression(s)" in capsys.readouterr().out
+
+    baseline = load_results(saved_run)
+    faster = copy.deepcopy(baseline)
+    for measurement in faster['results'].values():
+        measurement['value'] *= 10 if measurement['better'] == 'higher' else 0.1
+    path = tmp_path / 'faster.json'
+    path.write_text(json.dumps(faster))
+    assert main(['benchmark', '--sizes', '200', '--repeat', '1', '--no-gui', '--baseline', str(path)]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+
+
+def test_bad_arguments_are_reported(tmp_path, capsys):
+    assert main(['benchmark', '--sizes', '1k', '--no-gui']) == 1
+    assert main(['benchmark', '--baseline', str(tmp_path / 'missing.json'), '--no-gui']) == 1
+    assert capsys.readouterr().err.count("Benchmark failed") == 2
+
+
+def test_batch_measurement_stops_at_the_time_budget(monkeypatch):
+    calls = []
+    monkeypatch.setattr(lift_benchmark, 'BATCH_TIME_BUDGET', 1e-9)
+    assert measure_batch(lambda: calls.append(1), repeat=5) >= 0
+    assert len(calls) == 1
@@ -0,0 +1,81 @@
+import numpy as np
+
+from lift_batch import prepare_columns
+import pytest
+
+from lift_cache import ResultCache, make_key, score_columns_cached, set_default_cache
+from lift_criteria import PARAMETER_NAMES
+from lift_engine import default_criteria, synthetic_wells
+from lift_scoring import calculate_scores, predict_best_lift_method
+
+
+def columns_of(wells):
+    return prepare_columns({name: [well[name] for well in wells] for name in PARAMETER_NAMES})
+
+
+def test_topsis_then_batch_scores_share_a_cache(tmp_path, well):
+    cache = set_default_cache(ResultCache(path=str(tmp_path / 'cache.db')))
+    topsis = calculate_scores(*(well[name] for name in PARAMETER_NAMES))
+    assert isinstance(topsis, dict)
+
+    criteria = default_criteria()
+    columns = columns_of([well])
+    scores = score_columns_cached(columns, criteria, cache)
+    assert np.array_equal(scores, criteria.score(*criteria.encode(columns)))
+
+
+def test_batch_scores_then_topsis_share_a_cache(tmp_path, well):
+    cache = set_default_cache(ResultCache(path=str(tmp_path / 'cache.db')))
+    criteria = default_criteria()
+    score_columns_cached(columns_of([well]), criteria, cache)
+
+    topsis = calculate_scores(*(well[name] for name in PARAMETER_NAMES))
+    assert set(topsis) == set(criteria.methods)
+    assert all(len(value) == 3 for value in topsis.values())
+
+
+def test_disk_cache_survives_a_restart(tmp_path, well):
+    path = str(tmp_path / 'cache.db')
+    criteria = default_criteria()
+    columns = columns_of([well, dict(well, gor=2500), well])
+    first = score_columns_cached(columns, criteria, ResultCache(path=path))
+
+    cache = ResultCache(path=path)
+    assert np.array_equal(score_columns_cached(columns, criteria, cache), first)
+    assert cache.disk_hits == 2 and cache.misses == 0
+
+
+def test_changing_a_result_does_not_change_the_cache(well):
+    args = [well[name] for name in PARAMETER_NAMES]
+    first = calculate_scores(*args)
+    expected = dict(first)
+    first.clear()
+    second = calculate_scores(*args)
+    assert second == expected
+    second.pop(next(iter(second)))
+    second['extra'] = (0, 0, 0)
+    assert calculate_scores(*args) == expected
+    assert predict_best_lift_method(*args) == predict_best_lift_method.uncached(*args)
+
+
+@pytest.mark.parametrize('equal', [(5, 5.0, np.float64(5)), (0.0, -0.0), (float('nan'), np.nan)])
+def test_equal_numbers_give_the_same_key(equal):
+    assert len({make_key('kind', [value, 'good'], 'v') for value in equal}) == 1
+    assert make_key('kind', [' good'], 'v') != make_key('kind', ['good'], 'v')
+
+
+def test_batch_scores_match_and_store_each_distinct_well_once():
+    wells = synthetic_wells(2000, 4)
+    for name in PARAMETER_NAMES:
+        wells[name] = np.resize(wells[name][:37], 2000)
+    wells['gor'][::3] = np.nan
+    wells['water_cut'][::5] *= -0.0
+    criteria = default_criteria()
+    expected = criteria.score(*criteria.encode(wells))
+
+    cache = ResultCache()
+    assert np.array_equal(score_columns_cached(wells, criteria, cache), expected)
+    n_distinct = len(cache)
+    assert n_distinct <= 3 * 5 * 37 and cache.misses == n_distinct
+    assert np.array_equal(score_columns_cached(wells, criteria, cache), expected)
+    assert len(cache) == n_distinct and cache.hits == n_distinct
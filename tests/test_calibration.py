@@ -0,0 +1,114 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from lift_batch import run_calibration, validated_chunks
+from lift_calibration import calibrate, load_history
+from lift_criteria import DEFAULT_CRITERIA, PARAMETER_NAMES, load_criteria
+from lift_engine import synthetic_wells
+from lift_validation import ErrorReport
+
+
+def write_history(path, n_installs, edit=None):
+    # History of synthetic installs: a method in turn and a run life in days, long when the method suits the
+    # well's depth. edit(i, row) may change row i ({column: value})
+    wells = synthetic_wells(n_installs, 3)
+    methods = DEFAULT_CRITERIA.methods
+    with open(path, 'w', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(('well_id',) + PARAMETER_NAMES + ('method', 'outcome'))
+        for i in range(n_installs):
+            row = {name: wells[name][i] for name in PARAMETER_NAMES}
+            row['method'] = methods[i % len(methods)]
+            row['outcome'] = 900 if (wells['well_depth'][i] < 9000) == (i % 2 == 0) else 100
+            if edit is not None:
+                edit(i, row)
+            writer.writerow([f'H{i}'] + [row[name] for name in PARAMETER_NAMES] + [row['method'], row['outcome']])
+    return path
+
+
+def load(path, success_at=365):
+    report = ErrorReport()
+    history = load_history(validated_chunks(str(path), report=report), DEFAULT_CRITERIA.methods, success_at, report)
+    return history, report
+
+
+def test_bad_method_and_outcome_rows_are_rejected(tmp_path):
+    bad = {2: ('method', 'Magic Pump'), 3: ('outcome', 'abc'), 5: ('outcome', ''), 7: ('well_depth', 'deep')}
+
+    def edit(i, row):
+        if i in bad:
+            row[bad[i][0]] = bad[i][1]
+
+    history, report = load(write_history(tmp_path / 'history.csv', 20, edit))
+    assert len(history['method']) == 16
+    assert report.n_rows == 4 and report.n_errors == 4
+    # criteria errors come from validated_chunks, before load_history adds the method and outcome ones
+    lines = dict(line.split(': ', 1) for line in report.summary()[1:])
+    assert sorted(lines) == ['row 3 (H2)', 'row 4 (H3)', 'row 6 (H5)', 'row 8 (H7)']
+    assert lines['row 3 (H2)'] == "method 'Magic Pump' not a method of the criteria table"
+    assert lines['row 4 (H3)'].startswith("outcome 'abc' ")
+    assert lines['row 6 (H5)'] == "outcome '' missing"
+    assert lines['row 8 (H7)'].startswith("well_depth 'deep' ")
+
+
+def test_kept_rows_keep_their_method_and_outcome(tmp_path):
+    history, report = load(write_history(tmp_path / 'history.csv', 14))
+    assert report.n_errors == 0
+    assert history['method'].tolist() == [i % 7 for i in range(14)]
+    assert history['matrix'].shape == (14, len(PARAMETER_NAMES))
+    wells = synthetic_wells(14, 3)
+    assert history['success'].tolist() == [(depth < 9000) == (i % 2 == 0)
+                                           for i, depth in enumerate(wells['well_depth'])]
+
+
+def test_history_without_valid_installs_is_refused(tmp_path):
+    def edit(i, row):
+        row['outcome'] = 'failed'
+
+    with pytest.raises(ValueError, match="no valid installs"):
+        load(write_history(tmp_path / 'history.csv', 5, edit))
+
+
+def test_history_needs_method_and_outcome_columns(tmp_path):
+    path = tmp_path / 'history.csv'
+    write_history(path, 3)
+    with open(path) as handle:
+        rows = [row[:-1] for row in csv.reader(handle)]
+    with open(path, 'w', newline='') as handle:
+        csv.writer(handle).writerows(rows)
+    with pytest.raises(ValueError, match="outcome"):
+        load(path)
+
+
+def test_calibration_is_independent_of_workers(tmp_path):
+    history, _ = load(write_history(tmp_path / 'history.csv', 200))
+    table, report = calibrate(history, DEFAULT_CRITERIA, n_folds=3, min_support=5, seed=1)
+    again, _ = calibrate(history, DEFAULT_CRITERIA, n_folds=3, workers=2, min_support=5, seed=1)
+    assert table.version == again.version
+    assert report['installs'] == 200
+    assert len(report['cross_validation']) == 4
+    with pytest.raises(ValueError, match="folds"):
+        calibrate(history, DEFAULT_CRITERIA, n_folds=1)
+
+
+def test_run_calibration_writes_a_loadable_criteria_file(tmp_path):
+    output = tmp_path / 'calibrated.json'
+    report = ErrorReport()
+
+    def edit(i, row):
+        if i == 4:
+            row['method'] = 'Magic Pump'
+
+    table, calibration = run_calibration(str(write_history(tmp_path / 'history.csv', 120, edit)), str(output),
+                                         n_folds=3, min_support=5, success_at=365, report=report)
+    assert report.n_rows == 1
+    assert calibration['installs'] == 119
+    assert calibration['source'] == 'history.csv' and calibration['success_at'] == 365
+    assert load_criteria(str(output)).version == table.version
+    with open(output) as handle:
+        assert json.load(handle)['calibration']['parent'] == DEFAULT_CRITERIA.version
+    assert [fold['ratio'] for fold in calibration['cross_validation']] == [0.25, 0.5, 0.75, 0.9]
+    assert np.isfinite(calibration['prior']['auc']) and np.isfinite(calibration['fit']['auc'])
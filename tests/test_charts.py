@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+matplotlib = pytest.importorskip('matplotlib')
+matplotlib.use('Agg')
+
+from matplotlib.figure import Figure  # noqa: E402
+
+from lift_charts import BarChart, BlitManager, Histogram, Scatter, downsample  # noqa: E402
+
+
+@pytest.fixture
+def axes():
+    figure = Figure()
+    axes = figure.add_subplot()
+    figure.canvas.draw()
+    return axes
+
+
+@pytest.fixture
+def manager(axes):
+    # Every update is drawn at once, none are merged into a later frame
+    return BlitManager(axes.figure.canvas, frame_budget=0)
+
+
+def shown(scatter):
+    # Every drawn point of a Scatter, as a set of (x, y)
+    return {point for line in scatter.lines for point in zip(*map(np.ndarray.tolist, line.get_data()))}
+
+
+def test_downsampling_keeps_the_extremes():
+    rng = np.random.default_rng(0)
+    x, y = rng.normal(size=100001), rng.normal(size=100001)
+    x[[12345, 777]] = 50, -50
+    y[[54321, 91]] = 70, -70
+    x[:10] = np.nan
+    keep = downsample(len(x), 1000, x, y)
+    assert len(keep) <= 1000 and (np.diff(keep) > 0).all()
+    assert {12345, 777, 54321, 91, len(x) - 1} <= set(keep.tolist())
+    assert downsample(5000, 100, np.full(5000, np.nan)).tolist() == np.linspace(0, 4999, 98).astype(int).tolist()
+
+
+def test_scatter_draws_the_outliers_of_a_large_field(axes, manager):
+    n_points = 50000
+    x = np.linspace(0, 1, n_points)
+    y = np.sin(np.arange(n_points))
+    x[31337], y[4242] = 9.0, -9.0
+    categories = np.arange(n_points) % 3
+    scatter = Scatter(axes, manager, ['r', 'g', 'b'], max_points=2000)
+    scatter.set_limits(x, y)
+    scatter.set_data(x, y, categories)
+
+    points = shown(scatter)
+    assert len(points) <= 2000
+    assert (9.0, y[31337]) in points and (x[4242], -9.0) in points
+    assert scatter.note.get_text() == f"{len(points):,} of {n_points:,} wells shown"
+    for j, line in enumerate(scatter.lines):
+        assert set(line.get_xdata().tolist()) <= set(x[categories == j].tolist())
+
+    scatter.set_data(x[:100], y[:100], categories[:100])
+    assert len(shown(scatter)) == 100 and scatter.note.get_text() == ""
+
+
+def test_bars_update_in_place_and_keep_the_highest_in_view(axes, manager):
+    chart = BarChart(axes, manager)
+    chart.set_data(['a', 'b', 'c'], [1, 2, 3])
+    bars = list(chart.bars)
+    assert axes.get_ylim()[1] >= 3
+
+    # Same labels: the bars are reused, and the limit grows as soon as one outgrows it
+    chart.set_data(['a', 'b', 'c'], [1, 40, 3])
+    assert chart.bars == bars and [bar.get_height() for bar in bars] == [1, 40, 3]
+    assert axes.get_ylim()[1] >= 40
+    chart.set_data(['a', 'b', 'c'], [1, 2, 3])
+    assert 3 <= axes.get_ylim()[1] <= 3 * chart.headroom ** 2
+
+    chart.set_data(['a', 'b'], [5, 6])
+    assert chart.bars != bars and len(chart.bars) == 2
+
+
+def test_fixed_limits_and_histogram_counts(axes, manager):
+    chart = BarChart(axes, manager, ylim=(0, 1))
+    chart.set_data(['ESP', 'PCP'], [0.2, 0.9])
+    chart.set_data(['ESP', 'PCP'], [0.5, 0.1])
+    assert axes.get_ylim() == (0, 1)
+
+    histogram = Histogram(axes, manager, 5)
+    histogram.set_values([0, 1, 1, 4])
+    histogram.add(np.array([0, 0, 0, 0, 10]))
+    assert [bar.get_height() for bar in histogram.bars] == [1, 2, 0, 0, 11]
+    assert axes.get_ylim()[1] >= 11
+    histogram.clear()
+    assert histogram.counts.sum() == 0
@@ -0,0 +1,112 @@
+import copy
+import json
+import os
+
+import numpy as np
+import pytest
+
+import lift_criteria
+from lift_criteria import (CRITERIA_FILE_ENV, DEFAULT_CRITERIA, LIFT_METHODS, PARAMETER_NAMES, CriteriaTable,
+                           IntervalIndex, current_criteria, load_criteria, save_criteria, use_criteria_file)
+from lift_scoring import predict_best_lift_method
+
+from conftest import WELL
+from test_engine import edge_rows, reference_scores
+
+
+def touch(path, step):
+    # Move the modification time on, so an edit within the clock resolution is still seen as a change
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + step * 10 ** 9))
+
+
+def test_interval_index_matches_a_scan():
+    intervals = [(0, 10), (5, 5), (5, 20), (-3, 0), (30, 40), (float('inf'), float('-inf'))]
+    index = IntervalIndex(intervals)
+    values = sorted({bound + delta for interval in intervals[:-1] for bound in interval
+                     for delta in (-1, -1e-9, 0, 1e-9, 1)})
+    for value in values + [-np.inf, np.inf, 25.0]:
+        expected = sum(1 << j for j, (lo, hi) in enumerate(intervals) if lo <= value <= hi)
+        assert index.lookup(value) == expected, value
+    assert index.lookup(np.nan) == 0
+
+
+def test_compiled_table_scores_like_the_criteria():
+    methods = list(LIFT_METHODS)
+    for row in edge_rows():
+        scores = DEFAULT_CRITERIA.score_well(row)
+        assert list(scores) == methods
+        assert list(scores.values()) == reference_scores(row), row
+    assert DEFAULT_CRITERIA.accepting_methods('completion', 'multiple') == [
+        method for method in methods if 'multiple' in LIFT_METHODS[method]['completion']]
+
+
+def test_table_is_immutable_and_copies_out():
+    with pytest.raises(AttributeError):
+        DEFAULT_CRITERIA.version = 'x'
+    criteria = DEFAULT_CRITERIA['ESP']
+    criteria['water_cut'] = (0, 1)
+    assert DEFAULT_CRITERIA['ESP'] == LIFT_METHODS['ESP']
+
+
+def test_saved_table_loads_with_the_same_version(tmp_path):
+    path = str(tmp_path / 'criteria.json')
+    weights = dict.fromkeys(PARAMETER_NAMES, 1.0)
+    version = save_criteria(DEFAULT_CRITERIA, path, weights=weights)
+    table = load_criteria(path)
+    assert table.version == version != DEFAULT_CRITERIA.version
+    assert table.as_dict() == CriteriaTable(json.loads(json.dumps(LIFT_METHODS))).as_dict()
+    assert table.weight_map() == weights and table.source == path
+
+
+@pytest.mark.parametrize('edit, message', [
+    (lambda methods: methods['ESP'].pop('gor'), "missing criteria gor"),
+    (lambda methods: methods['ESP'].update(water_cut=50), "must be a \\(low, high\\) pair"),
+    (lambda methods: methods['ESP'].update(completion=3), "string or a list"),
+])
+def test_bad_tables_are_refused(edit, message):
+    lift_methods = copy.deepcopy(LIFT_METHODS)
+    edit(lift_methods)
+    with pytest.raises(ValueError, match=message):
+        CriteriaTable(lift_methods)
+
+
+def test_criteria_file_is_reloaded_when_it_changes(tmp_path):
+    path = str(tmp_path / 'criteria.json')
+    args = [WELL[name] for name in PARAMETER_NAMES]
+    lift_methods = copy.deepcopy(LIFT_METHODS)
+    save_criteria(lift_methods, path)
+    assert use_criteria_file(path).version == DEFAULT_CRITERIA.version
+    best = predict_best_lift_method(*args)
+
+    # Only the best method accepts nothing any more; the next lookup sees the edited file
+    lift_methods[best] = {name: (1e9, 1e9) if isinstance(criterion, tuple) else 'none'
+                          for name, criterion in lift_methods[best].items()}
+    version = save_criteria(lift_methods, path)
+    touch(path, 1)
+    assert current_criteria().version == version
+    assert current_criteria().score_well(args)[best] == 0
+    assert predict_best_lift_method(*args) != best
+
+    # A broken edit or a deleted file keeps the last good table
+    with open(path, 'w') as handle:
+        handle.write('{')
+    touch(path, 2)
+    with pytest.warns(UserWarning, match="Keeping the previous criteria"):
+        assert current_criteria().version == version
+    os.remove(path)
+    assert current_criteria().version == version
+
+    assert use_criteria_file(None) is DEFAULT_CRITERIA
+
+
+def test_environment_names_the_criteria_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'criteria.json')
+    lift_methods = copy.deepcopy(LIFT_METHODS)
+    lift_methods.pop('PCP')
+    save_criteria(lift_methods, path)
+    monkeypatch.setenv(CRITERIA_FILE_ENV, path)
+    monkeypatch.setattr(lift_criteria, '_criteria_file_configured', False)
+    assert 'PCP' not in current_criteria().methods
+    with pytest.raises(FileNotFoundError):
+        use_criteria_file(str(tmp_path / 'missing.json'))
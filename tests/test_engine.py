@@ -0,0 +1,150 @@
+import numbers
+
+import numpy as np
+import pytest
+
+import lift_engine
+from lift_criteria import (CATEGORY_OPTIONS, DEFAULT_CRITERIA, LIFT_METHODS, PARAMETERS, PARAMETER_NAMES,
+                           current_criteria, save_criteria, use_criteria_file)
+from lift_engine import CompiledCriteria, IncrementalScorer, predict_best_lift_methods, score_wells, synthetic_wells
+from lift_scoring import predict_best_lift_method
+
+from conftest import WELL
+
+
+def reference_scores(row):
+    # Criteria met per method straight from LIFT_METHODS, the way the original per-well loop checked them
+    scores = []
+    for criteria in LIFT_METHODS.values():
+        met = 0
+        for (name, kind), value in zip(PARAMETERS, row):
+            criterion = criteria[name]
+            if kind == 'range':
+                met += criterion[0] <= value <= criterion[1]
+            elif kind == 'eq':
+                met += isinstance(criterion, numbers.Real) and value == criterion
+            else:
+                met += value in criterion
+        scores.append(met)
+    return scores
+
+
+def edge_rows():
+    # The base well with one input at a time set to an edge value: NaN, +-inf, every criterion bound and the
+    # floats just around it for the numbers; every known choice, unknown text, a blank and a substring of a
+    # criterion for the categories
+    base = [WELL[name] for name in PARAMETER_NAMES]
+    table = current_criteria()
+    rows = [base]
+    for i, (name, kind) in enumerate(PARAMETERS):
+        if kind == 'in':
+            values = list(CATEGORY_OPTIONS[name]) + ['unknown', '', 'single or', 'Single']
+        else:
+            bounds = sorted({bound for interval in table.intervals[name] for bound in interval
+                             if np.isfinite(bound)})
+            values = [np.nan, np.inf, -np.inf, -1.0]
+            for bound in bounds:
+                values += [bound, np.nextafter(bound, -np.inf), np.nextafter(bound, np.inf)]
+        for value in values:
+            row = list(base)
+            row[i] = value
+            rows.append(row)
+    return rows
+
+
+def columns_of(rows):
+    return {name: [row[i] for row in rows] for i, name in enumerate(PARAMETER_NAMES)}
+
+
+@pytest.mark.parametrize('block_size', [lift_engine.BLOCK_SIZE, 7])
+def test_vectorized_scores_match_the_scalar_path(monkeypatch, block_size):
+    monkeypatch.setattr(lift_engine, 'BLOCK_SIZE', block_size)
+    rows = edge_rows()
+    criteria = CompiledCriteria()
+    scores, best = score_wells(columns_of(rows), criteria)
+
+    table = criteria.table
+    for row, row_scores, row_best in zip(rows, scores.tolist(), best.tolist()):
+        scalar = table.score_well(row)
+        assert row_scores == [scalar[method] for method in criteria.methods] == reference_scores(row), row
+        assert criteria.methods[row_best] == predict_best_lift_method.uncached(*row)
+
+
+def test_matches_agree_with_scores():
+    rows = edge_rows()
+    criteria = CompiledCriteria()
+    matrix, category_mask = criteria.encode(columns_of(rows))
+    assert np.array_equal(criteria.matches(matrix, category_mask).sum(axis=1), criteria.score(matrix, category_mask))
+
+
+def test_more_rows_than_a_block():
+    wells = synthetic_wells(lift_engine.BLOCK_SIZE + 1234, seed=7)
+    wells['gor'][::1000] = np.nan
+    wells['well_depth'][5::1000] = np.inf
+    criteria = CompiledCriteria()
+    scores, best = score_wells(wells, criteria)
+    assert scores.shape == (lift_engine.BLOCK_SIZE + 1234, len(criteria.methods))
+
+    table = criteria.table
+    sample = np.r_[0:50, lift_engine.BLOCK_SIZE - 50:lift_engine.BLOCK_SIZE + 50, len(scores) - 50:len(scores)]
+    for i in sample.tolist():
+        row = [wells[name][i] for name in PARAMETER_NAMES]
+        scalar = table.score_well(row)
+        assert scores[i].tolist() == [scalar[method] for method in criteria.methods]
+    names = predict_best_lift_methods({name: values[sample] for name, values in wells.items()}, criteria)
+    assert names.tolist() == [criteria.methods[j] for j in best[sample].tolist()]
+
+
+def test_empty_input():
+    scores, best = score_wells(columns_of([]))
+    assert scores.shape == (0, len(LIFT_METHODS)) and best.shape == (0,)
+
+
+def test_incremental_scores_match_a_full_rescore():
+    # Walk through the edge rows one changed input at a time, as the form edits them
+    table = current_criteria()
+    scorer = IncrementalScorer()
+    scorer.set_values([WELL[name] for name in PARAMETER_NAMES])
+    current = [WELL[name] for name in PARAMETER_NAMES]
+    for row in edge_rows()[1:]:
+        for i, name in enumerate(PARAMETER_NAMES):
+            if row[i] is not current[i] and row[i] != current[i]:
+                current[i] = row[i]
+                scorer.set_value(name, row[i])
+        assert scorer.scores() == table.score_well(current), current
+        assert scorer.best_method() == predict_best_lift_method.uncached(*current)
+
+    # An input that does not parse matches no method
+    scorer.set_value('gor', None)
+    assert scorer.scores() == table.score_well(current[:4] + [np.nan] + current[5:])
+
+
+def test_incremental_ranking_keeps_the_table_order_on_ties():
+    scorer = IncrementalScorer()
+    scorer.set_values([None] * len(PARAMETER_NAMES))
+    assert scorer.ranking() == [(method, 0) for method in LIFT_METHODS]
+    assert scorer.best_method() == next(iter(LIFT_METHODS))
+
+    scorer.set_values([WELL[name] for name in PARAMETER_NAMES])
+    ranking = scorer.ranking()
+    assert [score for _, score in ranking] == sorted(scorer.scores().values(), reverse=True)
+    for (method, score), (other, other_score) in zip(ranking, ranking[1:]):
+        assert score > other_score or list(LIFT_METHODS).index(method) < list(LIFT_METHODS).index(other)
+
+
+def test_incremental_scorer_follows_an_edited_criteria_file(tmp_path):
+    path = str(tmp_path / 'criteria.json')
+    lift_methods = {method: dict(criteria) for method, criteria in LIFT_METHODS.items() if method != 'ESP'}
+    scorer = IncrementalScorer()
+    scorer.set_values([WELL[name] for name in PARAMETER_NAMES])
+    save_criteria(lift_methods, path)
+    table = use_criteria_file(path)
+
+    scorer.set_value('water_cut', 80)
+    values = [80 if name == 'water_cut' else WELL[name] for name in PARAMETER_NAMES]
+    assert scorer.methods == table.methods and scorer.scores() == table.score_well(values)
+
+    # A scorer given its own table keeps it
+    fixed = IncrementalScorer(DEFAULT_CRITERIA)
+    fixed.set_value('water_cut', 80)
+    assert fixed.methods == tuple(LIFT_METHODS) and 'ESP' in fixed.scores()
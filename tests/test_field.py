@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from lift_engine import score_wells, synthetic_wells
+from lift_field import FIELD_COLUMNS, count_wells, load_field, score_field
+from lift_store import WellStoreWriter
+from lift_validation import ErrorReport
+
+from conftest import write_wells
+
+SCORE, LEAD, DEPTH = 2, 3, 4
+
+
+@pytest.fixture
+def field():
+    return score_field(field_wells(), well_ids=[f'W{i:03d}' for i in range(499, -1, -1)])
+
+
+def field_wells():
+    wells = synthetic_wells(500, 4)
+    wells['well_depth'][[3, 50, 51]] = np.nan
+    return wells
+
+
+def python_order(field, key, descending=False):
+    # Stable sort of the well indices by key(i), NaN last, the way the table should show them
+    def sort_key(i):
+        value = key(i)
+        missing = value != value
+        return missing, 0 if missing else (-value if descending else value)
+    return sorted(range(len(field)), key=sort_key)
+
+
+def test_columns_follow_the_scores(field):
+    scores, best = score_wells(field_wells())
+    assert np.array_equal(field.scores, scores) and np.array_equal(field.best, best)
+    ordered = np.sort(scores, axis=1)
+    assert field.lead.tolist() == (ordered[:, -1] - ordered[:, -2]).tolist()
+    assert len(field.headers) == len(FIELD_COLUMNS) + len(field.methods)
+    assert field.display(0, 0) == 'W499' and field.display(0, 1) == field.methods[best[0]]
+    assert field.display(3, DEPTH) == '' and field.display(0, SCORE) == str(scores[0].max())
+
+
+@pytest.mark.parametrize('column, descending', [(SCORE, True), (LEAD, False), (DEPTH, False), (DEPTH, True)])
+def test_numeric_sorts_are_stable_with_missing_values_last(field, column, descending):
+    values = field.column_values(column).astype(float)
+    field.sort(column, descending)
+    assert field.view.tolist() == python_order(field, lambda i: values[i], descending)
+
+
+def test_text_sorts_and_sorting_by_two_columns(field):
+    field.sort(0)
+    assert [field.display(row, 0) for row in range(3)] == ['W000', 'W001', 'W002']
+    field.sort(1)
+    names = [field.display(row, 1) for row in range(len(field))]
+    assert names == sorted(names)
+
+    # By well, method, then score: equal scores keep the method order and equal methods the well order
+    field.sort(SCORE, descending=True)
+    expected = sorted(range(len(field)), key=lambda i: (-field.best_score[i], field.methods[field.best[i]],
+                                                        field.well_ids[i]))
+    assert field.view.tolist() == expected
+    field.sort(-1)
+    assert field.view.tolist() == list(range(len(field)))
+
+
+def test_filters_combine_and_keep_the_sort(field):
+    method = field.methods[np.bincount(field.best).argmax()]
+    field.sort(SCORE, descending=True)
+    field.filter(method=method, min_score=10, min_depth=2000, max_depth=12000)
+    depth = field.columns['well_depth']
+    kept = {i for i in range(len(field)) if field.methods[field.best[i]] == method and field.best_score[i] >= 10
+            and 2000 <= depth[i] <= 12000}
+    assert kept and set(field.view.tolist()) == kept
+    assert field.view.tolist() == [i for i in field.order.tolist() if i in kept]
+    assert field.method_counts() == {name: len(kept) if name == method else 0 for name in field.methods}
+
+    field.filter()
+    assert len(field.view) == len(field) and sum(field.method_counts().values()) == len(field)
+
+
+def test_assignment_column_sorts_and_displays(field):
+    assignment = np.where(np.arange(len(field)) % 3 == 0, -1, field.best)
+    field.set_assignment(assignment)
+    column = field.assigned_column()
+    assert field.headers[column] == 'Assigned' and field.display(0, column) == ''
+    field.sort(column)
+    names = [field.display(row, column) for row in range(len(field))]
+    assert names == sorted(names) and names[0] == ''
+
+
+def test_load_field_from_csv_and_store_match(tmp_path):
+    def edit(i, row):
+        if i == 7:
+            row['water_cut'] = -5
+
+    path = write_wells(str(tmp_path / 'wells.csv'), 300, seed=1, edit=edit)
+    report = ErrorReport()
+    progress = []
+    field = load_field(path, chunk_size=100, progress=lambda n, scores: progress.append(n), report=report)
+    assert count_wells(path) == 300 and len(field) == 299 and report.n_rows == 1
+    assert progress == [99, 199, 299] and 'W7' not in field.well_ids.tolist()
+
+    wells = synthetic_wells(300, 1)
+    store_path = str(tmp_path / 'wells.wells')
+    writer = WellStoreWriter(store_path)
+    writer.write(wells, well_ids=[f'W{i}' for i in range(300)])
+    writer.close()
+    stored = load_field(store_path)
+    keep = np.arange(300) != 7
+    assert count_wells(store_path) == 300
+    assert np.array_equal(stored.scores[keep], field.scores)
+    assert stored.well_ids[keep].tolist() == field.well_ids.tolist()
@@ -0,0 +1,52 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import write_wells
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Every headless module, imported and used in a fresh interpreter, then the GUI packages it pulled in
+HEADLESS_PROBE = '''
+import json, sys
+modules = sorted(sys.argv[1:])
+for name in modules:
+    __import__(name)
+from lift_scoring import predict_best_lift_method
+from lift_engine import score_wells, synthetic_wells
+score_wells(synthetic_wells(10))
+loaded = [name for name in ('PyQt5', 'matplotlib') if name in sys.modules]
+print(json.dumps({'modules': modules, 'loaded': loaded}))
+'''
+
+
+def probe(script, *args):
+    completed = subprocess.run([sys.executable, '-c', script] + list(args), cwd=ROOT, capture_output=True,
+                               text=True, check=True, env=dict(os.environ, QT_QPA_PLATFORM='offscreen'))
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def test_headless_modules_import_no_gui_packages():
+    modules = [os.path.basename(path)[:-3] for path in glob.glob(os.path.join(ROOT, 'lift_*.py'))]
+    result = probe(HEADLESS_PROBE, *modules)
+    assert 'lift_batch' in result['modules'] and 'lift_scoring' in result['modules']
+    assert result['loaded'] == []
+
+
+def test_batch_cli_runs_without_gui_packages(tmp_path):
+    path = write_wells(str(tmp_path / 'wells.csv'), 20)
+    script = ('import json, sys, lift_batch; status = lift_batch.main(sys.argv[1:]); '
+              'print(json.dumps([status, [name for name in ("PyQt5", "matplotlib") if name in sys.modules]]))')
+    assert probe(script, 'batch', path, '-o', str(tmp_path / 'scored.csv')) == [0, []]
+
+
+def test_window_is_shown_before_matplotlib_loads():
+    pytest.importorskip('PyQt5')
+    from lift_benchmark import startup_probe
+
+    result = startup_probe()
+    assert result['core_modules'] == [] and not result['window_matplotlib']
@@ -0,0 +1,28 @@
+import json
+
+import lift_metrics
+
+
+def test_errors_are_logged_with_their_traceback(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    lift_metrics.enable(str(path))
+    try:
+        try:
+            float('abc')
+        except ValueError as e:
+            lift_metrics.record_error('worker', e, task='run_prediction')
+    finally:
+        lift_metrics.disable()
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    errors = [event for event in events if event['type'] == 'error']
+    assert len(errors) == 1
+    assert errors[0]['error'] == 'ValueError' and errors[0]['labels'] == {'task': 'run_prediction'}
+    assert 'Traceback' in errors[0]['traceback'] and "float('abc')" in errors[0]['traceback']
+
+
+def test_disabled_metrics_record_nothing(tmp_path):
+    lift_metrics.disable()
+    lift_metrics.record_error('worker', ValueError('ignored'))
+    lift_metrics.count('cache.hits')
+    assert lift_metrics.metrics().snapshot() == {'counters': [], 'timers': []}
@@ -0,0 +1,40 @@
+import csv
+
+import numpy as np
+import pytest
+
+from lift_batch import run_batch
+from lift_engine import score_wells, synthetic_wells
+from lift_parallel import score_wells_parallel, split_shards
+
+from conftest import write_wells
+
+
+@pytest.mark.parametrize('n_wells', [0, 1, 2, 1001])
+def test_pool_scores_match_serial_in_row_order(n_wells):
+    wells = synthetic_wells(n_wells, seed=3)
+    expected_scores, expected_best = score_wells(wells)
+    scores, best = score_wells_parallel(wells, workers=2, shard_size=100)
+    assert scores.shape == expected_scores.shape
+    assert np.array_equal(scores, expected_scores)
+    assert np.array_equal(best, expected_best)
+
+
+def test_shards_cover_every_row_once():
+    wells = synthetic_wells(250)
+    shards = list(split_shards(wells, 100))
+    assert [len(shard['gor']) for shard in shards] == [100, 100, 50]
+    assert np.array_equal(np.concatenate([shard['gor'] for shard in shards]), wells['gor'])
+
+
+@pytest.mark.parametrize('n_wells', [0, 1, 2500])
+@pytest.mark.parametrize('topsis', [False, True])
+def test_batch_with_two_workers_writes_the_serial_output(tmp_path, n_wells, topsis):
+    wells = write_wells(str(tmp_path / 'wells.csv'), n_wells)
+    serial, parallel = tmp_path / 'serial.csv', tmp_path / 'parallel.csv'
+    assert run_batch(wells, str(serial), chunk_size=700, topsis=topsis) == n_wells
+    assert run_batch(wells, str(parallel), chunk_size=700, workers=2, topsis=topsis) == n_wells
+    assert parallel.read_bytes() == serial.read_bytes()
+    if n_wells:
+        with open(parallel, newline='') as handle:
+            assert [row['well_id'] for row in csv.DictReader(handle)] == [f'W{i}' for i in range(n_wells)]
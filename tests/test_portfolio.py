@@ -0,0 +1,153 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from lift_batch import main
+from lift_engine import default_criteria, synthetic_wells
+from lift_portfolio import optimize_field, optimize_portfolio, resource_usage
+from lift_ranking import METHOD_PROPERTIES, allowed_methods
+
+from conftest import write_wells
+
+
+@pytest.fixture(scope='module')
+def field():
+    criteria = default_criteria()
+    scores = criteria.score(*criteria.encode(synthetic_wells(500, seed=1)))
+    return scores, criteria.methods
+
+
+def used_by(result, methods, names):
+    usage = resource_usage(methods, names)
+    assigned = result['assignment'][result['assignment'] >= 0]
+    return usage[assigned].sum(axis=0)
+
+
+@pytest.mark.parametrize('budgets', [
+    {'capex': 5e6, 'gas': 3000, 'power': 2000},
+    {'capex': 2e7},
+    {'gas': 1200, 'power': 500},
+    {'capex': 1e9, 'gas': 1e9, 'power': 1e9},
+])
+def test_assignment_respects_every_budget(field, budgets):
+    scores, methods = field
+    result = optimize_portfolio(scores, methods, budgets)
+    names = list(budgets)
+    used = used_by(result, methods, names)
+    for r, name in enumerate(names):
+        assert used[r] <= budgets[name] * (1 + 1e-9)
+        assert result['budgets'][name]['used'] == pytest.approx(used[r])
+    assigned = result['assignment'] >= 0
+    rows = np.flatnonzero(assigned)
+    assert result['total_score'] == pytest.approx(scores[rows, result['assignment'][rows]].sum())
+    assert result['total_score'] <= result['upper_bound'] + 1e-6
+
+
+def test_loose_budgets_keep_every_best_method(field):
+    scores, methods = field
+    result = optimize_portfolio(scores, methods, {'gas': 1e9, 'power': 1e9})
+    assert result['total_score'] == scores.max(axis=1).sum()
+    assert not any(budget['binding'] for budget in result['budgets'].values())
+    for name, budget in result['budgets'].items():
+        assert budget['demand'] == pytest.approx(budget['used'])
+
+
+def test_zero_budgets_are_binding_and_report_the_demand(field):
+    scores, methods = field
+    free = optimize_portfolio(scores, methods, {})
+    result = optimize_portfolio(scores, methods, {'gas': 0, 'power': 0})
+    assert result['total_score'] < free['total_score']
+
+    usage = resource_usage(methods, ['gas', 'power'])
+    demand = usage[scores.argmax(axis=1)].sum(axis=0)
+    for r, name in enumerate(['gas', 'power']):
+        assert result['budgets'][name]['binding']
+        assert result['budgets'][name]['used'] == 0
+        assert result['budgets'][name]['demand'] == pytest.approx(demand[r])
+    assigned = result['assignment'][result['assignment'] >= 0]
+    assert (usage[assigned] == 0).all()
+
+
+def test_zero_budget_nobody_wants_is_not_binding():
+    methods = ('Gas Lift', 'Sucker Rod Pump')
+    scores = np.array([[3, 5], [2, 4]])
+    result = optimize_portfolio(scores, methods, {'gas': 0})
+    assert result['assignment'].tolist() == [1, 1]
+    assert result['budgets']['gas'] == {'budget': 0.0, 'used': 0.0, 'demand': 0.0, 'slack': 0.0, 'binding': False,
+                                        'shadow_price': None, 'unknown': []}
+
+
+def test_only_electric_methods_draw_power(field):
+    # The power budget and the no_power constraint agree on which methods need electricity at the well
+    for method, properties in METHOD_PROPERTIES.items():
+        assert (properties['electric_kw'] > 0) == properties['electric_power'], method
+    scores, methods = field
+    no_power = allowed_methods(methods, {'no_power': True}, len(scores))
+    result = optimize_portfolio(scores, methods, {'power': 0})
+    assert result['total_score'] == optimize_portfolio(scores, methods, {}, no_power)['total_score']
+    assert result['total_score'] == np.where(no_power, scores, 0).max(axis=1).sum()
+
+
+def test_methods_of_unknown_cost_are_reported_or_assumed(field):
+    scores, methods = field
+    unknown = [method for method in methods if METHOD_PROPERTIES[method]['capital_cost'] is None]
+    assert unknown == ['Hydraulic Piston Pump', 'Hydraulic Jet Pump', 'Plunger Lift']
+
+    result = optimize_portfolio(scores, methods, {'capex': 5e7})
+    assert result['budgets']['capex']['unknown'] == unknown
+    assert all(result['counts'][method] == 0 for method in unknown)
+
+    assumed = optimize_portfolio(scores, methods, {'capex': 5e7}, assumed={'capex': 150000})
+    assert assumed['budgets']['capex']['unknown'] == []
+    assert sum(assumed['counts'][method] for method in unknown) > 0
+    assert assumed['total_score'] > result['total_score']
+    assigned = assumed['assignment'][assumed['assignment'] >= 0]
+    costs = np.nan_to_num(resource_usage(methods, ['capex'])[:, 0], nan=150000)
+    assert costs[assigned].sum() == pytest.approx(assumed['budgets']['capex']['used'])
+    assert assumed['budgets']['capex']['used'] <= 5e7 * (1 + 1e-9)
+
+    # Only the methods some well is allowed are listed, and without a capex budget nothing is
+    allowed = np.ones(scores.shape, dtype=bool)
+    allowed[:, methods.index('Plunger Lift')] = False
+    limited = optimize_portfolio(scores, methods, {'capex': 5e7}, allowed)
+    assert limited['budgets']['capex']['unknown'] == unknown[:2]
+    gas_only = optimize_portfolio(scores, methods, {'gas': 100})
+    assert all(not budget['unknown'] for budget in gas_only['budgets'].values())
+
+
+def test_cli_warns_about_methods_of_unknown_cost(tmp_path, capsys):
+    path = str(write_wells(tmp_path / 'wells.csv', 200))
+    assert main(['portfolio', path, '--capex', '2e7', '-o', str(tmp_path / 'out.csv')]) == 0
+    assert "Warning: not assigned, no known capex figure: Hydraulic Piston Pump" in capsys.readouterr().out
+    assert main(['portfolio', path, '--capex', '2e7', '--unknown-cost', '150000', '-o',
+                 str(tmp_path / 'out.csv')]) == 0
+    assert "Warning" not in capsys.readouterr().out
+
+
+def test_small_field_is_solved_optimally():
+    rng = np.random.default_rng(3)
+    scores = rng.integers(5, 20, size=(6, 3))
+    usage = rng.integers(1, 10, size=(6, 3, 1)).astype(float)
+    methods = ('A', 'B', 'C')
+    result = optimize_portfolio(scores, methods, {'capex': 25}, usage=usage)
+
+    best = 0
+    for choice in itertools.product(range(4), repeat=6):
+        picked = [(i, j) for i, j in enumerate(choice) if j < 3]
+        if sum(usage[i, j, 0] for i, j in picked) <= 25:
+            best = max(best, sum(scores[i, j] for i, j in picked))
+    assert result['total_score'] <= best <= result['upper_bound'] + 1e-6
+    assert result['total_score'] >= 0.95 * best
+
+
+def test_unknown_budget_is_rejected(field):
+    scores, methods = field
+    with pytest.raises(ValueError):
+        optimize_portfolio(scores, methods, {'water': 10})
+    with pytest.raises(ValueError):
+        optimize_field(synthetic_wells(3), {'gas': -1})
+    with pytest.raises(ValueError):
+        optimize_portfolio(scores, methods, {'capex': 10}, assumed={'water': 1})
+    with pytest.raises(ValueError):
+        optimize_field(synthetic_wells(3), {'capex': 10}, assumed={'capex': -1})
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+import lift_ranking
+from lift_criteria import LIFT_METHODS, PARAMETER_NAMES
+from lift_ranking import (METHOD_PROPERTIES, allowed_methods, method_costs, pareto_front, rank_field, rank_scores,
+                          rank_well)
+from lift_scoring import predict_best_lift_method
+
+from conftest import WELL
+
+METHODS = tuple(LIFT_METHODS)
+
+
+def random_field(n_wells, seed=0):
+    # Scores over a narrow range, so most wells have ties, and a random allowed mask
+    rng = np.random.default_rng(seed)
+    return rng.integers(8, 12, size=(n_wells, len(METHODS))), rng.random((n_wells, len(METHODS))) < 0.8
+
+
+def test_ranks_share_ties_and_keep_the_table_order():
+    scores, allowed = random_field(300)
+    order, rank = rank_scores(scores, allowed)
+    for row, mask, row_order, row_rank in zip(scores.tolist(), allowed, order.tolist(), rank.tolist()):
+        kept = [j for j in range(len(METHODS)) if mask[j]]
+        assert row_order[:len(kept)] == sorted(kept, key=lambda j: -row[j])
+        assert row_rank == [1 + sum(row[k] > row[j] for k in kept) if mask[j] else 0 for j in range(len(METHODS))]
+
+    # Unconstrained, the first of the order is the method predict_best_lift_method picks
+    assert rank_scores(np.array([[3, 5, 5, 1]]), np.ones((1, 4), dtype=bool))[0][0].tolist()[:3] == [1, 2, 0]
+    assert rank_scores(np.array([[3, 5, 5, 1]]), np.ones((1, 4), dtype=bool))[1].tolist() == [[3, 1, 1, 4]]
+
+
+def test_pareto_front_matches_pairwise_dominance():
+    scores, allowed = random_field(300, 1)
+    costs = method_costs(METHODS)
+    front = pareto_front(scores, costs, allowed)
+    cost = [np.inf if np.isnan(value) else value for value in costs.tolist()]
+    for row, mask, on in zip(scores.tolist(), allowed, front.tolist()):
+        def dominated(j):
+            return any(mask[k] and row[k] >= row[j] and cost[k] <= cost[j] and (row[k] > row[j] or cost[k] < cost[j])
+                       for k in range(len(METHODS)))
+        assert on == [bool(mask[j]) and not dominated(j) for j in range(len(METHODS))]
+        if mask.any():
+            assert any(on)
+
+
+def test_constraints_and_cost_limits():
+    allowed = allowed_methods(METHODS, {'no_power': True, 'offshore': [True, False]}, 2, max_cost=[np.inf, 210000])
+    for j, method in enumerate(METHODS):
+        properties = METHOD_PROPERTIES[method]
+        assert allowed[0, j] == (not properties['electric_power'] and properties['offshore'] and
+                                 properties['capital_cost'] is not None)
+        assert allowed[1, j] == (not properties['electric_power'] and properties['capital_cost'] is not None
+                                 and properties['capital_cost'] <= 210000)
+    assert not allowed_methods(('Custom Pump',), {'no_gas': True}).any()
+    with pytest.raises(ValueError, match="Unknown constraint"):
+        allowed_methods(METHODS, {'cheap': True})
+
+
+@pytest.mark.parametrize('block_size', [lift_ranking.BLOCK_SIZE, 7])
+def test_field_ranking_is_independent_of_the_blocks(monkeypatch, block_size):
+    scores, _ = random_field(100, 2)
+    expected = rank_field(scores, METHODS, {'no_gas': True})
+    monkeypatch.setattr(lift_ranking, 'BLOCK_SIZE', block_size)
+    ranking = rank_field(scores, METHODS, {'no_gas': True})
+    for key in ('allowed', 'order', 'rank', 'best', 'tied', 'pareto'):
+        assert np.array_equal(ranking[key], expected[key]), key
+    gas_lift = METHODS.index('Gas Lift')
+    assert (ranking['best'] != gas_lift).all() and not ranking['pareto'][:, gas_lift].any()
+    assert ranking['tied'].tolist() == [(row == 1).sum() > 1 for row in ranking['rank']]
+
+    nothing = rank_field(scores[:3], METHODS, max_cost=0)
+    assert nothing['best'].tolist() == [-1, -1, -1] and not nothing['pareto'].any()
+
+
+def test_single_well_ranking():
+    values = [WELL[name] for name in PARAMETER_NAMES]
+    ranking = rank_well(values)
+    assert ranking[0]['method'] == predict_best_lift_method(*values) and ranking[0]['rank'] == 1
+    assert [row['criteria_met'] for row in ranking] == sorted((row['criteria_met'] for row in ranking), reverse=True)
+    assert {row['method']: row['capital_cost'] for row in ranking} == {
+        method: METHOD_PROPERTIES[method]['capital_cost'] for method in METHODS}
+
+    constrained = rank_well(values, {'no_power': True})
+    assert {row['method'] for row in constrained if not row['allowed']} == {'ESP', 'PCP'}
+    assert all(row['rank'] == 0 and not row['pareto'] for row in constrained if not row['allowed'])
@@ -0,0 +1,115 @@
+import copy
+
+import numpy as np
+import pytest
+
+from lift_criteria import LIFT_METHODS, PARAMETER_NAMES, CriteriaTable
+from lift_engine import CompiledCriteria, synthetic_wells
+from lift_ranking import rank_wells
+from lift_scenarios import ScenarioStore, best_methods, diff_recommendations, replay
+
+from conftest import WELL
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ScenarioStore(str(tmp_path / 'scenarios.db'))
+    yield store
+    store.close()
+
+
+def save_field(store, n_wells, tags=(), criteria=None):
+    # n_wells synthetic wells saved as scenario 'base' of wells W0, W1, ...
+    wells = synthetic_wells(n_wells, 5)
+    columns = {name: wells[name].tolist() for name in PARAMETER_NAMES}
+    ids = store.save_many([f'W{i}' for i in range(n_wells)], ['base'] * n_wells, columns, tags, criteria)
+    return ids, wells
+
+
+def changed_table():
+    # The built-in table with Gas Lift limited to very shallow wells, so most wells it suited lose it
+    lift_methods = copy.deepcopy(LIFT_METHODS)
+    lift_methods['Gas Lift']['well_depth'] = (100, 200)
+    return CriteriaTable(lift_methods)
+
+
+def test_saved_recommendations_match_the_field_ranking(store):
+    ids, wells = save_field(store, 300)
+    assert len(ids) == len(set(ids)) == len(store) == 300
+    ranking = rank_wells(wells)
+    expected = dict(zip([f'W{i}' for i in range(300)], best_methods(ranking).tolist()))
+    scenarios, replayed = replay(store)
+    assert {scenario['well_id']: scenario['method'] for scenario in scenarios} == expected
+    assert {scenario['well_id']: method for scenario, method in
+            zip(scenarios, best_methods(replayed)[replayed['content']].tolist())} == expected
+
+
+def test_diff_against_the_saved_recommendations(store):
+    save_field(store, 300)
+    diff = diff_recommendations(store)
+    assert diff['saved'] and len(diff['scenarios']) == 300
+    assert len(diff['changed']) == 0 and not diff['transitions']
+    assert diff['versions']['old'] == [diff['versions']['new']]
+    assert (diff['old_met'] == diff['new_met']).all()
+
+
+def test_diff_under_changed_criteria(store):
+    _, wells = save_field(store, 300)
+    table = changed_table()
+    diff = diff_recommendations(store, table)
+    order = [int(scenario['well_id'][1:]) for scenario in diff['scenarios']]
+    new = best_methods(rank_wells(wells, criteria=CompiledCriteria(table)))[order]
+    expected = np.flatnonzero(diff['old'] != new)
+    assert diff['new'].tolist() == new.tolist()
+    assert len(diff['changed']) and diff['changed'].tolist() == expected.tolist()
+    assert sum(diff['transitions'].values()) == len(diff['changed'])
+    assert all(old == 'Gas Lift' and new != 'Gas Lift' for old, new in diff['transitions'])
+    assert diff['versions']['new'] == table.version != diff['versions']['old'][0]
+
+    # Replayed against a base, not the saved recommendations, with the same result; and no change at all
+    # when the base is the criteria themselves
+    based = diff_recommendations(store, table, base=CriteriaTable(LIFT_METHODS))
+    assert not based['saved'] and based['changed'].tolist() == diff['changed'].tolist()
+    assert len(diff_recommendations(store, table, base=table)['changed']) == 0
+
+
+def test_identical_inputs_are_stored_once_and_pruned(store):
+    first = store.save('A', 'base', WELL, tags=('north',))
+    store.save('B', 'base', dict(WELL, water_cut=50.0))
+    store.save('B', 'high water', dict(WELL, water_cut=90), tags=('north', ' '))
+    assert store.stats() == {'scenarios': 3, 'wells': 2, 'contents': 2, 'tags': 1}
+    assert store.find(well_id='A')[0]['hash'] == store.find(well_id='B')[-1]['hash']
+
+    # Saving under the same well ID and name replaces the scenario and drops inputs no longer used
+    replaced = store.find(well_id='B', tag='north')[0]['id']
+    assert store.save('B', 'high water', WELL) == replaced
+    assert store.stats()['contents'] == 1 and len(store) == 3
+    assert [scenario['id'] for scenario in store.find(tag='north')] == [first]
+    assert store.get(first)['values']['water_cut'] == 50
+
+    store.delete(first)
+    assert [scenario['well_id'] for scenario in store.find()] == ['B', 'B']
+    with pytest.raises(KeyError):
+        store.get(first)
+
+
+def test_filters_narrow_the_diff(store):
+    save_field(store, 40, tags=('field',))
+    store.save('W0', 'workover', dict(WELL, well_depth=150), tags=('workover',))
+    table = changed_table()
+    assert len(diff_recommendations(store, table, well_id='W0')['scenarios']) == 2
+    only = diff_recommendations(store, table, tag='workover')
+    assert [scenario['name'] for scenario in only['scenarios']] == ['workover']
+    assert len(diff_recommendations(store, table, tag='field')['scenarios']) == 40
+    assert len(diff_recommendations(store, table, well_id='W0', tag='field')['scenarios']) == 1
+
+
+def test_bad_batches_are_refused(store):
+    columns = {name: [WELL[name]] for name in PARAMETER_NAMES}
+    with pytest.raises(ValueError, match="One name"):
+        store.save_many(['A'], [], columns)
+    with pytest.raises(ValueError, match="well ID and a name"):
+        store.save_many([' '], ['base'], columns)
+    with pytest.raises(ValueError, match="gor"):
+        store.save_many(['A'], ['base'], {name: values for name, values in columns.items() if name != 'gor'})
+    assert len(store) == 0
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from lift_criteria import CATEGORY_OPTIONS, PARAMETER_NAMES, current_criteria
+from lift_engine import score_wells
+from lift_scoring import predict_best_lift_method
+from lift_sensitivity import sweep, sweep_2d, sweep_values, tornado
+
+from conftest import WELL
+
+
+def rescore(changes):
+    # Full scores of the base well with the given {parameter: values} changes, one well per value
+    n_wells = len(next(iter(changes.values())))
+    columns = {name: list(changes[name]) if name in changes else [WELL[name]] * n_wells for name in PARAMETER_NAMES}
+    return score_wells(columns)
+
+
+def test_grid_samples_every_criterion_bound():
+    values = sweep_values('water_cut', n_points=11)
+    bounds = {bound for interval in current_criteria().intervals['water_cut'] for bound in interval
+              if 0 <= bound <= 100}
+    assert bounds <= set(values.tolist()) and set(np.linspace(0, 100, 11).tolist()) <= set(values.tolist())
+    assert (np.diff(values) > 0).all()
+    assert sweep_values('gor', low=500, high=600).min() == 500 and sweep_values('gor', low=500, high=600).max() == 600
+    assert sweep_values('completion') == CATEGORY_OPTIONS['completion']
+    assert sweep_values('reservoir_access').tolist() == [0, 1]
+
+
+@pytest.mark.parametrize('name', ['water_cut', 'well_depth', 'casing_size', 'gor', 'completion', 'deviated_well'])
+def test_sweep_matches_a_full_rescore(name):
+    result = sweep(WELL, name)
+    assert bool(result['boundaries']) == (name not in ('water_cut', 'completion'))
+    scores, best = rescore({name: result['values']})
+    assert np.array_equal(result['scores'], scores) and np.array_equal(result['best'], best)
+
+    # A boundary for each change of the recommendation, between neighbouring grid values
+    values = list(result['values'])
+    changes = np.flatnonzero(best[1:] != best[:-1]).tolist()
+    assert len(result['boundaries']) == len(changes)
+    for boundary, k in zip(result['boundaries'], changes):
+        assert boundary['between'] == (values[k], values[k + 1])
+        assert boundary['from'] == result['methods'][best[k]] and boundary['to'] == result['methods'][best[k + 1]]
+        args = dict(WELL, **{name: values[k + 1]})
+        assert predict_best_lift_method(*[args[parameter] for parameter in PARAMETER_NAMES]) == boundary['to']
+
+
+def test_decision_map_matches_a_full_rescore():
+    xs = sweep_values('water_cut', n_points=30)
+    ys = sweep_values('well_depth', n_points=30)
+    result = sweep_2d(WELL, 'water_cut', 'well_depth', xs, ys)
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    _, best = rescore({'water_cut': grid_x.ravel(), 'well_depth': grid_y.ravel()})
+    best = best.reshape(len(ys), len(xs))
+    assert np.array_equal(result['best'], best)
+    assert result['boundary'][:, 1:][best[:, 1:] != best[:, :-1]].all()
+    assert not result['boundary'][0, 0]
+
+    with pytest.raises(ValueError, match="two different parameters"):
+        sweep_2d(WELL, 'gor', 'gor')
+
+
+def test_tornado_swings_follow_the_sweeps():
+    result = tornado(WELL, n_points=50)
+    methods = current_criteria().methods
+    base = methods.index(result['method'])
+    assert result['method'] == predict_best_lift_method(*[WELL[name] for name in PARAMETER_NAMES])
+    assert [bar['swing'] for bar in result['bars']] == sorted((bar['swing'] for bar in result['bars']), reverse=True)
+    assert sorted(bar['parameter'] for bar in result['bars']) == sorted(PARAMETER_NAMES)
+
+    for bar in result['bars']:
+        scores, best = rescore({bar['parameter']: sweep_values(bar['parameter'], 50)})
+        margin = scores[:, base] - np.delete(scores, base, axis=1).max(axis=1)
+        assert (bar['low'], bar['high'], bar['swing']) == (margin.min(), margin.max(), margin.max() - margin.min())
+        assert bar['takeovers'] == sorted({methods[j] for j in best.tolist() if j != base})
+    assert {bar['parameter'] for bar in result['bars'] if bar['takeovers']} >= {'well_depth', 'gor'}
@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from lift_criteria import PARAMETER_NAMES
+from lift_engine import score_wells, synthetic_wells
+from lift_scoring import calculate_scores, predict_best_lift_method
+from lift_service import MicroBatcher, ScoringService, http_request, parse_well, predict_rows, sample_wells
+
+from conftest import WELL
+
+
+def run_batched(requests, function=predict_rows, max_batch=50):
+    # Submit every request at once to one MicroBatcher, returns (results per request, batcher)
+    async def main():
+        batcher = MicroBatcher('test', function, max_batch=max_batch, max_wait=0.01)
+        task = asyncio.get_running_loop().create_task(batcher.run())
+        results = await asyncio.gather(*(batcher.submit(rows) for rows in requests), return_exceptions=True)
+        task.cancel()
+        return results, batcher
+    return asyncio.run(main())
+
+
+def test_batched_results_match_direct_scoring():
+    wells = synthetic_wells(400, 11)
+    rows = [parse_well([wells[name][i].item() for name in PARAMETER_NAMES]) for i in range(400)]
+    sizes = [1, 7, 30, 1, 120, 2, 64, 1, 1, 173]
+    requests = np.split(np.array(rows, dtype=object), np.cumsum(sizes)[:-1])
+    requests = [[tuple(row) for row in request] for request in requests]
+
+    results, batcher = run_batched(requests)
+    scores, best = score_wells(wells)
+    methods = list(results[0][0]['criteria_met'])
+    flat = [result for request in results for result in request]
+    assert [len(request) for request in results] == sizes
+    assert [result['method'] for result in flat] == [methods[j] for j in best.tolist()]
+    assert [list(result['criteria_met'].values()) for result in flat] == scores.tolist()
+
+    # Whole requests up to max_batch wells, the ones over it alone
+    stats = batcher.stats()
+    assert stats['wells'] == 400 and stats['largest_batch'] == 173
+    assert batcher.batches < len(sizes) and stats['mean_batch'] == 400 / batcher.batches
+
+
+def test_a_failing_batch_fails_its_requests():
+    def broken(rows):
+        raise RuntimeError("criteria unavailable")
+
+    row = parse_well(WELL)
+    results, batcher = run_batched([[row], [row, row]], broken)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batcher.stats()['batches'] == 0
+
+
+@pytest.mark.parametrize('data, message', [
+    ({'water_cut': 50}, "Missing parameter"),
+    ([1, 2, 3], "A well is an object"),
+    (dict(WELL, gor='lots'), "gor must be a number"),
+    (dict(WELL, water_cut=150), "water_cut 150 is"),
+    (dict(WELL, completion=1), "completion must be a string"),
+])
+def test_bad_wells_are_refused(data, message):
+    with pytest.raises(ValueError, match=message):
+        parse_well(data)
+
+
+def test_service_answers_like_the_single_well_functions():
+    wells = sample_wells(60, 3)
+
+    async def main():
+        service = ScoringService(max_batch=16)
+        server = await service.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+
+        async def request(method, path, payload=None):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            body = b'' if payload is None else json.dumps(payload).encode()
+            try:
+                return await http_request(reader, writer, method, path, body)
+            finally:
+                writer.close()
+
+        answers = await asyncio.gather(*(request('POST', '/predict', well) for well in wells),
+                                       request('POST', '/scores', {'wells': wells[:5]}),
+                                       request('POST', '/predict', {'wells': []}), request('GET', '/predict'),
+                                       request('GET', '/nowhere'))
+        answers.append(await request('GET', '/stats'))
+        server.close()
+        await server.wait_closed()
+        return answers
+
+    answers = asyncio.run(main())
+    for (status, result), well in zip(answers, wells):
+        assert status == 200
+        assert result['method'] == predict_best_lift_method(*[well[name] for name in PARAMETER_NAMES])
+    status, scored = answers[len(wells)]
+    assert status == 200
+    for result, well in zip(scored['results'], wells):
+        expected = calculate_scores(*[well[name] for name in PARAMETER_NAMES])
+        assert {method: (v['pis'], v['nis'], v['ps']) for method, v in result['scores'].items()} == expected
+    assert [status for status, _ in answers[len(wells) + 1:-1]] == [400, 405, 404]
+    stats = answers[-1][1]['routes']['/predict']
+    assert stats['wells'] == len(wells) and stats['largest_batch'] <= 16
@@ -0,0 +1,99 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+
+from lift_batch import prepare_columns, read_chunks, run_batch, write_store
+from lift_criteria import PARAMETER_KINDS, PARAMETER_NAMES
+from lift_engine import default_criteria
+from lift_store import MAGIC, WellStoreWriter, open_store, score_store
+from lift_validation import ErrorReport
+
+from conftest import write_wells
+
+
+def unusual(i, row):
+    # Blank numbers, choices outside the combo boxes and a rejected row among the synthetic wells
+    if i % 97 == 0:
+        row['gor'] = ''
+    if i % 89 == 0:
+        row['completion'] = 'dual'
+    if i == 5:
+        row['water_cut'] = 150
+
+
+@pytest.fixture
+def inventory(tmp_path):
+    return write_wells(str(tmp_path / 'wells.csv'), 1500, seed=4, edit=unusual)
+
+
+def csv_columns(path):
+    chunks = list(read_chunks(path))
+    return {name: sum((list(chunk[name]) for chunk in chunks), []) for name in chunks[0]}
+
+
+def test_round_trip_gives_the_csv_values_and_scores(tmp_path, inventory):
+    path = str(tmp_path / 'wells.wells')
+    report = ErrorReport()
+    assert write_store(inventory, path, chunk_size=400, report=report) == 1499
+    assert report.n_rows == 1
+
+    raw = csv_columns(inventory)
+    keep = [i for i in range(len(raw['well_id'])) if i != 5]
+    expected = prepare_columns({name: [raw[name][i] for i in keep] for name in raw})
+    store = open_store(path)
+    assert len(store) == 1499 and len(store.row_groups) == 4
+    assert store['well_id'].tolist() == [raw['well_id'][i] for i in keep]
+    for name in PARAMETER_NAMES:
+        if PARAMETER_KINDS[name] == 'in':
+            assert store[name].tolist() == list(expected[name])
+        else:
+            np.testing.assert_array_equal(store[name], expected[name])
+    assert store.well(1) == tuple(expected[name][1] for name in PARAMETER_NAMES)
+
+    criteria = default_criteria()
+    np.testing.assert_array_equal(score_store(store), criteria.score(*criteria.encode(expected)))
+
+
+def test_batch_output_is_the_same_from_csv_and_store(tmp_path, inventory):
+    path = str(tmp_path / 'wells.wells')
+    write_store(inventory, path, chunk_size=400)
+    from_csv, from_store = tmp_path / 'csv.csv', tmp_path / 'store.csv'
+    run_batch(inventory, str(from_csv), chunk_size=300)
+    run_batch(path, str(from_store), chunk_size=300)
+    fields = ('well_id',) + default_criteria().methods + ('best_method',)
+    rows = []
+    for path in (from_csv, from_store):
+        with open(path, newline='') as handle:
+            rows.append([tuple(row[field] for field in fields) for row in csv.DictReader(handle)])
+    assert len(rows[0]) == 1499
+    assert rows[0] == rows[1]
+
+
+def test_empty_store(tmp_path):
+    path = str(tmp_path / 'empty.wells')
+    WellStoreWriter(path).close()
+    store = open_store(path)
+    assert len(store) == 0 and score_store(store).shape == (0, len(default_criteria().methods))
+
+
+@pytest.mark.parametrize('damage', ['empty', 'half', 'last byte', 'footer', 'middle', 'csv', 'random'])
+def test_truncated_or_foreign_files_are_rejected(tmp_path, inventory, damage):
+    path = str(tmp_path / 'wells.wells')
+    write_store(inventory, path, chunk_size=400)
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    damaged = {
+        'empty': b'',
+        'half': data[:len(data) // 2],
+        'last byte': data[:-1],
+        'footer': data[:-len(MAGIC) - 8 - 40] + data[-len(MAGIC) - 8:],
+        'middle': data[:len(MAGIC)] + data[len(MAGIC) + 4096:],
+        'csv': open(inventory, 'rb').read(),
+        'random': os.urandom(4096),
+    }[damage]
+    bad = tmp_path / 'bad.wells'
+    bad.write_bytes(damaged)
+    with pytest.raises(ValueError):
+        open_store(str(bad))
@@ -0,0 +1,55 @@
+import json
+
+import numpy as np
+import pytest
+
+from lift_batch import main
+from lift_engine import score_wells
+from lift_uncertainty import iter_monte_carlo, parse_distribution, run_monte_carlo
+
+from conftest import WELL
+
+
+@pytest.fixture
+def well_file(tmp_path):
+    path = tmp_path / 'well.json'
+    path.write_text(json.dumps(WELL))
+    return str(path)
+
+
+def test_fixed_inputs_give_the_well_score():
+    summary = run_monte_carlo(WELL, {}, n_samples=250, chunk_size=100)
+    scores = score_wells({name: np.array([value]) for name, value in WELL.items()})[0][0]
+    assert summary.n_samples == 250
+    assert summary.mean_scores() == dict(zip(summary.methods, scores.astype(float).tolist()))
+    assert summary.probability_first()[summary.methods[scores.argmax()]] == 1
+    assert all(set(p.values()) == {score} for p, score in zip(summary.percentiles().values(), scores.tolist()))
+
+
+def test_seed_reproduces_the_run_whatever_the_chunks():
+    distributions = dict(map(parse_distribution, ['gor=triangular:800,1200,1600', 'water_cut=uniform:0,100',
+                                                  'recovery=choice:secondary,primary@0.7,0.3']))
+    one = run_monte_carlo(WELL, distributions, n_samples=1000, seed=3, chunk_size=1000)
+    again = run_monte_carlo(WELL, distributions, n_samples=1000, seed=3, chunk_size=1000)
+    assert (one.score_counts == again.score_counts).all()
+    assert [summary.n_samples for summary in iter_monte_carlo(WELL, distributions, 1000, 3, 300)] == \
+        [300, 600, 900, 1000]
+
+
+@pytest.mark.parametrize('n_samples, chunk_size', [(0, 100), (-5, 100), (100, 0)])
+def test_sample_counts_must_be_positive(n_samples, chunk_size):
+    with pytest.raises(ValueError, match="must be positive"):
+        run_monte_carlo(WELL, {}, n_samples=n_samples, chunk_size=chunk_size)
+
+
+@pytest.mark.parametrize('samples', ['0', '-5'])
+def test_cli_rejects_no_samples(well_file, samples, capsys):
+    assert main(['uncertainty', '--well', well_file, '-n', samples]) == 1
+    assert "--samples must be positive" in capsys.readouterr().err
+
+
+def test_cli_prints_the_summary(well_file, capsys):
+    assert main(['uncertainty', '--well', well_file, '-n', '200', '--dist', 'gor=uniform:500,2000']) == 0
+    output = capsys.readouterr()
+    assert "200 / 200 samples" in output.err
+    assert output.out.startswith('method') and 'P(first)' in output.out
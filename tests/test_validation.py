@@ -0,0 +1,149 @@
+import csv
+
+import numpy as np
+import pytest
+
+from lift_criteria import PARAMETER_NAMES
+from lift_validation import UNITS, ErrorReport, parse_column, parse_unit, parse_value, validate_columns
+
+from conftest import WELL
+
+
+def columns_of(rows):
+    return {name: [row[name] for row in rows] for name in ('well_id',) + PARAMETER_NAMES}
+
+
+def reference_parse(name, cell, scale=1, offset=0):
+    # (number, problem) of one cell the plain way: a number in the column's unit, else a number followed by
+    # the longest unit of UNITS[name] the cell ends with
+    text = '' if cell is None else str(cell).strip()
+    if text in ('', 'None'):
+        return np.nan, ''
+    try:
+        return float(text) * scale + offset, ''
+    except ValueError:
+        pass
+    for unit in sorted(UNITS.get(name, ()), key=len, reverse=True):
+        if text.lower().endswith(unit):
+            try:
+                unit_scale, unit_offset = UNITS[name][unit]
+                return float(text.lower()[:-len(unit)]) * unit_scale + unit_offset, ''
+            except ValueError:
+                break
+    return np.nan, 'not a number' if name not in UNITS else 'not a number in ' + ', '.join(UNITS[name])
+
+
+CELLS = ['1524 m', '1524M', '1524', ' 12 ', '', 'None', 'nan', 'abc', 'abc m', 'm', '5 ft', '1e3 m', '-0.0', 'inf',
+         '100 C', '100 degc', '300 K', '5 deg/30m', '7 mPa', '2 bar', '0.5 fraction', '3 furlong']
+
+
+@pytest.mark.parametrize('name', ['well_depth', 'temperature', 'dogleg_severity', 'flowing_pressure', 'water_cut',
+                                  'reservoir_access'])
+@pytest.mark.parametrize('unit', [None, 'column'])
+def test_parse_column_matches_the_cell_by_cell_reading(name, unit):
+    # The listed cells scattered among many plain ones, as a list, a string array and an object array
+    rng = np.random.default_rng(len(name))
+    cells = [str(value) for value in rng.uniform(0, 100, 3000).round(2)]
+    for i, position in enumerate(rng.choice(len(cells), len(CELLS), replace=False)):
+        cells[position] = CELLS[i]
+    unit = next(iter(UNITS[name])) if unit and name in UNITS else None
+    scale, offset = UNITS[name][unit] if unit else (1, 0)
+    expected = [reference_parse(name, cell, scale, offset) for cell in cells]
+    for values in (cells, np.asarray(cells), np.asarray(cells, dtype=object)):
+        numbers, problems = parse_column(name, values, unit)
+        np.testing.assert_allclose(numbers, [number for number, _ in expected], rtol=1e-12)
+        assert problems.tolist() == [problem for _, problem in expected]
+
+
+def test_parse_column_reads_numbers_none_and_a_single_cell():
+    numbers, problems = parse_column('gor', np.asarray([1.5, None, 'abc', 7], dtype=object))
+    assert numbers[[0, 3]].tolist() == [1.5, 7] and np.isnan(numbers[1:3]).all()
+    assert problems.tolist() == ['', '', 'not a number in scf/bbl, scf/stb, m3/m3, sm3/sm3', '']
+    assert parse_column('gor', np.arange(3))[0].tolist() == [0, 1, 2]
+    assert parse_column('temperature', ['100 C'])[0][0] == pytest.approx(212)
+    assert len(parse_column('gor', [])[0]) == 0
+
+
+def test_array_columns_validate_like_lists():
+    rows = [dict(WELL, well_id='A', well_depth='1524 m'), dict(WELL, well_id='B', completion=None, gor='x'),
+            dict(WELL, well_id='C', water_cut=150)]
+    columns = columns_of(rows)
+    as_lists = validate_columns(columns, required=True)
+    as_arrays = validate_columns({name: np.asarray(values, dtype=object) for name, values in columns.items()},
+                                 required=True)
+    assert as_lists['valid'].tolist() == as_arrays['valid'].tolist() == [True, False, False]
+    for field in ('row', 'parameter', 'error'):
+        assert as_lists['errors'][field].tolist() == as_arrays['errors'][field].tolist()
+    assert as_arrays['errors']['parameter'].tolist() == ['gor', 'completion', 'water_cut']
+    assert as_lists['columns']['completion'].tolist() == ['single', '', 'single']
+
+
+def test_valid_rows_pass_with_units():
+    rows = [dict(WELL, well_id='A', well_depth='1524 m', temperature='100 C'), dict(WELL, well_id='B')]
+    result = validate_columns(columns_of(rows))
+    assert result['valid'].tolist() == [True, True]
+    assert len(result['errors']['row']) == 0
+    assert result['columns']['well_depth'][0] == pytest.approx(5000, rel=1e-4)
+    assert result['columns']['temperature'][0] == pytest.approx(212)
+
+
+def test_every_error_of_every_row_is_reported():
+    rows = [dict(WELL, well_id='A'),
+            dict(WELL, well_id='B', water_cut=150, gor='abc'),
+            dict(WELL, well_id='C', temperature=-500, well_depth='12 parsecs', reservoir_access=''),
+            dict(WELL, well_id='D', production_rate=-1)]
+    result = validate_columns(columns_of(rows))
+    assert result['valid'].tolist() == [True, False, False, False]
+    errors = list(zip(*(result['errors'][field].tolist() for field in ('row', 'well_id', 'parameter', 'error'))))
+    assert errors == [
+        (1, 'B', 'water_cut', 'above 100'),
+        (1, 'B', 'gor', 'not a number in scf/bbl, scf/stb, m3/m3, sm3/sm3'),
+        (2, 'C', 'well_depth', 'not a number in ft, m'),
+        (2, 'C', 'temperature', 'below -459.67'),
+        (3, 'D', 'production_rate', 'below 0'),
+    ]
+    assert np.isnan(result['columns']['reservoir_access'][2])
+
+
+def test_required_blanks_are_errors():
+    rows = [dict(WELL, well_id='A', gor='', completion='')]
+    assert validate_columns(columns_of(rows))['valid'].tolist() == [True]
+    result = validate_columns(columns_of(rows), required=True)
+    assert result['valid'].tolist() == [False]
+    assert sorted(result['errors']['parameter'].tolist()) == ['completion', 'gor']
+    assert set(result['errors']['error'].tolist()) == {'missing'}
+
+
+def test_column_units_and_bad_arguments():
+    rows = [dict(WELL, well_id='A', well_depth=1000)]
+    assert validate_columns(columns_of(rows), units={'well_depth': 'm'})['columns']['well_depth'][0] == \
+        pytest.approx(3280.84)
+    with pytest.raises(ValueError):
+        validate_columns(columns_of(rows), units={'well_depth': 'furlong'})
+    with pytest.raises(ValueError):
+        validate_columns(columns_of(rows), units={'completion': 'm'})
+    with pytest.raises(ValueError):
+        validate_columns({'gor': [1]})
+    assert parse_unit('well_depth=m') == ('well_depth', 'm')
+    with pytest.raises(ValueError):
+        parse_unit('depth=m')
+    assert parse_value('gor', ' 1000 ') == 1000
+    assert parse_value('gor', 'abc') is None and parse_value('gor', '') is None
+
+
+def test_error_report_counts_and_writes_every_error(tmp_path):
+    path = tmp_path / 'errors.csv'
+    report = ErrorReport(str(path), keep=2)
+    chunk = columns_of([dict(WELL, well_id='A', water_cut=150, gor=-1), dict(WELL, well_id='B')])
+    report.add(validate_columns(chunk)['errors'], offset=0)
+    chunk = columns_of([dict(WELL, well_id='C', casing_size='x')])
+    report.add(validate_columns(chunk)['errors'], offset=2)
+    report.close()
+
+    assert (report.n_rows, report.n_errors) == (2, 3)
+    assert report.summary() == ["2 row(s) rejected with 3 error(s)", "row 1 (A): water_cut '150' above 100",
+                                "row 1 (A): gor '-1' below 0", "... and 1 more"]
+    with open(path, newline='') as handle:
+        rows = list(csv.reader(handle))
+    assert rows == [['row', 'well_id', 'parameter', 'value', 'error'], ['1', 'A', 'water_cut', '150', 'above 100'],
+                    ['1', 'A', 'gor', '-1', 'below 0'], ['3', 'C', 'casing_size', 'x', 'not a number in in, mm']]
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+pytest.importorskip('PyQt5')
+
+from lift_criteria import METHOD_ABBREVIATIONS, PARAMETER_NAMES  # noqa: E402
+from lift_scoring import calculate_scores, predict_best_lift_method  # noqa: E402
+
+estella_main = pytest.importorskip('estella_main')
+
+
+def run(task, *args, cancel=False):
+    # Run a Worker on this thread and collect what its signals sent, {signal: [arguments, ...]}
+    worker = estella_main.Worker(task, *args)
+    sent = {name: [] for name in ('progress', 'partial', 'finished', 'failed', 'cancelled')}
+    for name, received in sent.items():
+        getattr(worker.signals, name).connect(lambda *arguments, received=received: received.append(arguments))
+    if cancel:
+        worker.cancel()
+    worker.run()
+    return sent
+
+
+def test_prediction_runs_in_the_worker(well):
+    inputs = tuple(well[name] for name in PARAMETER_NAMES)
+    sent = run(estella_main.run_prediction, inputs)
+    assert not sent['failed'] and not sent['cancelled'] and not sent['partial']
+    assert sent['progress'][-1][0] == 100
+    result = sent['finished'][0][0]
+    scores = calculate_scores(*inputs)
+    assert result['best_method'] == predict_best_lift_method(*inputs)
+    assert result['als_methods'] == [METHOD_ABBREVIATIONS.get(method, method) for method in scores]
+    assert result['ps_values'] == [ps for _, _, ps in scores.values()]
+    assert [row['method'] for row in result['ranking']][0] == result['best_method']
+
+
+def test_constraints_pick_the_best_allowed_method(well):
+    inputs = tuple(well[name] for name in PARAMETER_NAMES)
+    result = run(estella_main.run_prediction, inputs, {'no_power': True})['finished'][0][0]
+    allowed = [row for row in result['ranking'] if row['allowed']]
+    assert result['best_method'] == allowed[0]['method']
+    assert result['best_method'] not in ('ESP', 'PCP')
+
+
+def test_cancelled_and_failed_tasks_do_not_finish(well):
+    inputs = tuple(well[name] for name in PARAMETER_NAMES)
+    sent = run(estella_main.run_prediction, inputs, cancel=True)
+    assert sent['cancelled'] == [()] and not sent['finished']
+
+    def broken(worker):
+        worker.report_partial('first')
+        raise ValueError('no wells')
+
+    sent = run(broken)
+    assert sent['partial'] == [('first',)] and sent['failed'] == [('no wells',)] and not sent['finished']